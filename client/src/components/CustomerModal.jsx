@@ -5,10 +5,12 @@ import {
   MessageSquare, Save, Edit, CreditCard, ShoppingBag,
   Tag, Home, Globe, Lock, Bell, UserPlus, Download
 } from 'lucide-react';
+import { adminAPI } from '../services/api';
 
 const CustomerModal = ({ isOpen, onClose, mode = 'view', initialData = null, onSave }) => {
   const [activeTab, setActiveTab] = useState('profile');
   const [loading, setLoading] = useState(false);
+  const [orders, setOrders] = useState([]);
   const [formData, setFormData] = useState({
     firstName: '',
     lastName: '',
@@ -75,6 +77,17 @@ const CustomerModal = ({ isOpen, onClose, mode = 'view', initialData = null, onS
     }
   }, [initialData, mode]);
 
+  // The user list carries totals only; load the customer's recent orders
+  useEffect(() => {
+    if (!isOpen || mode === 'add' || !initialData?.id) {
+      setOrders([]);
+      return;
+    }
+    adminAPI.getUserOrders(initialData.id, { per_page: 10 })
+      .then((response) => setOrders(response.orders || []))
+      .catch(() => setOrders([]));
+  }, [isOpen, mode, initialData?.id]);
+
   const handleInputChange = (e) => {
     const { name, value, type, checked } = e.target;
     if (name.startsWith('communication.')) {
@@ -511,7 +524,7 @@ const CustomerModal = ({ isOpen, onClose, mode = 'view', initialData = null, onS
                   </div>
 
                   {/* Recent Orders Table */}
-                  {initialData.orders && initialData.orders.length > 0 ? (
+                  {orders.length > 0 ? (
                     <div className="bg-white border rounded-lg overflow-hidden">
                       <div className="p-6 border-b">
                         <h3 className="font-semibold text-gray-900">Recent Orders</h3>
@@ -529,7 +542,7 @@ const CustomerModal = ({ isOpen, onClose, mode = 'view', initialData = null, onS
                             </tr>
                           </thead>
                           <tbody className="divide-y divide-gray-200">
-                            {initialData.orders.map((order) => (
+                            {orders.map((order) => (
                               <tr key={order.id} className="hover:bg-gray-50">
                                 <td className="px-6 py-4">
                                   <span className="font-medium text-blue-600">{order.id}</span>
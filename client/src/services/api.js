@@ -91,6 +91,15 @@ export const adminAPI = {
     return await apiRequest(`/api/admin/users/${userId}`, 'PUT', userData, true);
   },
 
+  getUserOrders: async (userId, params = {}) => {
+    const queryParams = new URLSearchParams();
+    if (params.page) queryParams.append('page', params.page);
+    if (params.per_page) queryParams.append('per_page', params.per_page);
+
+    const queryString = queryParams.toString();
+    return await apiRequest(`/api/admin/users/${userId}/orders${queryString ? `?${queryString}` : ''}`, 'GET', null, true);
+  },
+
   // ================= ORDER MANAGEMENT =================
   getOrders: async (params = {}) => {
     // Build query string from params
@@ -259,6 +268,11 @@ export const cartAPI = {
     return await apiRequest('/api/cart/items', 'POST', { bookId, quantity }, true);
   },
 
+  // Apply several changes at once: [{ bookId, quantity, op: 'add' | 'set' | 'remove' }]
+  batchUpdateCart: async (items) => {
+    return await apiRequest('/api/cart/items:batch', 'POST', { items }, true);
+  },
+
   // Update cart item quantity
   updateCartItem: async (itemId, quantity) => {
     return await apiRequest(`/api/cart/items/${itemId}`, 'PUT', { quantity }, true);
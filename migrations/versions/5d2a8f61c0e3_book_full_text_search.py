@@ -0,0 +1,40 @@
+"""Book full-text search
+
+Revision ID: 5d2a8f61c0e3
+Revises: b3e91c4d7a2f
+Create Date: 2026-10-18 10:03:27.148856
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a8f61c0e3'
+down_revision = 'b3e91c4d7a2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Weighted tsvector over title/author (A), short description (B) and
+    # description (C), generated by PostgreSQL so it never goes stale.
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "ALTER TABLE books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(author, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(short_description, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+        ") STORED"
+    )
+    op.execute("CREATE INDEX ix_books_search_vector ON books USING gin (search_vector)")
+    op.execute("CREATE INDEX ix_books_title_trgm ON books USING gin (title gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_books_author_trgm ON books USING gin (author gin_trgm_ops)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_books_author_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_books_title_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_books_search_vector")
+    op.execute("ALTER TABLE books DROP COLUMN IF EXISTS search_vector")
@@ -7,6 +7,9 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 from server.config import db
 from server.controllers import addResource
+from server.commands import register_commands
+from server.cache import response_cache
+from server.carts import cart_store
 from server.models import (
                         User, Category, Address, Book, BookImage, 
                         Publisher, Order, OrderItem, Payment, Review, 
@@ -32,6 +35,9 @@ jwt = JWTManager(app=app)
 api = Api(app=app)
 
 addResource(api=api)
+register_commands(app)
+response_cache.init_app(app)
+cart_store.init_app(app)
 
 # 2. Catch-all route for React - MUST BE LAST
 @app.route('/', defaults={'path': ''})
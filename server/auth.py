@@ -0,0 +1,94 @@
+"""Admin authorization without a users lookup per request.
+
+Access tokens carry the user's role as a signed `role` claim, added by
+token_for() at login and registration. @admin_required replaces the
+`User.query.get(get_jwt_identity())` + role check at the top of admin
+handlers:
+
+  no valid token              401 (from @jwt_required)
+  role claim is not 'admin'   403, without a query
+  role claim is 'admin'       confirmed against role_cache, so a demoted
+                              admin loses access within AUTH_ROLE_TTL seconds
+
+role_cache maps user id -> role for AUTH_ROLE_TTL seconds (default 30), in
+process memory; a miss is one primary-key SELECT. AdminUserResource drops a
+user's entry when it changes their role, so the change applies at once on
+that worker and within the TTL on the others. Tokens issued before the claim
+existed are checked against role_cache alone; a promoted user needs a new
+token (log in again) to pass.
+
+The decorator leaves the caller's id and role on `flask.g`; current_user()
+loads the User at most once per request for handlers that need more.
+"""
+from functools import wraps
+from flask import g, current_app
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
+from sqlalchemy import select
+from server.cache import MemoryBackend
+from server.config import db
+from server.models import User
+
+ROLE_CLAIM = 'role'
+DEFAULT_ROLE_TTL = 30
+DEFAULT_ROLE_CACHE_ENTRIES = 4096
+
+
+def token_for(user, **kwargs):
+    """Access token for `user` with their role as a claim; kwargs go to
+    create_access_token"""
+    return create_access_token(identity=user.id, additional_claims={ROLE_CLAIM: user.role}, **kwargs)
+
+
+class RoleCache:
+    """Thread-safe user id -> role map with a TTL, filled from `users`"""
+
+    def __init__(self, max_entries=DEFAULT_ROLE_CACHE_ENTRIES):
+        self._backend = MemoryBackend(max_entries)
+
+    def get(self, user_id):
+        """The user's role, or None when the user no longer exists"""
+        key = str(user_id)
+        role = self._backend.get(key)
+        if role is None:
+            role = db.session.execute(select(User.role).where(User.id == user_id)).scalar() or ''
+            self._backend.set(key, role, int(current_app.config.get('AUTH_ROLE_TTL', DEFAULT_ROLE_TTL)))
+        return role or None
+
+    def forget(self, user_id):
+        self._backend.delete(str(user_id))
+
+    def clear(self):
+        self._backend.clear()
+
+
+role_cache = RoleCache()
+
+
+def is_admin():
+    """Whether the caller (inside @jwt_required) is an admin; sets g.user_id
+    and g.role"""
+    g.user_id = get_jwt_identity()
+    g.role = get_jwt().get(ROLE_CLAIM)
+    g.pop('user', None)
+    if g.role not in (None, 'admin'):
+        return False
+    g.role = role_cache.get(g.user_id)
+    return g.role == 'admin'
+
+
+def admin_required(fn):
+    """@jwt_required() plus an admin role check, answering 403 otherwise"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return {'error': 'Admin access required'}, 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def current_user():
+    """The caller's User, loaded once per request (after @admin_required)"""
+    if 'user' not in g:
+        g.user = db.session.get(User, g.user_id)
+    return g.user
@@ -0,0 +1,208 @@
+"""Response cache for anonymous catalog endpoints.
+
+Cached entries hold the serialized JSON body and its ETag, keyed by path plus
+normalized query args. Invalidation is tag based: every tag has a version
+counter, entries remember the versions they were built against, and bumping a
+tag (e.g. 'books' after an admin edit) makes all entries carrying it miss.
+
+Backends (RESPONSE_CACHE_BACKEND):
+  memory - per-process LRU with TTL (default)
+  redis  - shared across gunicorn workers (RESPONSE_CACHE_REDIS_URL, needs `redis`)
+  null   - caching disabled
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, Response
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry TTL; tag versions are never evicted"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class RedisBackend:
+    """Shared backend so every worker sees the same entries and invalidations"""
+
+    prefix = 'respcache:'
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def get_versions(self, tags):
+        values = self._client.mget([f'{self.prefix}tag:{tag}' for tag in tags])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, tags):
+        pipeline = self._client.pipeline()
+        for tag in tags:
+            pipeline.incr(f'{self.prefix}tag:{tag}')
+        pipeline.execute()
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + '*'):
+            self._client.delete(key)
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+        self.ttl = DEFAULT_TTL
+
+    def init_app(self, app):
+        kind = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+        self.ttl = int(app.config.get('RESPONSE_CACHE_TTL', DEFAULT_TTL))
+        if kind == 'redis':
+            self.backend = RedisBackend(app.config['RESPONSE_CACHE_REDIS_URL'])
+        elif kind == 'memory':
+            self.backend = MemoryBackend(
+                int(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+            )
+        else:
+            self.backend = None
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(path, args):
+        """Path plus query args sorted. Empty values are kept: an empty arg
+        can change the response (`cursor=` asks for keyset paging)."""
+        pairs = sorted(args.items(multi=True))
+        return f'{path}?{urlencode(pairs)}'
+
+    def lookup(self, key):
+        """Return the entry for `key` if none of its tags were invalidated since"""
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        tags = list(entry['tags'])
+        if self.backend.get_versions(tags) != [entry['tags'][tag] for tag in tags]:
+            return None
+        return entry
+
+    def store(self, key, data, tag_versions, ttl=None):
+        body = json.dumps(data)
+        entry = {
+            'body': body,
+            'etag': hashlib.sha1(body.encode()).hexdigest(),
+            'tags': tag_versions,
+        }
+        self.backend.set(key, entry, ttl or self.ttl)
+        return entry
+
+    def invalidate(self, *tags):
+        if self.enabled and tags:
+            self.backend.bump(tags)
+
+
+response_cache = ResponseCache()
+
+
+def _is_anonymous():
+    return 'Authorization' not in request.headers and 'access_token_cookie' not in request.cookies
+
+
+def _entry_response(entry, cache_status):
+    if entry['etag'] in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(entry['body'], status=200, mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+def cached_response(tags, ttl=None):
+    """Cache the JSON output of an anonymous GET handler.
+
+    `tags` is a sequence of tag names, or a callable taking the view kwargs
+    and returning one. Only 200 responses are cached; authenticated requests
+    bypass the cache entirely.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled or not _is_anonymous():
+                return f(*args, **kwargs)
+
+            key = response_cache.make_key(request.path, request.args)
+            entry = response_cache.lookup(key)
+            if entry is not None:
+                return _entry_response(entry, 'HIT')
+
+            # Read tag versions before building the response, so a write that
+            # lands meanwhile invalidates what we are about to store
+            entry_tags = list(tags(**kwargs) if callable(tags) else tags)
+            versions = response_cache.backend.get_versions(entry_tags)
+
+            result = f(*args, **kwargs)
+            data, status = result if isinstance(result, tuple) else (result, 200)
+            if status != 200 or isinstance(data, Response):
+                return result
+
+            entry = response_cache.store(key, data, dict(zip(entry_tags, versions)), ttl)
+            return _entry_response(entry, 'MISS')
+        return wrapper
+    return decorator
@@ -0,0 +1,525 @@
+"""Cart store: each user's active cart cached as a compact structure, with
+quantity changes written behind to `cart_items`.
+
+A cached cart is
+
+    {'id': cart_id, 'created_at': iso, 'updated_at': iso,
+     'lines': {'<book_id>': [cart_item_id, quantity], ...}}
+
+and is read by GET /api/cart and by every cart mutation instead of loading
+Cart and CartItem rows. Handlers change a cart inside
+`cart_store.editing(user_id)`, which holds a per-user lock and yields a
+CartEdit; `edit.commit()` commits the session and then caches the cart.
+
+Stock is never deferred: hold_for_cart()/release_cart() run and commit in the
+request as before, so stock can not be oversold whatever the store does. New
+lines are inserted at once too (their id is the API's item id), upserted on
+(cart_id, book_id) so a line whose removal is still queued is revived rather
+than duplicated. What is written behind is the quantity UPDATE or DELETE of
+existing lines: pending changes are kept per user as {cart_item_id: quantity}
+(0 deletes the line), so repeated clicks on one line coalesce into a single
+write. They are written in one batch after a cart mutation, once
+CART_FLUSH_BATCH carts have pending changes or the oldest is
+CART_FLUSH_INTERVAL seconds old, and by `flask flush-carts`. One flush runs
+at a time (a process lock, or a Redis lock shared by every worker): two
+overlapping flushes could commit an older quantity over a newer one and
+both drop it from the queue. A request finding a flush under way leaves its
+changes to the next one.
+
+Checkout does not wait for them: it overlays the user's pending changes on
+the lines it reads, then deletes the lines. It holds the user's cart lock
+(@cart_locked), so the order sees every change made before it.
+
+A cart read from the database is overlaid with its pending changes, so an
+evicted entry never resurfaces stale quantities.
+
+Backends (CART_STORE_BACKEND):
+  null   - no caching; changes are written in the request (default)
+  memory - per-process, so only for a single worker process: another worker
+           would serve its own copy of the cart. Pending changes are lost if
+           the process dies without `flask flush-carts`; the cart then shows
+           its last written quantities and checkout settles stock on those.
+  redis  - shared by every worker (CART_STORE_REDIS_URL, needs `redis`)
+
+Carts are never reused once checked out, and a cart created for a visit may
+never see another one. sweep_carts() (`flask sweep-carts`) deletes, in
+batches, checked-out carts and active carts whose lines have not changed for
+CART_ABANDON_DAYS days (default 30), releasing the stock they still hold and
+dropping them from the store. Keep CART_ABANDON_DAYS well above
+CART_STORE_TTL so no swept cart can still be cached or have changes queued
+in another process.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select, update, delete, bindparam, func, or_, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from server.cache import MemoryBackend
+from server.config import db
+from server.models import Cart, CartItem, StockReservation
+from server.inventory import release_carts
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_FLUSH_BATCH = 100
+DEFAULT_FLUSH_INTERVAL = 5
+LOCK_STRIPES = 64
+DEFAULT_ABANDON_DAYS = 30
+SWEEP_BATCH_SIZE = 500
+FLUSH_LOCK_TIMEOUT = 60
+
+
+class MemoryCartBackend:
+    """Carts as JSON text in an LRU, pending changes in a dict"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self._carts = MemoryBackend(max_entries)
+        self._pending = {}
+        self._since = None
+        self._lock = threading.Lock()
+        self._user_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._flush_lock = threading.Lock()
+
+    def lock(self, user_id):
+        return self._user_locks[user_id % LOCK_STRIPES]
+
+    def flush_lock(self):
+        return self._flush_lock
+
+    def get(self, user_id):
+        raw = self._carts.get(str(user_id))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, user_id, cart, ttl):
+        self._carts.set(str(user_id), json.dumps(cart), ttl)
+
+    def delete(self, user_id):
+        self._carts.delete(str(user_id))
+
+    def add_pending(self, user_id, changes):
+        with self._lock:
+            self._pending.setdefault(user_id, {}).update(changes)
+            if self._since is None:
+                self._since = time.time()
+
+    def peek(self, user_ids=None):
+        with self._lock:
+            return {
+                user_id: dict(changes) for user_id, changes in self._pending.items()
+                if user_ids is None or user_id in user_ids
+            }
+
+    def discard(self, written):
+        """Drop written changes, keeping any that changed again since"""
+        with self._lock:
+            for user_id, changes in written.items():
+                current = self._pending.get(user_id, {})
+                for item_id, quantity in changes.items():
+                    if current.get(item_id) == quantity:
+                        del current[item_id]
+                if not current:
+                    self._pending.pop(user_id, None)
+            if not self._pending:
+                self._since = None
+
+    def pending_stats(self):
+        """(carts with pending changes, time of the oldest change)"""
+        with self._lock:
+            return len(self._pending), self._since
+
+
+class RedisCartBackend:
+    """Shared backend; carts and pending changes live in Redis"""
+
+    prefix = 'cartstore:'
+
+    # Delete the fields still holding the written value; ARGV is
+    # user_id, item_id, quantity, item_id, quantity, ...
+    DISCARD = """
+    for i = 2, #ARGV, 2 do
+        if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+    end
+    if redis.call('HLEN', KEYS[1]) == 0 then
+        redis.call('SREM', KEYS[2], ARGV[1])
+        if redis.call('SCARD', KEYS[2]) == 0 then
+            redis.call('DEL', KEYS[3])
+        end
+    end
+    """
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._discard = self._client.register_script(self.DISCARD)
+
+    def lock(self, user_id):
+        return self._client.lock(f'{self.prefix}lock:{user_id}', timeout=30, blocking_timeout=30)
+
+    def flush_lock(self):
+        return self._client.lock(
+            f'{self.prefix}flush-lock', timeout=FLUSH_LOCK_TIMEOUT, blocking_timeout=FLUSH_LOCK_TIMEOUT
+        )
+
+    def get(self, user_id):
+        raw = self._client.get(f'{self.prefix}cart:{user_id}')
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, user_id, cart, ttl):
+        self._client.set(f'{self.prefix}cart:{user_id}', json.dumps(cart), ex=ttl)
+
+    def delete(self, user_id):
+        self._client.delete(f'{self.prefix}cart:{user_id}')
+
+    def add_pending(self, user_id, changes):
+        pipeline = self._client.pipeline()
+        pipeline.hset(f'{self.prefix}pending:{user_id}', mapping=changes)
+        pipeline.sadd(f'{self.prefix}pending', user_id)
+        pipeline.set(f'{self.prefix}pending-since', time.time(), nx=True)
+        pipeline.execute()
+
+    def peek(self, user_ids=None):
+        if user_ids is None:
+            user_ids = [int(user_id) for user_id in self._client.smembers(f'{self.prefix}pending')]
+        pipeline = self._client.pipeline()
+        for user_id in user_ids:
+            pipeline.hgetall(f'{self.prefix}pending:{user_id}')
+        return {
+            user_id: {int(item_id): int(quantity) for item_id, quantity in changes.items()}
+            for user_id, changes in zip(user_ids, pipeline.execute()) if changes
+        }
+
+    def discard(self, written):
+        for user_id, changes in written.items():
+            args = [user_id]
+            for item_id, quantity in changes.items():
+                args.extend((item_id, quantity))
+            self._discard(keys=[
+                f'{self.prefix}pending:{user_id}', f'{self.prefix}pending', f'{self.prefix}pending-since'
+            ], args=args)
+
+    def pending_stats(self):
+        pipeline = self._client.pipeline()
+        pipeline.scard(f'{self.prefix}pending')
+        pipeline.get(f'{self.prefix}pending-since')
+        count, since = pipeline.execute()
+        return count, float(since) if since is not None else None
+
+
+def _insert(model):
+    return {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}[db.session.get_bind().dialect.name](model)
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def write_changes(changes):
+    """Apply {cart_item_id: quantity} to cart_items in the current
+    transaction: one batched UPDATE, one DELETE for zero quantities"""
+    now = datetime.utcnow()
+    updates = [(item_id, quantity, now) for item_id, quantity in sorted(changes.items()) if quantity]
+    removed = sorted(item_id for item_id, quantity in changes.items() if not quantity)
+    if updates:
+        # Against the table, so a line deleted since (checked out, swept) is
+        # skipped rather than failing the whole batch
+        db.session.execute(
+            update(CartItem.__table__).where(CartItem.__table__.c.id == bindparam('item_id')),
+            [{'item_id': item_id, 'quantity': quantity, 'updated_at': now} for item_id, quantity, now in updates]
+        )
+    if removed:
+        db.session.execute(
+            delete(CartItem).where(CartItem.id.in_(removed)).execution_options(synchronize_session=False)
+        )
+
+
+class CartEdit:
+    """A user's cart being changed inside cart_store.editing()"""
+
+    def __init__(self, store, user_id, cart):
+        self.store = store
+        self.user_id = user_id
+        self.cart = cart
+        self.changes = {}  # cart_item_id -> quantity (0 deletes the line)
+
+    @property
+    def id(self):
+        return self.cart['id'] if self.cart else None
+
+    def ensure(self):
+        """Create the user's cart if they have none; returns its id"""
+        if self.cart is None:
+            cart = Cart.active_for(self.user_id, create=True)
+            self.cart = {
+                'id': cart.id, 'created_at': _isoformat(cart.created_at),
+                'updated_at': _isoformat(cart.updated_at), 'lines': {}
+            }
+        return self.cart['id']
+
+    def quantity(self, book_id):
+        line = self.cart['lines'].get(str(book_id)) if self.cart else None
+        return line[1] if line else 0
+
+    def book_for(self, item_id):
+        """The book of a line in this cart, or None"""
+        for book_id, (line_id, _) in (self.cart['lines'].items() if self.cart else ()):
+            if line_id == item_id:
+                return int(book_id)
+        return None
+
+    def set_quantity(self, book_id, quantity):
+        """Set a line's quantity, inserting the line if it is new; returns
+        its cart_item id"""
+        line = self.cart['lines'].get(str(book_id))
+        if line is None:
+            return self.set_quantities({book_id: quantity})[book_id]
+        line[1] = quantity
+        self.changes[line[0]] = quantity
+        return line[0]
+
+    def set_quantities(self, quantities):
+        """Write several lines at once ({book_id: quantity}, quantities > 0)
+        with one INSERT ... ON CONFLICT DO UPDATE; returns {book_id: cart_item_id}.
+        A line whose removal is still queued is revived with its old id."""
+        if not quantities:
+            return {}
+        statement = _insert(CartItem).values([
+            {'cart_id': self.id, 'book_id': book_id, 'quantity': quantity}
+            for book_id, quantity in sorted(quantities.items())
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=['cart_id', 'book_id'],
+            set_={'quantity': statement.excluded.quantity, 'updated_at': datetime.utcnow()}
+        ).returning(CartItem.book_id, CartItem.id)
+        item_ids = dict(db.session.execute(statement).all())
+
+        pending = self.store.pending_for(self.user_id)
+        for book_id, quantity in quantities.items():
+            item_id = item_ids[book_id]
+            self.cart['lines'][str(book_id)] = [item_id, quantity]
+            if item_id in pending:
+                # Written now; supersede the queued change
+                self.changes[item_id] = quantity
+        return item_ids
+
+    def remove(self, book_id):
+        item_id, _ = self.cart['lines'].pop(str(book_id))
+        self.changes[item_id] = 0
+
+    def clear(self):
+        """Forget every line; the caller deletes the rows"""
+        self.cart['lines'] = {}
+
+    def commit(self):
+        """Commit the session and record the edit: written through without
+        a store backend, otherwise cached with its changes queued"""
+        if not self.store.enabled:
+            write_changes(self.changes)
+            db.session.commit()
+            return
+        db.session.commit()
+        try:
+            self.store.save(self)
+        except Exception:
+            # The database is ahead of the cache; read it afresh next time
+            self.store.forget(self.user_id)
+            raise
+        self.store.flush_if_due()
+
+
+class CartStore:
+    def __init__(self):
+        self.backend = None
+        self.ttl = DEFAULT_TTL
+        self.flush_batch = DEFAULT_FLUSH_BATCH
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+
+    def init_app(self, app):
+        kind = app.config.get('CART_STORE_BACKEND', 'null')
+        self.ttl = int(app.config.get('CART_STORE_TTL', DEFAULT_TTL))
+        self.flush_batch = int(app.config.get('CART_FLUSH_BATCH', DEFAULT_FLUSH_BATCH))
+        self.flush_interval = float(app.config.get('CART_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+        if kind == 'redis':
+            self.backend = RedisCartBackend(app.config['CART_STORE_REDIS_URL'])
+        elif kind == 'memory':
+            self.backend = MemoryCartBackend(
+                int(app.config.get('CART_STORE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+            )
+        else:
+            self.backend = None
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def lock(self, user_id):
+        return self.backend.lock(user_id) if self.enabled else nullcontext()
+
+    def _load(self, user_id):
+        """The user's active cart from the database, with pending changes
+        applied; None if they have no cart"""
+        rows = db.session.execute(
+            select(
+                Cart.id, Cart.created_at, Cart.updated_at,
+                CartItem.id.label('item_id'), CartItem.book_id, CartItem.quantity
+            ).select_from(Cart)
+            .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+            .where(Cart.user_id == user_id, Cart.is_active == True)
+            .order_by(Cart.id, CartItem.id)
+        ).all()
+        if not rows:
+            return None
+        first = rows[0]
+        pending = self.backend.peek([user_id]).get(user_id, {}) if self.enabled else {}
+        lines = {}
+        for row in rows:
+            if row.id != first.id or row.item_id is None:
+                continue
+            quantity = pending.get(row.item_id, row.quantity)
+            if quantity:
+                lines.setdefault(str(row.book_id), [row.item_id, quantity])
+        return {
+            'id': first.id, 'created_at': _isoformat(first.created_at),
+            'updated_at': _isoformat(first.updated_at), 'lines': lines
+        }
+
+    def get(self, user_id):
+        """The user's cart structure, or None if they have no cart"""
+        if not self.enabled:
+            return self._load(user_id)
+        cart = self.backend.get(user_id)
+        if cart is None:
+            cart = self._load(user_id)
+            if cart is not None:
+                self.backend.set(user_id, cart, self.ttl)
+        return cart
+
+    @contextmanager
+    def editing(self, user_id):
+        """Lock the user's cart and yield a CartEdit of it"""
+        with self.lock(user_id):
+            yield CartEdit(self, user_id, self.get(user_id))
+
+    def save(self, edit):
+        if edit.cart is not None:
+            self.backend.set(edit.user_id, edit.cart, self.ttl)
+        if edit.changes:
+            self.backend.add_pending(edit.user_id, edit.changes)
+
+    def forget(self, user_id):
+        if self.enabled:
+            self.backend.delete(user_id)
+
+    def pending_for(self, user_id):
+        """The user's unwritten {cart_item_id: quantity} changes"""
+        if not self.enabled:
+            return {}
+        return self.backend.peek([user_id]).get(user_id, {})
+
+    def checked_out(self, user_id, pending):
+        """After checkout committed (deleting the cart's lines): drop the
+        changes it read and the cached cart"""
+        if self.enabled:
+            self.backend.discard({user_id: pending})
+            self.backend.delete(user_id)
+
+    def flush(self, wait=True):
+        """Write every pending change in one transaction; returns the number
+        of lines written. With `wait=False`, returns 0 at once if another
+        flush is running."""
+        if not self.enabled:
+            return 0
+        lock = self.backend.flush_lock()
+        if not lock.acquire(blocking=wait):
+            return 0
+        try:
+            pending = self.backend.peek()
+            if not pending:
+                return 0
+            changes = {}
+            for user_changes in pending.values():
+                changes.update(user_changes)
+            try:
+                write_changes(changes)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            self.backend.discard(pending)
+            return len(changes)
+        finally:
+            lock.release()
+
+    def flush_if_due(self):
+        count, since = self.backend.pending_stats()
+        if count >= self.flush_batch or (since is not None and time.time() - since >= self.flush_interval):
+            try:
+                self.flush(wait=False)
+            except Exception:
+                # Left pending for the next flush
+                current_app.logger.exception('Cart flush failed')
+
+
+cart_store = CartStore()
+
+
+def cart_locked(f):
+    """Hold the caller's cart lock for the whole handler (apply below
+    @jwt_required())"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with cart_store.lock(get_jwt_identity()):
+            return f(*args, **kwargs)
+    return wrapper
+
+
+def sweep_carts(abandoned_after=None, batch_size=SWEEP_BATCH_SIZE):
+    """Delete checked-out carts, and active carts with no change in
+    `abandoned_after` (a timedelta, CART_ABANDON_DAYS by default), with their
+    lines. Stock still held by a swept cart is released. Carts locked by a
+    request in progress are skipped (PostgreSQL SKIP LOCKED) and picked up by
+    a later sweep. Commits per batch and returns (carts, lines) deleted."""
+    if abandoned_after is None:
+        abandoned_after = timedelta(days=float(current_app.config.get('CART_ABANDON_DAYS', DEFAULT_ABANDON_DAYS)))
+    cutoff = datetime.utcnow() - abandoned_after
+    changed_since = select(CartItem.id).where(
+        CartItem.cart_id == Cart.id,
+        func.coalesce(CartItem.updated_at, CartItem.created_at) >= cutoff
+    ).exists()
+    sweepable = or_(
+        Cart.is_active == False,
+        Cart.is_active.is_(None),
+        and_(func.coalesce(Cart.updated_at, Cart.created_at) < cutoff, ~changed_since)
+    )
+
+    carts = lines = 0
+    while True:
+        batch = db.session.execute(
+            select(Cart.id, Cart.user_id, Cart.is_active).where(sweepable)
+            .order_by(Cart.id).limit(batch_size).with_for_update(of=Cart, skip_locked=True)
+        ).all()
+        if not batch:
+            return carts, lines
+        cart_ids = [row.id for row in batch]
+        release_carts(cart_ids)
+        # Reservations stay as stock history; committed ones keep their order
+        db.session.execute(
+            update(StockReservation).where(StockReservation.cart_id.in_(cart_ids))
+            .values(cart_id=None).execution_options(synchronize_session=False)
+        )
+        lines += db.session.execute(
+            delete(CartItem).where(CartItem.cart_id.in_(cart_ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        carts += db.session.execute(
+            delete(Cart).where(Cart.id.in_(cart_ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        for row in batch:
+            if row.is_active:
+                cart_store.forget(row.user_id)
@@ -0,0 +1,160 @@
+import time
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from server.models import Book, Category, OrderSummary, WishlistItem
+from server.config import db
+from server.search import rebuild_search_index
+from server.inventory import release_expired
+from server.idempotency import purge_expired
+from server.jobs import Worker
+from server.queryplans import check_query_plans, DEFAULT_MIN_ROWS
+from server.sales import rebuild_sales_rollups
+from server.carts import cart_store, sweep_carts, SWEEP_BATCH_SIZE as CART_SWEEP_BATCH_SIZE
+import server.payments  # noqa: F401 - registers the payment job handlers
+import server.wishlists  # noqa: F401 - registers the wishlist price job
+
+
+@click.command('rebuild-ratings')
+@with_appcontext
+def rebuild_ratings():
+    """Rebuild stored book rating aggregates from approved reviews."""
+    rated = Book.rebuild_rating_aggregates()
+    db.session.commit()
+    click.echo(f'Rebuilt rating aggregates ({rated} books with approved reviews)')
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Create the book search index if missing and repopulate it."""
+    dialect = rebuild_search_index()
+    db.session.commit()
+    click.echo(f'Rebuilt book search index ({dialect})')
+
+
+@click.command('rebuild-category-counts')
+@with_appcontext
+def rebuild_category_counts():
+    """Recount published books per category."""
+    Category.rebuild_book_counts()
+    db.session.commit()
+    click.echo('Rebuilt category book counts')
+
+
+@click.command('rebuild-order-summaries')
+@with_appcontext
+def rebuild_order_summaries():
+    """Recreate the order list read model from orders."""
+    summarized = OrderSummary.rebuild()
+    db.session.commit()
+    click.echo(f'Rebuilt order summaries ({summarized} orders)')
+
+
+@click.command('rebuild-sales-rollups')
+@with_appcontext
+def rebuild_sales_rollups_command():
+    """Recompute the dashboard's sales rollups and per-customer totals from orders."""
+    rows = rebuild_sales_rollups()
+    db.session.commit()
+    click.echo(f'Rebuilt sales rollups ({rows} rows)')
+
+
+@click.command('refresh-wishlist-prices')
+@with_appcontext
+def refresh_wishlist_prices():
+    """Update wishlist price tracking (current, lowest, price-drop alert) for books whose price changed."""
+    updated = WishlistItem.refresh_price_info()
+    db.session.commit()
+    click.echo(f'Refreshed prices of {updated} wishlist items')
+
+
+@click.command('release-expired-reservations')
+@with_appcontext
+def release_expired_reservations():
+    """Return stock held by carts whose reservations have expired."""
+    released = release_expired()
+    click.echo(f'Released {released} expired stock reservations')
+
+
+@click.command('flush-carts')
+@with_appcontext
+def flush_carts():
+    """Write cart changes still queued in the cart store (e.g. before shutdown)."""
+    written = cart_store.flush()
+    click.echo(f'Flushed {written} cart lines')
+
+
+@click.command('sweep-carts')
+@click.option('--days', type=float, default=None,
+              help='Delete active carts unchanged for this many days [default: CART_ABANDON_DAYS or 30].')
+@click.option('--batch-size', default=CART_SWEEP_BATCH_SIZE, show_default=True, help='Carts deleted per transaction.')
+@with_appcontext
+def sweep_carts_command(days, batch_size):
+    """Delete checked-out and abandoned carts, releasing the stock they hold."""
+    started = time.perf_counter()
+    carts, lines = sweep_carts(timedelta(days=days) if days is not None else None, batch_size)
+    elapsed = time.perf_counter() - started
+    click.echo(f'Deleted {carts} carts and {lines} cart lines in {elapsed:.1f}s '
+               f'({(carts + lines) / elapsed if elapsed else 0:.0f} rows/s)')
+
+
+@click.command('purge-idempotency-keys')
+@with_appcontext
+def purge_idempotency_keys():
+    """Delete stored Idempotency-Key responses past their TTL."""
+    purged = purge_expired()
+    click.echo(f'Purged {purged} expired idempotency keys')
+
+
+@click.command('jobs-worker')
+@click.option('--threads', default=2, show_default=True, help='Worker threads in this process.')
+@click.option('--batch-size', default=20, show_default=True, help='Jobs claimed per poll.')
+@with_appcontext
+def jobs_worker(threads, batch_size):
+    """Run background jobs (M-Pesa payments) until interrupted."""
+    worker = Worker(current_app._get_current_object(), threads=threads, batch_size=batch_size)
+    click.echo(f'Job worker running with {threads} threads')
+    worker.run_forever()
+    click.echo('Job worker stopped')
+
+
+@click.command('check-query-plans')
+@click.option('--min-rows', default=DEFAULT_MIN_ROWS, show_default=True,
+              help='Also fail scans on any other table with at least this many rows.')
+@click.option('--verbose', is_flag=True, help='Print every plan, not only failing ones.')
+@with_appcontext
+def check_query_plans_command(min_rows, verbose):
+    """EXPLAIN every read endpoint's queries; fail on sequential scans of large tables."""
+    failures = check_query_plans(current_app._get_current_object(), min_rows=min_rows,
+                                 echo=click.echo, verbose=verbose)
+    if failures:
+        raise click.ClickException(f'{failures} queries scan large tables')
+    click.echo('No sequential scans on large tables')
+
+
+@click.command('fake-mpesa')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8089, show_default=True)
+@click.option('--delay', default=1.0, show_default=True, help='Seconds before each callback is sent.')
+def fake_mpesa(host, port, delay):
+    """Serve a local fake of the M-Pesa Daraja API."""
+    from server.fake_mpesa import create_app
+    create_app(delay=delay).run(host=host, port=port, threaded=True)
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_ratings)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rebuild_category_counts)
+    app.cli.add_command(rebuild_order_summaries)
+    app.cli.add_command(rebuild_sales_rollups_command)
+    app.cli.add_command(refresh_wishlist_prices)
+    app.cli.add_command(release_expired_reservations)
+    app.cli.add_command(flush_carts)
+    app.cli.add_command(sweep_carts_command)
+    app.cli.add_command(purge_idempotency_keys)
+    app.cli.add_command(jobs_worker)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(fake_mpesa)
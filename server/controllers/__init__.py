@@ -1,14 +1,15 @@
 from server.controllers.auth import Login, Logout, Register
 from server.controllers.books import (
-    AdminBookListResource, AdminBookResource,
+    AdminBookListResource, AdminBookResource, AdminBookExportResource,
     BookListResource, BookResource, FeaturedBooksResource,
-    BestsellerBooksResource, CategoryListResource, SearchBooksResource
+    BestsellerBooksResource, CategoryListResource, SearchBooksResource,
+    SuggestBooksResource
 )# Import controllers
-from server.controllers.cart import CartResource, CartItemResource, CartByID
-from server.controllers.orders import OrderListResource, OrderResource
+from server.controllers.cart import CartResource, CartItemResource, CartItemBatchResource, CartByID
+from server.controllers.orders import OrderListResource, OrderResource, MpesaCallbackResource
 from server.controllers.reviews import BookReviewsResource, ReviewResource, ReviewHelpfulResource
 from server.controllers.admin import (
-    AdminDashboardStatsResource, AdminUsersResource, AdminUserResource,
+    AdminDashboardStatsResource, AdminUsersResource, AdminUserResource, AdminUserOrdersResource,
     AdminOrdersResource, AdminOrderStatusResource, AdminReviewsResource,
     AdminReviewResource, AdminReviewResponseResource
 )
@@ -27,11 +28,14 @@ def addResource(api):
     api.add_resource(BestsellerBooksResource, '/api/books/bestsellers')
     api.add_resource(CategoryListResource, '/api/categories')
     api.add_resource(SearchBooksResource, '/api/books/search')
+    api.add_resource(SuggestBooksResource, '/api/books/suggest')
     api.add_resource(CartResource, '/api/cart')
     api.add_resource(CartItemResource, '/api/cart/items')
+    api.add_resource(CartItemBatchResource, '/api/cart/items:batch')
     api.add_resource(CartByID, '/api/cart/items/<int:item_id>')
     api.add_resource(OrderListResource, '/api/orders')
     api.add_resource(OrderResource, '/api/orders/<int:order_id>')
+    api.add_resource(MpesaCallbackResource, '/api/payments/mpesa/callback')
     api.add_resource(BookReviewsResource, '/api/books/<int:book_id>/reviews')
     api.add_resource(ReviewResource, '/api/reviews/<int:review_id>')
     api.add_resource(ReviewHelpfulResource, '/api/reviews/<int:review_id>/<string:action>')
@@ -41,10 +45,12 @@ def addResource(api):
 
     # Admin API routes (require authentication)
     api.add_resource(AdminBookListResource, '/api/admin/books')
+    api.add_resource(AdminBookExportResource, '/api/admin/books/export')
     api.add_resource(AdminBookResource, '/api/admin/books/<int:id>')
     api.add_resource(AdminDashboardStatsResource, '/api/admin/dashboard/stats')
     api.add_resource(AdminUsersResource, '/api/admin/users')
     api.add_resource(AdminUserResource, '/api/admin/users/<int:user_id>')
+    api.add_resource(AdminUserOrdersResource, '/api/admin/users/<int:user_id>/orders')
     api.add_resource(AdminOrdersResource, '/api/admin/orders')
     api.add_resource(AdminOrderStatusResource, '/api/admin/orders/<int:order_id>/status')
     api.add_resource(AdminReviewsResource, '/api/admin/reviews')
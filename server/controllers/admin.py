@@ -1,22 +1,35 @@
-from flask import request
+from flask import request, g
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from server.models import User, Book, Order, Review
+from server.models import User, Book, Order, OrderSummary, Review, Address
 from server.config import db
+from server.pagination import paginate, InvalidCursor
+from server.cache import response_cache
+from server.controllers.reviews import REVIEW_SORT_COLUMNS
+from server.inventory import return_order_stock
+from server.sales import totals, chart, INTERVALS, MAX_HOURLY_SPAN, move_order, customer_stats
+from server.auth import admin_required, current_user, role_cache
 from datetime import datetime, timedelta
-import decimal
+
+# Sortable columns for admin listings (`sort` query arg)
+USER_SORT_COLUMNS = {
+    'email': User.email,
+    'created_at': User.created_at,
+}
+ORDER_SORT_COLUMNS = {
+    'total_amount': OrderSummary.total_amount,
+    'created_at': OrderSummary.created_at,
+}
 
 class AdminDashboardStatsResource(Resource):
     """Admin dashboard statistics"""
     
-    @jwt_required()
+    @admin_required
     def get(self):
         """Get dashboard statistics"""
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
+        # Revenue chart range: last 7 days by default, or any start/end/interval
+        interval = request.args.get('interval', 'day')
+        if interval not in INTERVALS:
+            return {'error': f'Invalid interval. Must be one of: {", ".join(INTERVALS)}'}, 400
         
         try:
             # Today's date
@@ -24,41 +37,38 @@ class AdminDashboardStatsResource(Resource):
             start_of_today = datetime(today.year, today.month, today.day)
             start_of_month = datetime(today.year, today.month, 1)
             
-            # Total counts
-            total_users = User.query.count()
-            total_books = Book.query.count()
-            total_orders = Order.query.count()
-            total_reviews = Review.query.filter_by(status='approved').count()
-            
-            # Today's stats
-            today_orders = Order.query.filter(
-                Order.created_at >= start_of_today
-            ).count()
+            try:
+                chart_end = datetime.fromisoformat(request.args['end_date'].replace('Z', '+00:00')).replace(tzinfo=None) \
+                    if request.args.get('end_date') else start_of_today + timedelta(days=1)
+                chart_start = datetime.fromisoformat(request.args['start_date'].replace('Z', '+00:00')).replace(tzinfo=None) \
+                    if request.args.get('start_date') else start_of_today - timedelta(days=6)
+            except ValueError:
+                return {'error': 'Invalid start_date or end_date'}, 400
+            if interval == 'hour' and chart_end - chart_start > MAX_HOURLY_SPAN:
+                return {'error': f'Hourly charts span at most {MAX_HOURLY_SPAN.days} days'}, 400
             
-            today_revenue = db.session.query(
-                db.func.sum(Order.total_amount)
-            ).filter(
-                Order.created_at >= start_of_today,
-                Order.status.in_(['processing'])
-            ).scalar() or decimal.Decimal('0.00')
+            # Catalog and user counts in one round trip
+            total_users, total_books, total_reviews = db.session.execute(db.select(
+                db.select(db.func.count()).select_from(User).scalar_subquery(),
+                db.select(db.func.count()).select_from(Book).scalar_subquery(),
+                db.select(db.func.count()).select_from(Review).where(Review.status == 'approved').scalar_subquery()
+            )).one()
             
-            # Monthly stats
-            monthly_revenue = db.session.query(
-                db.func.sum(Order.total_amount)
-            ).filter(
-                Order.created_at >= start_of_month,
-                Order.status.in_(['processing'])
-            ).scalar() or decimal.Decimal('0.00')
+            # Order figures from the sales rollups (server/sales.py)
+            total_orders, _ = totals()
+            today_orders, _ = totals(start=start_of_today)
+            _, today_revenue = totals(start=start_of_today, statuses=['processing'])
+            _, monthly_revenue = totals(start=start_of_month, statuses=['processing'])
             
             # Recent orders
-            recent_orders = Order.query.order_by(
-                Order.created_at.desc()
+            recent_orders = OrderSummary.query.order_by(
+                OrderSummary.created_at.desc(), OrderSummary.order_id.desc()
             ).limit(10).all()
             
             recent_orders_data = []
             for order in recent_orders:
                 recent_orders_data.append({
-                    'id': order.id,
+                    'id': order.order_id,
                     'order_number': order.order_number,
                     'user_id': order.user_id,
                     'status': order.status,
@@ -67,7 +77,6 @@ class AdminDashboardStatsResource(Resource):
                 })
             
             # Top selling books
-            from sqlalchemy import func
             top_books = db.session.query(
                 Book.id,
                 Book.title,
@@ -88,33 +97,20 @@ class AdminDashboardStatsResource(Resource):
                     'total_revenue': float(book.total_revenue) if book.total_revenue else 0.0
                 })
             
-            # Revenue chart data (last 7 days)
-            revenue_data = []
-            for i in range(6, -1, -1):
-                date = today - timedelta(days=i)
-                start_of_day = datetime(date.year, date.month, date.day)
-                end_of_day = start_of_day + timedelta(days=1)
-                
-                daily_revenue = db.session.query(
-                    db.func.sum(Order.total_amount)
-                ).filter(
-                    Order.created_at >= start_of_day,
-                    Order.created_at < end_of_day,
-                    Order.status.in_(['delivered'])
-                ).scalar() or decimal.Decimal('0.00')
-                
-                revenue_data.append({
-                    'date': date.isoformat(),
-                    'revenue': float(daily_revenue)
-                })
+            # Revenue chart: one GROUP BY over the rollups
+            revenue_data = [
+                {'date': point['period'][:10] if interval != 'hour' else point['period'],
+                 'orders': point['orders'], 'revenue': point['revenue']}
+                for point in chart(chart_start, chart_end, interval, statuses=['delivered'])
+            ]
             
             return {
                 'stats': {
                     'total_users': total_users,
                     'total_books': total_books,
-                    'total_orders': total_orders,
+                    'total_orders': int(total_orders),
                     'total_reviews': total_reviews,
-                    'today_orders': today_orders,
+                    'today_orders': int(today_orders),
                     'today_revenue': float(today_revenue),
                     'monthly_revenue': float(monthly_revenue)
                 },
@@ -130,15 +126,9 @@ class AdminDashboardStatsResource(Resource):
 class AdminUsersResource(Resource):
     """Admin user management"""
     
-    @jwt_required()
+    @admin_required
     def get(self):
         """Get all users"""
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         # Parse query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -147,6 +137,8 @@ class AdminUsersResource(Resource):
         status = request.args.get('status')
         sort = request.args.get('sort', 'created_at')
         order = request.args.get('order', 'desc')
+        cursor = request.args.get('cursor')
+        total = request.args.get('total')
         
         # Build query
         query = User.query
@@ -165,75 +157,93 @@ class AdminUsersResource(Resource):
         if status:
             query = query.filter_by(status=status)
         
-        
-        elif sort == 'email':
-            if order == 'asc':
-                query = query.order_by(User.email.asc())
-            else:
-                query = query.order_by(User.email.desc())
-        else:  # created_at
-            if order == 'asc':
-                query = query.order_by(User.created_at.asc())
-            else:
-                query = query.order_by(User.created_at.desc())
-        
-        # Pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        users = []
-        for user in pagination.items:
-            # Get user's order count
-            order_count = Order.query.filter_by(user_id=user.id).count()
-            
-            users.append({
-                'id': user.id,
-                'email': user.email,
-                'first_name': user.firstName,
-                'second_name': user.secondName,
-                'phone': user.phone,
-                'role': user.role,
-                'orders': [
-                    {
-                        'id': order.id,
-                        'total':float(order.total_amount),
-                        'item_count': len(order.items) if order.items else 0,
-                        'date': order.created_at.isoformat()
-                    }
-                    for order in user.orders
-                ]if user.orders else None,
+        # Apply sorting and pagination (page/per_page, or keyset when a cursor is given)
+        try:
+            items, pagination = paginate(
+                query, USER_SORT_COLUMNS.get(sort, User.created_at), User.id,
+                descending=order != 'asc', page=page, per_page=per_page,
+                cursor=cursor, total=total
+            )
+        except InvalidCursor:
+            return {'error': 'Invalid cursor'}, 400
+        
+        users = [{
+            'id': user.id,
+            'email': user.email,
+            'first_name': user.firstName,
+            'second_name': user.secondName,
+            'phone': user.phone,
+            'role': user.role,
+            'created_at': user.created_at.isoformat()
+        } for user in items]
+        
+        # Lifetime order totals and first addresses for the whole page; the
+        # orders themselves are at /api/admin/users/<id>/orders
+        user_ids = [user['id'] for user in users]
+        stats = customer_stats(user_ids)
+        addresses = {}
+        for address in Address.query.filter(Address.user_id.in_(user_ids)).order_by(Address.user_id, Address.id):
+            addresses.setdefault(address.user_id, address)
+        
+        for user in users:
+            order_count, total_spent, last_order_at = stats[user['id']]
+            address = addresses.get(user['id'])
+            user.update({
                 'address': {
-                    'city': user.addresses[0].town,
-                    'state': user.addresses[0].county,
-                    'country': user.addresses[0].country
-                }if user.addresses else None,
-                'totalSpent': float(sum(order.total_amount for order in user.orders)),
-                'created_at': user.created_at.isoformat(),
+                    'city': address.town,
+                    'state': address.county,
+                    'country': address.country
+                } if address else None,
+                'totalSpent': float(total_spent),
+                'last_order_at': last_order_at.isoformat() if last_order_at else None,
                 'order_count': order_count
             })
         
         return {
             'users': users,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination
+        }, 200
+
+
+class AdminUserOrdersResource(Resource):
+    """A user's orders, for the admin customer view"""
+    
+    @admin_required
+    def get(self, user_id):
+        """Get a page of the user's orders, newest first"""
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        total = request.args.get('total')
+        
+        try:
+            items, pagination = paginate(
+                OrderSummary.query.filter_by(user_id=user_id),
+                OrderSummary.created_at, OrderSummary.order_id, descending=True,
+                page=page, per_page=per_page, cursor=cursor, total=total
+            )
+        except InvalidCursor:
+            return {'error': 'Invalid cursor'}, 400
+        
+        return {
+            'orders': [{
+                'id': order.order_id,
+                'order_number': order.order_number,
+                'status': order.status,
+                'total': float(order.total_amount),
+                'item_count': order.item_count,
+                'date': order.created_at.isoformat()
+            } for order in items],
+            'pagination': pagination
         }, 200
 
 
 class AdminUserResource(Resource):
     """Single user management"""
     
-    @jwt_required()
+    @admin_required
     def put(self, user_id):
         """Update user"""
-        admin_id = get_jwt_identity()
-        admin_user = User.query.get(admin_id)
-        
-        if not admin_user or admin_user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         user = User.query.get_or_404(user_id)
         
         data = request.get_json()
@@ -252,6 +262,8 @@ class AdminUserResource(Resource):
             
             user.updated_at = datetime.utcnow()
             db.session.commit()
+            if 'role' in data:
+                role_cache.forget(user.id)
             
             return {
                 'message': 'User updated successfully',
@@ -267,15 +279,9 @@ class AdminUserResource(Resource):
 class AdminOrdersResource(Resource):
     """Admin order management"""
     
-    @jwt_required()
+    @admin_required
     def get(self):
         """Get all orders"""
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         # Parse query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -285,9 +291,12 @@ class AdminOrdersResource(Resource):
         search = request.args.get('search')
         sort = request.args.get('sort', 'created_at')
         order = request.args.get('order', 'desc')
+        cursor = request.args.get('cursor')
+        total = request.args.get('total')
         
-        # Build query
-        query = Order.query
+        # Orders come from the read model: customer, address and item
+        # snapshots are on each row, so no joins or per-row queries
+        query = OrderSummary.query
         
         if status:
             query = query.filter_by(status=status)
@@ -295,98 +304,76 @@ class AdminOrdersResource(Resource):
         if start_date:
             try:
                 start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(Order.created_at >= start)
+                query = query.filter(OrderSummary.created_at >= start)
             except ValueError:
                 pass
         
         if end_date:
             try:
                 end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(Order.created_at <= end)
+                query = query.filter(OrderSummary.created_at <= end)
             except ValueError:
                 pass
         
         if search:
             search_term = f"%{search}%"
             query = query.filter(
-                (Order.order_number.ilike(search_term))
+                (OrderSummary.order_number.ilike(search_term))
             )
         
-        # Apply sorting
-        if sort == 'total_amount':
-            if order == 'asc':
-                query = query.order_by(Order.total_amount.asc())
-            else:
-                query = query.order_by(Order.total_amount.desc())
-        else:  # created_at
-            if order == 'asc':
-                query = query.order_by(Order.created_at.asc())
-            else:
-                query = query.order_by(Order.created_at.desc())
-        
-        # Pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Apply sorting and pagination (page/per_page, or keyset when a cursor is given)
+        try:
+            items, pagination = paginate(
+                query, ORDER_SORT_COLUMNS.get(sort, OrderSummary.created_at), OrderSummary.order_id,
+                descending=order != 'asc', page=page, per_page=per_page,
+                cursor=cursor, total=total
+            )
+        except InvalidCursor:
+            return {'error': 'Invalid cursor'}, 400
         
         orders = []
-        for order in pagination.items:
-            user = User.query.get(order.user_id)
+        for summary in items:
             orders.append({
-                'id': order.id,
-                'order_number': order.order_number,
+                'id': summary.order_id,
+                'order_number': summary.order_number,
                 'user': {
-                    'id': user.id,
-                    'name': f'{user.firstName} {user.secondName}',
-                    'email': user.email,
-                    'phone': user.phone,
-                    'role': user.role
-                } if user else None,
-                'status': order.status,
-                'subtotal': float(order.subtotal),
-                'tax': float(order.tax_amount),
-                'shipping_amount': float(order.shipping_amount),
-                'total_amount': float(order.total_amount),
-                'items': [{
-                    'id': item.id,
-                    'book_image': item.book.cover_image_url,
-                    'book_title': item.book_title,
-                    'book_author': item.book_author,
-                    'unit_price': float(item.unit_price),
-                    'quantity': item.quantity,
-                    'total_price': float(item.total_price)
-                }for item in order.items] if order.items else 0,
-                'item_count': len(order.items),
-                'created_at': order.created_at.isoformat(),
+                    'id': summary.user_id,
+                    'name': summary.customer_name,
+                    'email': summary.customer_email,
+                    'phone': summary.customer_phone
+                },
+                'status': summary.status,
+                'payment_status': summary.payment_status,
+                'payment_method': summary.payment_method,
+                'tracking_number': summary.tracking_number,
+                'subtotal': float(summary.subtotal),
+                'tax': float(summary.tax_amount),
+                'shipping_amount': float(summary.shipping_amount),
+                'total_amount': float(summary.total_amount),
+                'items': summary.items,
+                'item_count': summary.item_count,
+                'cover_image': summary.first_cover_image,
+                'created_at': summary.created_at.isoformat(),
                 'shipping_address': {
-                    'full_name': order.shipping_address.full_name,
-                    'city': order.shipping_address.town,
-                    'state': order.shipping_address.county,
-                    'country': order.shipping_address.country
+                    'full_name': summary.shipping_full_name,
+                    'city': summary.shipping_city,
+                    'state': summary.shipping_state,
+                    'country': summary.shipping_country
                 }
             })
         
         return {
             'orders': orders,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination
         }, 200
 
 
 class AdminOrderStatusResource(Resource):
     """Update order status"""
     
-    @jwt_required()
+    @admin_required
     def put(self, order_id):
         """Update order status"""
-        admin_id = get_jwt_identity()
-        admin_user = User.query.get(admin_id)
-        
-        if not admin_user or admin_user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         order = Order.query.get_or_404(order_id)
         
         data = request.get_json()
@@ -405,6 +392,9 @@ class AdminOrderStatusResource(Resource):
             return {'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}, 400
         
         try:
+            before = order.status
+            if status == 'cancelled' and order.status != 'cancelled':
+                return_order_stock(order)
             order.status = status
             
             if tracking_number:
@@ -414,6 +404,8 @@ class AdminOrderStatusResource(Resource):
                 order.customer_note = notes
             
             order.updated_at = datetime.utcnow()
+            OrderSummary.sync(order)
+            move_order(order, before)
             db.session.commit()
             
             return {
@@ -431,15 +423,9 @@ class AdminOrderStatusResource(Resource):
 class AdminReviewsResource(Resource):
     """Admin review management"""
     
-    @jwt_required()
+    @admin_required
     def get(self):
         """Get all reviews"""
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         # Parse query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -448,6 +434,8 @@ class AdminReviewsResource(Resource):
         user_id_filter = request.args.get('user_id')
         sort = request.args.get('sort', 'created_at')
         order = request.args.get('order', 'desc')
+        cursor = request.args.get('cursor')
+        total = request.args.get('total')
         
         # Build query
         query = Review.query
@@ -461,28 +449,18 @@ class AdminReviewsResource(Resource):
         if user_id_filter:
             query = query.filter_by(user_id=user_id_filter)
         print('here')
-        # Apply sorting
-        if sort == 'rating':
-            if order == 'asc':
-                query = query.order_by(Review.rating.asc())
-            else:
-                query = query.order_by(Review.rating.desc())
-        elif sort == 'helpful':
-            if order == 'asc':
-                query = query.order_by(Review.helpful_count.asc())
-            else:
-                query = query.order_by(Review.helpful_count.desc())
-        else:  # created_at
-            if order == 'asc':
-                query = query.order_by(Review.created_at.asc())
-            else:
-                query = query.order_by(Review.created_at.desc())
-        
-        # Pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Apply sorting and pagination (page/per_page, or keyset when a cursor is given)
+        try:
+            items, pagination = paginate(
+                query, REVIEW_SORT_COLUMNS.get(sort, Review.created_at), Review.id,
+                descending=order != 'asc', page=page, per_page=per_page,
+                cursor=cursor, total=total
+            )
+        except InvalidCursor:
+            return {'error': 'Invalid cursor'}, 400
         
         reviews = []
-        for review in pagination.items:
+        for review in items:
             # print(review)
             user = User.query.get(review.user_id)
             book = Book.query.get(review.book_id)
@@ -510,25 +488,16 @@ class AdminReviewsResource(Resource):
         
         return {
             'reviews': reviews,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination
         }, 200
 
 
 class AdminReviewResource(Resource):
     """Admin review management"""
     
-    @jwt_required()
+    @admin_required
     def get(self):
         """Get all reviews with filtering"""
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         # Parse query parameters
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -625,13 +594,9 @@ class AdminReviewResource(Resource):
             }
         }, 200
     
-    @jwt_required()
+    @admin_required
     def put(self, review_id):
         """Update review status"""
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         review = Review.query.get_or_404(review_id)
         
         data = request.get_json()
@@ -643,18 +608,21 @@ class AdminReviewResource(Resource):
                 status = data['status']
                 if status in ['approved', 'rejected']:
                     if status == 'approved':
-                        review.approve(current_user.id)
+                        review.approve(g.user_id)
                         print ('here')
                     else:
-                        review.reject(current_user.id, data.get('admin_response'))
+                        review.reject(g.user_id, data.get('admin_response'))
                         print ('here')
                 else:
+                    before = review.rating_contribution()
                     review.status = status
+                    review.book.apply_rating_change(before, review.rating_contribution())
             
             if 'admin_response' in data:
                 review.moderation_notes = data['admin_response']
             
             db.session.commit()
+            response_cache.invalidate('books', f'book:{review.book_id}')
             
             return {
                 'message': 'Review updated successfully',
@@ -666,18 +634,17 @@ class AdminReviewResource(Resource):
             db.session.rollback()
             return {'error': f'Failed to update review: {str(e)}'}, 500
     
-    @jwt_required()
+    @admin_required
     def delete(self, review_id):
         """Delete review"""
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         review = Review.query.get_or_404(review_id)
         
         try:
+            book_id = review.book_id
+            review.book.apply_rating_change(old=review.rating_contribution())
             db.session.delete(review)
             db.session.commit()
+            response_cache.invalidate('books', f'book:{book_id}')
             
             return {'message': 'Review deleted successfully'}, 200
             
@@ -689,22 +656,19 @@ class AdminReviewResource(Resource):
 class AdminReviewResponseResource(Resource):
     """Admin review responses"""
     
-    @jwt_required()
+    @admin_required
     def post(self, review_id):
         """Add admin response to review"""
-        current_user = User.query.get(get_jwt_identity())
-        if not current_user or current_user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         review = Review.query.get_or_404(review_id)
         
         data = request.get_json()
         if not data or not data.get('content'):
             return {'error': 'Response content required'}, 400
         
+        admin = current_user()
         try:
             review.moderation_notes = data['content']
-            review.moderated_by = current_user.id
+            review.moderated_by = admin.id
             review.moderated_at = datetime.utcnow()
             
             db.session.commit()
@@ -713,7 +677,7 @@ class AdminReviewResponseResource(Resource):
                 'message': 'Response added successfully',
                 'review_id': review.id,
                 'response': {
-                    'adminName': f"{current_user.first_name} {current_user.last_name}".strip() or current_user.username,
+                    'adminName': f"{admin.first_name} {admin.last_name}".strip() or admin.username,
                     'content': data['content'],
                     'createdAt': review.moderated_at.isoformat()
                 }
@@ -1,9 +1,10 @@
-from flask_jwt_extended import create_access_token, set_refresh_cookies, get_jwt_identity, set_access_cookies, unset_access_cookies, jwt_required
+from flask_jwt_extended import set_refresh_cookies, get_jwt_identity, set_access_cookies, unset_access_cookies, jwt_required
 from flask import request, make_response, jsonify
 import re
 from flask_restful import Resource
 from server.models import User
 from server.config import db
+from server.auth import token_for
 
 class Login(Resource):
     def post(self):
@@ -32,7 +33,7 @@ class Login(Resource):
                 'error': 'Incorrect email or password'
             }),401)
         
-        token = create_access_token(identity=user.id, expires_delta=False)
+        token = token_for(user, expires_delta=False)
         
         response = jsonify({
             'msg': 'Login successful',
@@ -109,7 +110,7 @@ class Register(Resource):
             db.session.commit()
             
             # Create token for auto-login after registration
-            token = create_access_token(identity=user.id)
+            token = token_for(user)
             response = make_response({
                 'message': 'Registration successful',
                 'user': user.to_dict(),
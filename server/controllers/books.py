@@ -1,305 +1,202 @@
 # controllers/admin_books.py
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from server.models import Book, Category, Publisher, BookImage, User
+from server.models import Book, Category, Publisher, BookImage, book_categories
 from server.config import db
+from server.search import search_books
+from server.suggest import suggest_index
+from server.pagination import paginate, InvalidCursor
+from server.cache import cached_response, response_cache
+from server.auth import admin_required
+from server.inventory import take_stock, restock, tracks_stock, InsufficientStock
+from server.serializers import (
+    BookSerializer, BOOK_VIEWS, CARD_FIELDS, InvalidFields, REVIEWS_PER_BOOK, MAX_REVIEWS_PER_BOOK,
+    select_fields, serialize_book_rows, serialize_book_detail, book_detail_options
+)
 from datetime import datetime
+from itertools import islice
+import csv
+import io
+import json
 import re
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, update, case
 import decimal
 
+# Sortable columns for the book listing (`sort` query arg)
+BOOK_SORT_COLUMNS = {
+    'title': Book.title,
+    'price': Book.list_price,
+    'rating': Book.average_rating,
+    'total_sold': Book.total_sold,
+    'created_at': Book.created_at,
+}
+
+BESTSELLER_VIEW = BookSerializer(CARD_FIELDS + ('total_sold',))
+
+# Rows fetched per round trip by the catalog export
+EXPORT_BATCH_SIZE = 1000
+
+
+def filter_books(query, args):
+    """Apply the BookListResource filter query args to a Book query"""
+    # Parse query parameters
+    category = args.get('category')
+    author = args.get('author')
+    publisher_slug = args.get('publisher')
+    min_price = args.get('min_price', type=float)
+    max_price = args.get('max_price', type=float)
+    format = args.get('format')
+    language = args.get('language')
+    in_stock = args.get('in_stock', type=lambda v: v.lower() == 'true' if v else None)
+    featured = args.get('featured', type=lambda v: v.lower() == 'true' if v else None)
+    bestseller = args.get('bestseller', type=lambda v: v.lower() == 'true' if v else None)
+    new_release = args.get('new_release', type=lambda v: v.lower() == 'true' if v else None)
+    status = args.get('status')
+    
+    # Apply filters
+    if category:
+        # Join through ix_book_categories_category_book instead of a correlated EXISTS
+        query = query.join(book_categories, book_categories.c.book_id == Book.id).join(
+            Category, Category.id == book_categories.c.category_id
+        ).filter(Category.slug == category)
+    
+    if author:
+        query = query.filter(Book.author.ilike(f"%{author}%"))
+    
+    if publisher_slug:
+        publisher = Publisher.query.filter_by(slug=publisher_slug).first()
+        if publisher:
+            query = query.filter(Book.publisher_id == publisher.id)
+    
+    if min_price is not None:
+        query = query.filter(Book.list_price >= decimal.Decimal(str(min_price)))
+    
+    if max_price is not None:
+        query = query.filter(Book.list_price <= decimal.Decimal(str(max_price)))
+    
+    if format:
+        query = query.filter(Book.format == format)
+    
+    if language:
+        query = query.filter(Book.language == language)
+    
+    if in_stock is not None:
+        query = query.filter(and_(
+            Book.is_available == True,
+            or_(
+                Book.stock_quantity > 0,
+                and_(
+                    Book.allow_backorders == True,
+                    Book.max_backorders > 0
+                )
+            )
+        ))
+    
+    if featured is not None:
+        query = query.filter(Book.is_featured == featured)
+    
+    if bestseller is not None:
+        query = query.filter(Book.is_bestseller == bestseller)
+    
+    if new_release is not None:
+        query = query.filter(Book.is_new_release == new_release)
+    
+    if status:
+        query = query.filter(Book.status == status)
+    
+    return query
+
+
 class BookListResource(Resource):
     """Get all books with optional filters"""
     
+    @cached_response(tags=('books',))
     def get(self):
-        # Parse query parameters
-        category = request.args.get('category')
-        author = request.args.get('author')
-        publisher_slug = request.args.get('publisher')
-        min_price = request.args.get('min_price', type=float)
-        max_price = request.args.get('max_price', type=float)
-        format = request.args.get('format')
-        language = request.args.get('language')
-        in_stock = request.args.get('in_stock', type=lambda v: v.lower() == 'true' if v else None)
-        featured = request.args.get('featured', type=lambda v: v.lower() == 'true' if v else None)
-        bestseller = request.args.get('bestseller', type=lambda v: v.lower() == 'true' if v else None)
-        new_release = request.args.get('new_release', type=lambda v: v.lower() == 'true' if v else None)
-        status = request.args.get('status')
+        return self.list_books(BOOK_VIEWS['list'])
+    
+    def list_books(self, default_view):
+        """Filtered, sorted page of books; `default_view` unless `fields=` is given"""
+        try:
+            view, relations = select_fields(
+                request.args.get('fields'), request.args.get('include'),
+                default_view, default_relations=('categories',)
+            )
+        except InvalidFields as e:
+            return {'error': str(e)}, 400
+        reviews_limit = min(request.args.get('reviews_limit', REVIEWS_PER_BOOK, type=int), MAX_REVIEWS_PER_BOOK)
+        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         sort = request.args.get('sort', 'created_at')
         order = request.args.get('order', 'desc')
+        cursor = request.args.get('cursor')
+        total = request.args.get('total')
         
-        # Base query
-        query = Book.query
-        
-        # Apply filters
-        if category:
-            category_obj = Category.query.filter_by(slug=category).first()
-            if category_obj:
-                query = query.filter(Book.categories.any(id=category_obj.id))
-        
-        if author:
-            query = query.filter(Book.author.ilike(f"%{author}%"))
-        
-        if publisher_slug:
-            publisher = Publisher.query.filter_by(slug=publisher_slug).first()
-            if publisher:
-                query = query.filter(Book.publisher_id == publisher.id)
-        
-        if min_price is not None:
-            query = query.filter(Book.list_price >= decimal.Decimal(str(min_price)))
-        
-        if max_price is not None:
-            query = query.filter(Book.list_price <= decimal.Decimal(str(max_price)))
-        
-        if format:
-            query = query.filter(Book.format == format)
+        query = filter_books(Book.query, request.args)
         
-        if language:
-            query = query.filter(Book.language == language)
+        # Apply sorting and pagination (page/per_page, or keyset when a cursor is given)
+        # Select only the view's columns; rows are serialized without ORM objects
+        sort_column = BOOK_SORT_COLUMNS.get(sort, Book.created_at)
+        query = view.query(query, (sort_column,))
         
-        if in_stock is not None:
-            query = query.filter(and_(
-                Book.is_available == True,
-                or_(
-                    Book.stock_quantity > 0,
-                    and_(
-                        Book.allow_backorders == True,
-                        Book.max_backorders > 0
-                    )
-                )
-            ))
-        
-        if featured is not None:
-            query = query.filter(Book.is_featured == featured)
-        
-        if bestseller is not None:
-            query = query.filter(Book.is_bestseller == bestseller)
-        
-        if new_release is not None:
-            query = query.filter(Book.is_new_release == new_release)
-        
-        if status:
-            query = query.filter(Book.status == status)
-        
-        # Apply sorting
-        if sort == 'title':
-            order_field = Book.title.asc() if order == 'asc' else Book.title.desc()
-        elif sort == 'price':
-            order_field = Book.list_price.asc() if order == 'asc' else Book.list_price.desc()
-        elif sort == 'rating':
-            order_field = Book.average_rating.asc() if order == 'asc' else Book.average_rating.desc()
-        elif sort == 'total_sold':
-            order_field = Book.total_sold.asc() if order == 'asc' else Book.total_sold.desc()
-        else:  # created_at
-            order_field = Book.created_at.asc() if order == 'asc' else Book.created_at.desc()
-        
-        query = query.order_by(order_field)
-        
-        # Pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        books_data = []
-        for book in pagination.items:
-            books_data.append(self._serialize_book(book))
+        try:
+            books, pagination = paginate(
+                query, sort_column, Book.id, descending=order != 'asc',
+                page=page, per_page=per_page, cursor=cursor, total=total
+            )
+        except InvalidCursor:
+            return {'error': 'Invalid cursor'}, 400
         
         return {
-            'books': books_data,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'books': serialize_book_rows(books, view, relations, reviews_limit),
+            'pagination': pagination
         }, 200
-    
-    def _serialize_book(self, book):
-        """Serialize book for list view"""
-        return {
-            'id': book.id,
-            'title': book.title,
-            'isbn_10': book.isbn_10,
-            'isbn_13': book.isbn_13,
-            'author': book.author,
-            'slug': book.slug,
-            'format': book.format,
-            'publication_date': str(book.publication_date),
-            'short_description': book.short_description,
-            'description': book.description,
-            'publisher': book.publisher,
-            'edition': book.edition,
-            'language': book.language,
-            'page_count': book.page_count,
-            'dimensions': book.dimensions,
-            'weight_grams': book.weight_grams,
-            'list_price': float(book.list_price) if book.list_price else None,
-            'sale_price': float(book.sale_price) if book.sale_price else None,
-            'cover_image_url': book.cover_image_url,
-            'cover_image_alt': book.cover_image_alt,
-            'average_rating': int((sum(review.rating for review in book.reviews)) / len(book.reviews))if book.reviews else 0,
-            'rating_count': book.rating_count,
-            'review_count': len(book.reviews),
-            'is_available': book.is_available,
-            'stock_quantity': book.stock_quantity,
-            'is_featured': book.is_featured,
-            'is_bestseller': book.is_bestseller,
-            'is_new_release': book.is_new_release,
-            'total_sold': book.total_sold,
-            'status': book.status,
-            'created_at': book.created_at.isoformat() if book.created_at else None,
-            'discount_percentage': book.calculate_discount_percentage(),
-            'current_price': float(book.get_current_price()),
-            'stock_status': book.get_stock_status(),
-            'categories': [{'id': c.id, 'name': c.name, 'slug': c.slug} for c in book.categories] if book.categories else [],
-            'reviews': [{'id': r.id,'user': r.user.firstName, 'content': r.content, 'helpful_count': r.helpful_count, 'rating': r.rating} for r in book.reviews] if book.reviews else []
-        }
 
 
 class BookResource(Resource):
     """Get single book by ID"""
     
+    @cached_response(tags=lambda id: (f'book:{id}',))
     def get(self, id):
-        book = Book.query.get_or_404(id)
-        return self._serialize_book_detail(book), 200
-    
-    def _serialize_book_detail(self, book):
-        """Serialize book for detail view"""
-        base_data = {
-            'id': book.id,
-            'title': book.title,
-            'author': book.author,
-            'slug': book.slug,
-            'isbn_10': book.isbn_10,
-            'isbn_13': book.isbn_13,
-            'short_description': book.short_description,
-            'description': book.description,
-            'excerpt': book.excerpt,
-            'publisher': book.publisher,
-            'publisher_info': {
-                'id': book.publisher_rel.id,
-                'name': book.publisher_rel.name,
-                'slug': book.publisher_rel.slug
-            } if book.publisher_rel else None,
-            'publication_date': book.publication_date.isoformat() if book.publication_date else None,
-            'edition': book.edition,
-            'language': book.language,
-            'page_count': book.page_count,
-            'format': book.format,
-            'dimensions': book.dimensions,
-            'weight_grams': book.weight_grams,
-            'list_price': float(book.list_price) if book.list_price else None,
-            'sale_price': float(book.sale_price) if book.sale_price else None,
-            'cost_price': float(book.cost_price) if book.cost_price else None,
-            'sku': book.sku,
-            'stock_quantity': book.stock_quantity,
-            'low_stock_threshold': book.low_stock_threshold,
-            'is_available': book.is_available,
-            'allow_backorders': book.allow_backorders,
-            'max_backorders': book.max_backorders,
-            'average_rating': book.average_rating,
-            'rating_count': book.rating_count,
-            'review_count': book.review_count,
-            'meta_title': book.meta_title,
-            'meta_description': book.meta_description,
-            'keywords': book.keywords,
-            'cover_image_url': book.cover_image_url,
-            'cover_image_alt': book.cover_image_alt,
-            'sample_pdf_url': book.sample_pdf_url,
-            'status': book.status,
-            'is_featured': book.is_featured,
-            'is_bestseller': book.is_bestseller,
-            'is_new_release': book.is_new_release,
-            'total_sold': book.total_sold,
-            'total_revenue': float(book.total_revenue) if book.total_revenue else None,
-            'created_at': book.created_at.isoformat() if book.created_at else None,
-            'updated_at': book.updated_at.isoformat() if book.updated_at else None,
-            'published_at': book.published_at.isoformat() if book.published_at else None,
-            'discount_percentage': book.calculate_discount_percentage(),
-            'current_price': float(book.get_current_price()),
-            'stock_status': book.get_stock_status(),
-            'is_in_stock': book.is_in_stock(),
-        }
-        
-        # Add related data
-        base_data['categories'] = [{'id': c.id, 'name': c.name, 'slug': c.slug} for c in book.categories]
-        base_data['images'] = [
-            {
-                'id': img.id,
-                'image_url': img.image_url,
-                'alt_text': img.alt_text,
-                'display_order': img.display_order,
-                'is_main': img.is_main
-            } for img in book.images
-        ]
-        
-        return base_data
+        view = BOOK_VIEWS['detail']
+        book = Book.query.options(*book_detail_options(view)).filter(Book.id == id).first_or_404()
+        return serialize_book_detail(book, view), 200
 
 
 class FeaturedBooksResource(Resource):
     """Get featured books"""
     
+    @cached_response(tags=('books',))
     def get(self):
-        books = Book.query.filter_by(
+        view = BOOK_VIEWS['card']
+        books = view.query(Book.query.filter_by(
             status='published',
             is_featured=True,
             is_available=True
-        ).order_by(Book.created_at.desc()).limit(10).all()
+        ).order_by(Book.created_at.desc())).limit(10).all()
         
-        return {
-            'books': [
-                {
-                    'id': book.id,
-                    'title': book.title,
-                    'author': book.author,
-                    'slug': book.slug,
-                    'short_description': book.short_description,
-                    'list_price': float(book.list_price),
-                    'sale_price': float(book.sale_price) if book.sale_price else None,
-                    'cover_image_url': book.cover_image_url,
-                    'average_rating': book.average_rating,
-                    'current_price': float(book.get_current_price()),
-                    'discount_percentage': book.calculate_discount_percentage()
-                } for book in books
-            ]
-        }, 200
+        return {'books': view.serialize_many(books)}, 200
 
 
 class BestsellerBooksResource(Resource):
     """Get bestsellers"""
     
+    @cached_response(tags=('books',))
     def get(self):
-        books = Book.query.filter_by(
+        view = BESTSELLER_VIEW
+        books = view.query(Book.query.filter_by(
             status='published',
             is_bestseller=True,
             is_available=True
-        ).order_by(Book.total_sold.desc()).limit(10).all()
+        ).order_by(Book.total_sold.desc())).limit(10).all()
         
-        return {
-            'books': [
-                {
-                    'id': book.id,
-                    'title': book.title,
-                    'author': book.author,
-                    'slug': book.slug,
-                    'short_description': book.short_description,
-                    'list_price': float(book.list_price),
-                    'sale_price': float(book.sale_price) if book.sale_price else None,
-                    'cover_image_url': book.cover_image_url,
-                    'average_rating': book.average_rating,
-                    'total_sold': book.total_sold,
-                    'current_price': float(book.get_current_price())
-                } for book in books
-            ]
-        }, 200
+        return {'books': view.serialize_many(books)}, 200
 
 
 class CategoryListResource(Resource):
     """Get all categories"""
     
+    @cached_response(tags=('categories',))
     def get(self):
         categories = Category.query.filter_by(is_active=True).order_by(Category.display_order).all()
         
@@ -312,7 +209,7 @@ class CategoryListResource(Resource):
                     'description': cat.description,
                     'display_order': cat.display_order,
                     'image_url': cat.image_url,
-                    'book_count': 0
+                    'book_count': cat.book_count
                 } for cat in categories
             ]
         }, 200
@@ -328,66 +225,52 @@ class SearchBooksResource(Resource):
         if not search_query or len(search_query) < 2:
             return {'books': []}, 200
         
-        search_term = f"%{search_query}%"
-        
-        # Search in title, author, description, and ISBN
-        books = Book.query.filter(
-            Book.status == 'published',
-            Book.is_available == True,
-            or_(
-                Book.title.ilike(search_term),
-                Book.author.ilike(search_term),
-                Book.short_description.ilike(search_term),
-                Book.description.ilike(search_term),
-                Book.isbn_10.ilike(search_term),
-                Book.isbn_13.ilike(search_term)
+        try:
+            view, relations = select_fields(
+                request.args.get('fields'), request.args.get('include'), BOOK_VIEWS['card']
             )
-        ).limit(limit).all()
+        except InvalidFields as e:
+            return {'error': str(e)}, 400
+        reviews_limit = min(request.args.get('reviews_limit', REVIEWS_PER_BOOK, type=int), MAX_REVIEWS_PER_BOOK)
+        
+        # Ranked full-text search; exact ISBNs short-circuit to a single lookup
+        books = search_books(
+            search_query,
+            limit=limit,
+            query=view.query(Book.query.filter(Book.status == 'published', Book.is_available == True))
+        )
         
         return {
             'query': search_query,
             'count': len(books),
-            'books': [
-                {
-                    'id': book.id,
-                    'title': book.title,
-                    'author': book.author,
-                    'slug': book.slug,
-                    'short_description': book.short_description,
-                    'list_price': float(book.list_price),
-                    'sale_price': float(book.sale_price) if book.sale_price else None,
-                    'cover_image_url': book.cover_image_url,
-                    'average_rating': book.average_rating,
-                    'current_price': float(book.get_current_price())
-                } for book in books
-            ]
+            'books': serialize_book_rows(books, view, relations, reviews_limit)
+        }, 200
+
+
+class SuggestBooksResource(Resource):
+    """Search-as-you-type suggestions served from the in-memory prefix index"""
+    
+    def get(self):
+        prefix = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        
+        return {
+            'query': prefix,
+            'suggestions': suggest_index.suggest(prefix, limit=limit)
         }, 200
 
 
 class AdminBookListResource(Resource):
     """Create book (admin only)"""
     
-    @jwt_required()
+    @admin_required
     def get(self):
         """Admin: Get all books with all statuses"""
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
-        # Reuse the BookListResource logic
-        resource = BookListResource()
-        return resource.get()
+        # Reuse the BookListResource logic with the admin view
+        return BookListResource().list_books(BOOK_VIEWS['admin'])
     
-    @jwt_required()
+    @admin_required
     def post(self):
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         # Check if request has JSON data
         if not request.is_json:
             return {'error': 'Request must be JSON'}, 400
@@ -477,6 +360,7 @@ class AdminBookListResource(Resource):
         
         try:
             db.session.add(book)
+            Category.update_book_counts(set(), book.counted_category_ids())
             db.session.commit()
             
             # Set published_at if status is published
@@ -484,6 +368,9 @@ class AdminBookListResource(Resource):
                 book.published_at = datetime.utcnow()
                 db.session.commit()
             
+            suggest_index.refresh_book(book)
+            response_cache.invalidate('books', 'categories')
+            
             return {
                 'message': 'Book created successfully',
                 'book': {
@@ -499,31 +386,90 @@ class AdminBookListResource(Resource):
             return {'error': f'Failed to create book: {str(e)}'}, 500
 
 
+def _export_batches(query, view, relations):
+    """Serialized books in batches, streamed from a server-side cursor"""
+    rows = iter(query.yield_per(EXPORT_BATCH_SIZE))
+    while True:
+        batch = list(islice(rows, EXPORT_BATCH_SIZE))
+        if not batch:
+            break
+        yield serialize_book_rows(batch, view, relations)
+
+
+def _csv_value(column, value):
+    if column == 'categories':
+        return '|'.join(category['slug'] for category in value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _export_ndjson(batches):
+    for books in batches:
+        yield ''.join(json.dumps(book, default=str) + '\n' for book in books)
+
+
+def _export_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for books in batches:
+        writer.writerows([_csv_value(column, book[column]) for column in columns] for book in books)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class AdminBookExportResource(Resource):
+    """Stream the whole catalog as NDJSON or CSV (admin only)"""
+    
+    @admin_required
+    def get(self):
+        output = request.args.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            return {'error': 'Invalid output. Use: ndjson or csv'}, 400
+        
+        try:
+            view, relations = select_fields(
+                request.args.get('fields'), request.args.get('include'),
+                BOOK_VIEWS['admin'], default_relations=('categories',)
+            )
+        except InvalidFields as e:
+            return {'error': str(e)}, 400
+        
+        # Same filters as the listing; id order so the scan never revisits rows
+        query = view.query(filter_books(Book.query, request.args)).order_by(Book.id)
+        batches = _export_batches(query, view, relations)
+        
+        filename = f"books-{datetime.utcnow().strftime('%Y%m%d')}.{output}"
+        if output == 'csv':
+            body, mimetype = _export_csv(batches, view.names + relations), 'text/csv'
+        else:
+            body, mimetype = _export_ndjson(batches), 'application/x-ndjson'
+        
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
+
 class AdminBookResource(Resource):
     """Update and delete book (admin only)"""
     
-    @jwt_required()
+    @admin_required
     def get(self, id):
         """Admin: Get book details (any status)"""
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
-        book = Book.query.get_or_404(id)
-        resource = BookResource()
-        return resource._serialize_book_detail(book), 200
+        view = BOOK_VIEWS['admin']
+        book = Book.query.options(*book_detail_options(view)).filter(Book.id == id).first_or_404()
+        return serialize_book_detail(book, view), 200
     
-    @jwt_required()
+    @admin_required
     def put(self, id):
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         book = Book.query.get_or_404(id)
+        counted_before = book.counted_category_ids()
         
         # Check if request has JSON data
         if not request.is_json:
@@ -594,7 +540,10 @@ class AdminBookResource(Resource):
             book.published_at = datetime.utcnow()
         
         try:
+            Category.update_book_counts(counted_before, book.counted_category_ids())
             db.session.commit()
+            suggest_index.refresh_book(book)
+            response_cache.invalidate('books', f'book:{book.id}', 'categories')
             
             return {
                 'message': 'Book updated successfully',
@@ -610,21 +559,19 @@ class AdminBookResource(Resource):
             db.session.rollback()
             return {'error': f'Failed to update book: {str(e)}'}, 500
     
-    @jwt_required()
+    @admin_required
     def delete(self, id):
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         book = Book.query.get_or_404(id)
         
         # Instead of deleting, archive the book
         try:
+            counted_before = book.counted_category_ids()
             book.status = 'archived'
             book.is_available = False
+            Category.update_book_counts(counted_before, book.counted_category_ids())
             db.session.commit()
+            suggest_index.refresh_book(book)
+            response_cache.invalidate('books', f'book:{book.id}', 'categories')
             
             return {'message': 'Book archived successfully'}, 200
             
@@ -636,15 +583,9 @@ class AdminBookResource(Resource):
 class AdminBookSalesResource(Resource):
     """Manage book sales and inventory (admin only)"""
     
-    @jwt_required()
+    @admin_required
     def post(self, id):
         """Update stock or process sale"""
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         book = Book.query.get_or_404(id)
         
         # Check if request has JSON data
@@ -665,8 +606,10 @@ class AdminBookSalesResource(Resource):
         
         try:
             if action == 'restock':
-                book.stock_quantity += quantity
+                # Fills outstanding backorders before adding to stock
+                restock(book.id, quantity)
                 db.session.commit()
+                response_cache.invalidate('books', f'book:{book.id}')
                 return {'message': f'Restocked {quantity} units', 'new_stock': book.stock_quantity}, 200
             
             elif action == 'sell':
@@ -674,11 +617,24 @@ class AdminBookSalesResource(Resource):
                 if price is None:
                     return {'error': 'Price is required for sell action'}, 400
                 
-                if book.stock_quantity < quantity and not book.allow_backorders:
-                    return {'error': 'Insufficient stock'}, 400
+                price = decimal.Decimal(str(price))
+                if tracks_stock(book):
+                    try:
+                        take_stock(book.id, quantity)
+                    except InsufficientStock:
+                        db.session.rollback()
+                        return {'error': 'Insufficient stock'}, 400
                 
-                book.increment_sales(quantity, decimal.Decimal(str(price)))
+                # Relative update, so concurrent sales all count
+                db.session.execute(
+                    update(Book).where(Book.id == book.id).values(
+                        total_sold=Book.total_sold + quantity,
+                        total_revenue=Book.total_revenue + price * quantity,
+                        is_bestseller=case((Book.total_sold + quantity >= 100, True), else_=Book.is_bestseller)
+                    ).execution_options(synchronize_session=False)
+                )
                 db.session.commit()
+                response_cache.invalidate('books', f'book:{book.id}')
                 
                 return {
                     'message': f'Sold {quantity} units',
@@ -692,6 +648,7 @@ class AdminBookSalesResource(Resource):
                     return {'error': 'Adjustment quantity cannot be negative'}, 400
                 book.stock_quantity = quantity
                 db.session.commit()
+                response_cache.invalidate('books', f'book:{book.id}')
                 return {'message': f'Stock adjusted to {quantity} units'}, 200
             else:
                 return {'error': 'Invalid action. Use: restock, sell, or adjust'}, 400
@@ -704,15 +661,9 @@ class AdminBookSalesResource(Resource):
 class AdminBookImagesResource(Resource):
     """Manage book images (admin only)"""
     
-    @jwt_required()
+    @admin_required
     def get(self, id):
         """Get all images for a book"""
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         book = Book.query.get_or_404(id)
         
         images = [
@@ -727,15 +678,9 @@ class AdminBookImagesResource(Resource):
         
         return {'images': images}, 200
     
-    @jwt_required()
+    @admin_required
     def post(self, id):
         """Add image to book"""
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         book = Book.query.get_or_404(id)
         
         # Check if request has JSON data
@@ -767,6 +712,7 @@ class AdminBookImagesResource(Resource):
             
             db.session.add(image)
             db.session.commit()
+            response_cache.invalidate(f'book:{book.id}')
             
             return {
                 'message': 'Image added successfully',
@@ -783,20 +729,15 @@ class AdminBookImagesResource(Resource):
             db.session.rollback()
             return {'error': f'Failed to add image: {str(e)}'}, 500
     
-    @jwt_required()
+    @admin_required
     def delete(self, id, image_id):
         """Delete book image"""
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         image = BookImage.query.filter_by(id=image_id, book_id=id).first_or_404()
         
         try:
             db.session.delete(image)
             db.session.commit()
+            response_cache.invalidate(f'book:{id}')
             
             return {'message': 'Image deleted successfully'}, 200
             
@@ -808,21 +749,11 @@ class AdminBookImagesResource(Resource):
 class AdminBookReviewsResource(Resource):
     """Manage book reviews (admin only)"""
     
-    @jwt_required()
+    @admin_required
     def get(self, id):
         """Get all reviews for a book"""
-        current_user = get_jwt_identity()
-        user = User.query.get(current_user['id'])
-        
-        if not user or user.role != 'admin':
-            return {'error': 'Admin access required'}, 403
-        
         book = Book.query.get_or_404(id)
         
-        # Update rating from reviews
-        book.update_rating()
-        db.session.commit()
-        
         reviews = []
         for review in book.reviews:
             reviews.append({
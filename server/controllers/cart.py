@@ -1,9 +1,60 @@
 from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from server.models import Cart, CartItem, Book, User
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from server.models import Cart, CartItem, Book
 from server.config import db
-from datetime import datetime
+from server.serializers import BookSerializer
+from server.inventory import hold_for_cart, release_cart, InsufficientStock
+from server.carts import cart_store
+
+# Book fields embedded in each cart line
+CART_BOOK_VIEW = BookSerializer((
+    'title', 'author', 'cover_image_url', 'list_price', 'sale_price', 'current_price',
+    'stock_quantity', 'is_available',
+))
+
+def _lines_from_store(cart):
+    """(item_id, book_id, quantity, book row) for a cached cart, books read
+    in one primary-key query"""
+    if not cart or not cart['lines']:
+        return []
+    book_ids = [int(book_id) for book_id in cart['lines']]
+    books = {
+        row.id: row for row in CART_BOOK_VIEW.query(Book.query.filter(Book.id.in_(book_ids)), (Book.id,))
+    }
+    lines = [
+        (item_id, int(book_id), quantity, books.get(int(book_id)))
+        for book_id, (item_id, quantity) in cart['lines'].items()
+    ]
+    return sorted(lines, key=lambda line: line[0])
+
+
+def _lines_from_database(user_id):
+    """The cart and, per line, (item_id, book_id, quantity, book row): cart,
+    lines and their books in one query"""
+    rows = db.session.execute(
+        select(
+            Cart.id.label('cart_id'), Cart.created_at.label('cart_created_at'),
+            Cart.updated_at.label('cart_updated_at'),
+            CartItem.id.label('item_id'), CartItem.book_id, CartItem.quantity,
+            *CART_BOOK_VIEW.columns
+        ).select_from(Cart)
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+        .outerjoin(Book, Book.id == CartItem.book_id)
+        .where(Cart.user_id == user_id, Cart.is_active == True)
+        .order_by(CartItem.id)
+    ).all()
+    if not rows:
+        return None, []
+    cart = {
+        'id': rows[0].cart_id,
+        'created_at': rows[0].cart_created_at.isoformat() if rows[0].cart_created_at else None,
+        'updated_at': rows[0].cart_updated_at.isoformat() if rows[0].cart_updated_at else None,
+    }
+    return cart, [(row.item_id, row.book_id, row.quantity, row) for row in rows if row.item_id is not None]
+
 
 class CartResource(Resource):
     """Cart management"""
@@ -12,49 +63,39 @@ class CartResource(Resource):
     def get(self):
         """Get user's cart with items"""
         user_id = get_jwt_identity()
-        print(user_id)
-        # Get or create cart
-        cart = Cart.query.filter_by(user_id=user_id, is_active=True).first()
-        
-        if not cart:
-            cart = Cart(user_id=user_id)
-            db.session.add(cart)
-            db.session.commit()
         
-        # Get cart items with book details
-        cart_items = CartItem.query.filter_by(cart_id=cart.id).all()
+        # No cart yet reads as empty (it is created by the first write)
+        if cart_store.enabled:
+            cart = cart_store.get(user_id)
+            lines = _lines_from_store(cart)
+        else:
+            cart, lines = _lines_from_database(user_id)
         
         items = []
         total_amount = 0
         
-        for item in cart_items:
-            book = Book.query.get(item.book_id)
-            if book and book.is_available:
-                item_total = float(book.get_current_price()) * item.quantity
-                items.append({
-                    'id': item.id,
-                    'book_id': item.book_id,
-                    'title': book.title,
-                    'author': book.author,
-                    'cover_image_url': book.cover_image_url,
-                    'list_price': float(book.list_price),
-                    'sale_price': float(book.sale_price) if book.sale_price else None,
-                    'current_price': float(book.get_current_price()),
-                    'quantity': item.quantity,
-                    'item_total': item_total,
-                    'stock_quantity': book.stock_quantity,
-                    'is_available': book.is_available
-                })
-                total_amount += item_total
+        for item_id, book_id, quantity, book in lines:
+            if book is None or not book.is_available:
+                continue
+            book_data = CART_BOOK_VIEW.serialize(book)
+            item_total = book_data['current_price'] * quantity
+            items.append({
+                'id': item_id,
+                'book_id': book_id,
+                **book_data,
+                'quantity': quantity,
+                'item_total': item_total
+            })
+            total_amount += item_total
         
         return {
-            'cart_id': cart.id,
+            'cart_id': cart['id'] if cart else None,
             'user_id': user_id,
             'items': items,
             'item_count': len(items),
             'total_amount': total_amount,
-            'created_at': cart.created_at.isoformat() if cart.created_at else None,
-            'updated_at': cart.updated_at.isoformat() if cart.updated_at else None
+            'created_at': cart['created_at'] if cart else None,
+            'updated_at': cart['updated_at'] if cart else None
         }, 200
     
     @jwt_required()
@@ -62,20 +103,30 @@ class CartResource(Resource):
         """Clear entire cart"""
         user_id = get_jwt_identity()
         
-        cart = Cart.query.filter_by(user_id=user_id).first()
-        print(cart)
-        if not cart:
-            return {'message': 'Cart not found'}, 404
-        
-        try:
-            # Delete all cart items
-            CartItem.query.filter_by(cart_id=cart.id).delete()
-            db.session.commit()
+        with cart_store.editing(user_id) as cart:
+            if cart.id is None:
+                return {'message': 'Cart not found'}, 404
             
-            return {'message': 'Cart cleared successfully'}, 200
-        except Exception as e:
-            db.session.rollback()
-            return {'error': f'Failed to clear cart: {str(e)}'}, 500
+            try:
+                # Delete all cart items and hand their stock back
+                CartItem.query.filter_by(cart_id=cart.id).delete()
+                release_cart(cart.id)
+                cart.clear()
+                cart.commit()
+                
+                return {'message': 'Cart cleared successfully'}, 200
+            except Exception as e:
+                db.session.rollback()
+                return {'error': f'Failed to clear cart: {str(e)}'}, 500
+
+
+def _missing_item(cart, item_id):
+    """404 for a line that does not exist (or was removed from this cart),
+    403 for another user's"""
+    item = db.session.get(CartItem, item_id)
+    if item is None or item.cart_id == cart.id:
+        return {'error': 'Cart item not found'}, 404
+    return {'error': 'Unauthorized'}, 403
 
 
 class CartItemResource(Resource):
@@ -98,54 +149,163 @@ class CartItemResource(Resource):
             return {'error': 'Book ID is required'}, 400
         
         # Validate book exists and is available
-        book = Book.query.get(book_id)
+        book = db.session.get(Book, book_id)
         if not book:
             return {'error': 'Book not found'}, 404
         
         if not book.is_available:
             return {'error': 'Book is not available'}, 400
         
-        # Check stock
-        if book.stock_quantity < quantity and not book.allow_backorders:
-            return {'error': 'Insufficient stock'}, 400
-        
-        try:
-            # Get or create cart
-            cart = Cart.query.filter_by(user_id=user_id, is_active=True).first()
-            if not cart:
-                cart = Cart(user_id=user_id)
-                db.session.add(cart)
-                db.session.commit()
-            
-            # Check if item already exists in cart
-            cart_item = CartItem.query.filter_by(
-                cart_id=cart.id, 
-                book_id=book_id
-            ).first()
-            
-            if cart_item:
-                # Update quantity
-                cart_item.quantity += quantity
-            else:
-                # Create new cart item
-                cart_item = CartItem(
-                    cart_id=cart.id,
-                    book_id=book_id,
-                    quantity=quantity
-                )
-                db.session.add(cart_item)
-            
-            db.session.commit()
-            
-            return {
-                'message': 'Item added to cart',
-                'cart_item_id': cart_item.id,
-                'quantity': cart_item.quantity
-            }, 201
-            
-        except Exception as e:
-            db.session.rollback()
-            return {'error': f'Failed to add item to cart: {str(e)}'}, 500
+        with cart_store.editing(user_id) as cart:
+            try:
+                cart.ensure()
+                
+                # Add to the line if the book is already in the cart
+                quantity += cart.quantity(book.id)
+                
+                # Reserve the line's stock; fails instead of overselling
+                hold_for_cart(cart.id, book, quantity)
+                cart_item_id = cart.set_quantity(book.id, quantity)
+                cart.commit()
+                
+                return {
+                    'message': 'Item added to cart',
+                    'cart_item_id': cart_item_id,
+                    'quantity': quantity
+                }, 201
+                
+            except InsufficientStock:
+                db.session.rollback()
+                return {'error': 'Insufficient stock'}, 400
+            except Exception as e:
+                db.session.rollback()
+                return {'error': f'Failed to add item to cart: {str(e)}'}, 500
+
+
+# Most changes one batch request may carry
+MAX_BATCH_ITEMS = 100
+BATCH_OPS = ('add', 'set', 'remove')
+
+
+def _parse_batch_item(item):
+    """(op, book_id, quantity) of one batch entry, or an error message"""
+    if not isinstance(item, dict):
+        return 'Each item must be an object'
+    op = item.get('op', 'add')
+    if op not in BATCH_OPS:
+        return f'Invalid op. Must be one of: {", ".join(BATCH_OPS)}'
+    book_id = item.get('bookId')
+    if not isinstance(book_id, int) or isinstance(book_id, bool):
+        return 'Book ID is required'
+    quantity = item.get('quantity', 1)
+    if op != 'remove' and (not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1):
+        return 'Valid quantity is required'
+    return op, book_id, quantity
+
+
+class CartItemBatchResource(Resource):
+    """Several cart changes in one request"""
+    
+    @jwt_required()
+    def post(self):
+        """Apply a list of cart changes in one transaction.
+        
+        Body: {"items": [{"bookId": 1, "quantity": 2, "op": "add"}, ...]}
+        `op` is add (the default; adds to the line), set (replaces its
+        quantity) or remove. Changes to one book apply in the order given.
+        A change that fails (bad entry, unknown or unavailable book, not
+        enough stock) is reported in its result and the others still apply.
+        """
+        user_id = get_jwt_identity()
+        
+        data = request.get_json(silent=True)
+        entries = data.get('items') if isinstance(data, dict) else None
+        if not isinstance(entries, list) or not entries:
+            return {'error': 'items must be a non-empty list'}, 400
+        if len(entries) > MAX_BATCH_ITEMS:
+            return {'error': f'At most {MAX_BATCH_ITEMS} items per batch'}, 400
+        
+        results = []
+        changes = []
+        for index, entry in enumerate(entries):
+            parsed = _parse_batch_item(entry)
+            book_id = entry.get('bookId') if isinstance(entry, dict) else None
+            if isinstance(parsed, str):
+                results.append({'bookId': book_id, 'status': 400, 'error': parsed})
+                continue
+            results.append({'bookId': book_id, 'op': parsed[0]})
+            changes.append((index, *parsed))
+        
+        # Every book in one IN query
+        book_ids = {book_id for _, op, book_id, _ in changes if op != 'remove'}
+        books = {
+            book.id: book for book in Book.query.options(
+                load_only(Book.id, Book.is_available, Book.format)
+            ).filter(Book.id.in_(book_ids))
+        } if book_ids else {}
+        
+        with cart_store.editing(user_id) as cart:
+            try:
+                # Quantity of each book touched so far (0 = not in the cart).
+                # Books are taken in id order so concurrent batches lock their
+                # reservations in the same order.
+                quantities = {}
+                for index, op, book_id, quantity in sorted(changes, key=lambda change: (change[2], change[0])):
+                    result = results[index]
+                    current = quantities.get(book_id, cart.quantity(book_id))
+                    
+                    if op == 'remove':
+                        if not current:
+                            result.update(status=404, error='Book is not in the cart')
+                            continue
+                        release_cart(cart.id, book_id)
+                        quantities[book_id] = 0
+                        result.update(status=200, quantity=0)
+                        continue
+                    
+                    book = books.get(book_id)
+                    if not book:
+                        result.update(status=404, error='Book not found')
+                        continue
+                    if not book.is_available:
+                        result.update(status=400, error='Book is not available')
+                        continue
+                    
+                    target = current + quantity if op == 'add' else quantity
+                    try:
+                        hold_for_cart(cart.ensure(), book, target)
+                    except InsufficientStock:
+                        result.update(status=400, error='Insufficient stock')
+                        continue
+                    quantities[book_id] = target
+                    result.update(status=200, quantity=target)
+                
+                if not any(result.get('status') == 200 for result in results):
+                    db.session.rollback()
+                    return {'results': results, 'applied': 0, 'failed': len(results)}, 400
+                
+                # Lines written in one upsert; removals like a single DELETE
+                item_ids = cart.set_quantities({
+                    book_id: quantity for book_id, quantity in quantities.items() if quantity
+                })
+                for book_id, quantity in quantities.items():
+                    if not quantity and cart.quantity(book_id):
+                        cart.remove(book_id)
+                cart.commit()
+                
+            except Exception as e:
+                db.session.rollback()
+                return {'error': f'Failed to update cart: {str(e)}'}, 500
+        
+        for result in results:
+            if result.get('quantity') and result['bookId'] in item_ids:
+                result['cart_item_id'] = item_ids[result['bookId']]
+        applied = sum(1 for result in results if result.get('status') == 200)
+        return {'results': results, 'applied': applied, 'failed': len(results) - applied}, 200
+
+
+class CartByID(Resource):
+    """A single cart line"""
     
     @jwt_required()
     def put(self, item_id):
@@ -160,61 +320,52 @@ class CartItemResource(Resource):
         if quantity is None or quantity < 1:
             return {'error': 'Valid quantity is required'}, 400
         
-        # Find cart item
-        cart_item = CartItem.query.get(item_id)
-        if not cart_item:
-            return {'error': 'Cart item not found'}, 404
-        
-        # Verify cart belongs to user
-        cart = Cart.query.get(cart_item.cart_id)
-        if cart.user_id != user_id:
-            return {'error': 'Unauthorized'}, 403
-        
-        # Validate book availability
-        book = Book.query.get(cart_item.book_id)
-        if not book.is_available:
-            return {'error': 'Book is no longer available'}, 400
-        
-        # Check stock
-        if book.stock_quantity < quantity and not book.allow_backorders:
-            return {'error': 'Insufficient stock'}, 400
-        
-        try:
-            cart_item.quantity = quantity
-            cart_item.updated_at = datetime.utcnow()
-            db.session.commit()
+        with cart_store.editing(user_id) as cart:
+            # Find the line in the user's cart
+            book_id = cart.book_for(item_id)
+            if book_id is None:
+                return _missing_item(cart, item_id)
             
-            return {
-                'message': 'Cart item updated',
-                'quantity': cart_item.quantity
-            }, 200
+            # Validate book availability
+            book = db.session.get(Book, book_id)
+            if not book or not book.is_available:
+                return {'error': 'Book is no longer available'}, 400
             
-        except Exception as e:
-            db.session.rollback()
-            return {'error': f'Failed to update cart item: {str(e)}'}, 500
-
-class CartByID(Resource):
+            try:
+                hold_for_cart(cart.id, book, quantity)
+                cart.set_quantity(book_id, quantity)
+                cart.commit()
+                
+                return {
+                    'message': 'Cart item updated',
+                    'quantity': quantity
+                }, 200
+                
+            except InsufficientStock:
+                db.session.rollback()
+                return {'error': 'Insufficient stock'}, 400
+            except Exception as e:
+                db.session.rollback()
+                return {'error': f'Failed to update cart item: {str(e)}'}, 500
+    
     @jwt_required()
     def delete(self, item_id):
         """Remove item from cart"""
         user_id = get_jwt_identity()
         
-        # Find cart item
-        cart_item = CartItem.query.get(item_id)
-        if not cart_item:
-            return {'error': 'Cart item not found'}, 404
-        print('removing from cart')
-        # Verify cart belongs to user
-        cart = Cart.query.get(cart_item.cart_id)
-        if cart.user_id != user_id:
-            return {'error': 'Unauthorized'}, 403
-        
-        try:
-            db.session.delete(cart_item)
-            db.session.commit()
-            
-            return {'message': 'Item removed from cart'}, 200
+        with cart_store.editing(user_id) as cart:
+            # Find the line in the user's cart
+            book_id = cart.book_for(item_id)
+            if book_id is None:
+                return _missing_item(cart, item_id)
             
-        except Exception as e:
-            db.session.rollback()
-            return {'error': f'Failed to remove item: {str(e)}'}, 500
\ No newline at end of file
+            try:
+                release_cart(cart.id, book_id)
+                cart.remove(book_id)
+                cart.commit()
+                
+                return {'message': 'Item removed from cart'}, 200
+                
+            except Exception as e:
+                db.session.rollback()
+                return {'error': f'Failed to remove item: {str(e)}'}, 500
\ No newline at end of file
@@ -1,11 +1,31 @@
 from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from server.models import Order, OrderItem, Cart, CartItem, Book, User, Address, Payment
+from server.models import Order, OrderItem, OrderSummary, Cart, CartItem, Book, User, Address, Payment
 from server.config import db
+from server.pagination import paginate, InvalidCursor
+from server.inventory import commit_cart, return_order_stock, InsufficientStock
+from server.idempotency import idempotent
+from server.carts import cart_store, cart_locked
+from server.jobs import enqueue
+from server.payments import start_mpesa_payment
+from server.mpesa import normalize_phone
+from server.sales import record_order, move_order
+from flask import current_app
 from datetime import datetime
+from sqlalchemy import insert, select, update, case, func
+from sqlalchemy.orm import contains_eager
+from functools import wraps
 import decimal
 
+
+def _per_book(items_details, key):
+    """CASE books.id WHEN ... expression summing `key` per book over checkout lines"""
+    totals = {}
+    for detail in items_details:
+        totals[detail['book'].id] = totals.get(detail['book'].id, 0) + detail[key]
+    return case(totals, value=Book.id, else_=0)
+
 class OrderListResource(Resource):
     """Order management"""
     
@@ -18,56 +38,60 @@ class OrderListResource(Resource):
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         status = request.args.get('status')
+        cursor = request.args.get('cursor')
+        total = request.args.get('total')
         
-        # Build query
-        query = Order.query.filter_by(user_id=user_id)
+        # One indexed scan of the order read model, no per-row loads
+        query = OrderSummary.query.filter_by(user_id=user_id)
         
         if status:
             query = query.filter_by(status=status)
         
-        # Order by latest first
-        query = query.order_by(Order.created_at.desc())
-        
-        # Pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Latest first, paginated by page/per_page or keyset cursor
+        try:
+            items, pagination = paginate(
+                query, OrderSummary.created_at, OrderSummary.order_id, descending=True,
+                page=page, per_page=per_page, cursor=cursor, total=total
+            )
+        except InvalidCursor:
+            return {'error': 'Invalid cursor'}, 400
         
         orders = []
-        for order in pagination.items:
+        for summary in items:
             orders.append({
-                'id': order.id,
-                'order_number': order.order_number,
-                'status': order.status,
-                'total_amount': float(order.total_amount),
-                'item_count': order.item_count if hasattr(order, 'item_count') else len(order.items) if order.items else 0,
-                'created_at': order.created_at.isoformat(),
-                'updated_at': order.updated_at.isoformat() if order.updated_at else None,
-                'payment_method': order.payment_method if hasattr(order, 'payment_method') else None,
-                'tracking_number': order.tracking_number if hasattr(order, 'tracking_number') else None,
-                'estimated_delivery': order.estimated_delivery.isoformat() if hasattr(order, 'estimated_delivery') and order.estimated_delivery else None,
+                'id': summary.order_id,
+                'order_number': summary.order_number,
+                'status': summary.status,
+                'payment_status': summary.payment_status,
+                'total_amount': float(summary.total_amount),
+                'item_count': summary.item_count,
+                'cover_image': summary.first_cover_image,
+                'created_at': summary.created_at.isoformat(),
+                'updated_at': summary.updated_at.isoformat() if summary.updated_at else None,
+                'payment_method': summary.payment_method,
+                'tracking_number': summary.tracking_number,
                 'shipping_address': {
-                    'full_name': order.shipping_full_name,
-                    'street': order.shipping_street,
-                    'city': order.shipping_city,
-                    'state': order.shipping_state,
-                    'postal_code': order.shipping_postal_code,
-                    'country': order.shipping_country,
-                    'phone': order.shipping_phone
-                } if hasattr(order, 'shipping_full_name') and order.shipping_full_name else None
+                    'full_name': summary.shipping_full_name,
+                    'city': summary.shipping_city,
+                    'state': summary.shipping_state,
+                    'country': summary.shipping_country
+                } if summary.shipping_full_name else None
             })
         
         return {
             'orders': orders,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination
         }, 200
     
     @jwt_required()
+    @idempotent()
+    @cart_locked
     def post(self):
-        """Create order from cart with new shipping address"""
+        """Create order from cart with new shipping address.
+        
+        Send an Idempotency-Key header to make retries safe: a repeated key
+        returns the first response instead of placing another order.
+        """
         user_id = get_jwt_identity()
         
         data = request.get_json()
@@ -114,7 +138,11 @@ class OrderListResource(Resource):
         
         # Payment method and M-Pesa phone
         payment_method = data.get('payment_method', 'mpesa')
-        mpesa_phone = data.get('mpesa_phone') if payment_method == 'mpesa' else None
+        mpesa_phone = None
+        if payment_method == 'mpesa':
+            mpesa_phone = normalize_phone(data.get('mpesa_phone') or shipping_address['phone'])
+            if not mpesa_phone:
+                return {'error': 'A valid M-Pesa phone number is required'}, 400
         
         # Notes (optional)
         notes = data.get('notes', '')
@@ -124,41 +152,48 @@ class OrderListResource(Resource):
         tax_amount = decimal.Decimal(str(data.get('tax_amount', '0.00')))
         
         try:
-            # Get user's active cart
-            cart = Cart.query.filter_by(user_id=user_id, is_active=True).first()
-            if not cart:
-                return {'error': 'Cart is empty'}, 400
+            user = db.session.get(User, user_id)
             
-            cart_items = CartItem.query.filter_by(cart_id=cart.id).all()
+            # Active cart and its items in one query, with the quantity
+            # changes the cart store has not written yet (0 removes a line)
+            pending = cart_store.pending_for(user_id)
+            cart_items = CartItem.query.join(Cart).options(contains_eager(CartItem.cart)).filter(
+                Cart.user_id == user_id, Cart.is_active == True
+            ).order_by(CartItem.id).all()
+            quantities = {item.id: pending.get(item.id, item.quantity) for item in cart_items}
+            cart_items = [item for item in cart_items if quantities[item.id]]
             if not cart_items:
                 return {'error': 'Cart is empty'}, 400
+            cart = cart_items[0].cart
+            
+            # All cart books in one IN query; stock is already reserved for
+            # the cart and is settled by commit_cart below
+            book_ids = sorted({item.book_id for item in cart_items})
+            books = {book.id: book for book in Book.query.filter(Book.id.in_(book_ids)).all()}
             
             # Validate cart items and calculate totals
             subtotal = decimal.Decimal('0.00')
-            item_count = 0
             items_details = []
             
             for cart_item in cart_items:
-                book = Book.query.get(cart_item.book_id)
+                book = books.get(cart_item.book_id)
                 if not book:
+                    db.session.rollback()
                     return {'error': f'Book with ID {cart_item.book_id} not found'}, 404
                 
                 if not book.is_available:
+                    db.session.rollback()
                     return {'error': f'Book "{book.title}" is no longer available'}, 400
                 
-                # Check stock for physical books
-                if book.format != 'ebook' and book.stock_quantity < cart_item.quantity and not book.allow_backorders:
-                    return {'error': f'Insufficient stock for "{book.title}"'}, 400
-                
                 price = book.get_current_price()
-                item_total = price * cart_item.quantity
+                quantity = quantities[cart_item.id]
+                item_total = price * quantity
                 subtotal += item_total
-                item_count += cart_item.quantity
                 
-                # Store item details for order creation
                 items_details.append({
                     'book': book,
                     'cart_item': cart_item,
+                    'quantity': quantity,
                     'price': price,
                     'item_total': item_total
                 })
@@ -166,9 +201,9 @@ class OrderListResource(Resource):
             # Calculate total
             total_amount = subtotal + shipping_cost + tax_amount
             
-            # Generate order number
-            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            order_number = f'ORD-{timestamp}-{user_id:04d}'
+            # Unique even for double submits and concurrent workers
+            order_number = Order.generate_order_number()
+            payment_number = Payment.generate_payment_number()
             
             # Build full name if not provided
             full_name = shipping_address.get('full_name')
@@ -187,20 +222,19 @@ class OrderListResource(Resource):
                 phone=shipping_address['phone'],
                 address_line1=shipping_address['address_line1']
             )
-
-            db.session.add(shipping)
-            db.session.commit()
-            # Create order with shipping address
+            
+            # Address, order and payment are flushed together below; created_at
+            # is set here so the response needs no reload
             order = Order(
                 user_id=user_id,
                 order_number=order_number,
                 total_amount=total_amount,
-                # item_count=item_count,
                 status='pending',  # Initial status
                 payment_method=payment_method,
                 customer_note=notes,
-                shipping_address_id=shipping.id,
-                billing_address_id=shipping.id,
+                shipping_address=shipping,
+                billing_address=shipping,
+                created_at=datetime.utcnow(),
                 
                 # Store financial breakdown
                 subtotal=subtotal,
@@ -208,114 +242,117 @@ class OrderListResource(Resource):
                 tax_amount=tax_amount
             )
             
-            db.session.add(order)
-            db.session.flush()  # Get order ID
             
-            # Create order items and update book stock/sales
-            order_items = []
-            for item_detail in items_details:
-                book = item_detail['book']
-                cart_item = item_detail['cart_item']
-                price = item_detail['price']
-                
-                order_item = OrderItem(
-                    order_id=order.id,
-                    book_id=book.id,
-                    quantity=cart_item.quantity,
-                    unit_price=price,
-                    book_title=book.title,
-                    book_author=book.author,
-                    total_price=price*cart_item.quantity,
-                    cover_image=book.cover_image_url,
-                )
-                db.session.add(order_item)
-                order_items.append(order_item)
-                
-                # Update book stock for physical books
-                if book.format != 'ebook':
-                    if book.stock_quantity >= cart_item.quantity:
-                        book.stock_quantity -= cart_item.quantity
-                    # If allow_backorders, don't reduce stock
-                
-                # Update book sales statistics
-                book.total_sold = (book.total_sold or 0) + cart_item.quantity
-                book.total_revenue = (book.total_revenue or decimal.Decimal('0.00')) + item_detail['item_total']
-                
-                # Remove from cart
-                db.session.delete(cart_item)
-            
-            # Deactivate cart
-            cart.is_active = False
-            cart.updated_at = datetime.utcnow()
-            
-            # Simulate M-Pesa payment if selected
-            if payment_method == 'mpesa':
-                # Simulate successful M-Pesa payment
-                payment_status = 'paid'
-                transaction_id = f'MPESA{int(datetime.utcnow().timestamp())}'
-                order.status = 'processing'  # Move to processing after payment
-                
-                # You could add a delay here to simulate real payment processing
-                # For now, we'll mark it as completed immediately
-                print(f"Simulating M-Pesa payment for phone: {mpesa_phone}")
-                print(f"Transaction ID: {transaction_id}")
+            # M-Pesa orders stay pending until the STK push is answered
+            # (see server/payments.py); COD orders until delivery
+            if payment_method in ('mpesa', 'cash'):
+                payment_status = 'pending'
+                transaction_id = None
+                order.status = 'pending'
             else:
-                # For other payment methods, set appropriate status
-                if payment_method == 'cash':
-                    payment_status = 'pending'
-                    transaction_id = None
-                    order.status = 'pending'  # COD orders stay pending until delivery
-                else:
-                    payment_status = 'paid'
-                    transaction_id = f'{payment_method.upper()}{int(datetime.utcnow().timestamp())}'
-                    order.status = 'processing'
+                payment_status = 'paid'
+                transaction_id = f"{payment_method.upper()}{payment_number.split('-', 1)[1].replace('-', '')}"
+                order.status = 'processing'
+            order.payment_status = payment_status
             
             # Create payment record
             payment = Payment(
-                order_id=order.id,
-                payment_number=transaction_id,
+                order=order,
+                payment_number=payment_number,
                 amount=total_amount,
                 method=payment_method,
                 status=payment_status,
-                customer_phone='+25474511366',
+                customer_phone=mpesa_phone or shipping_address['phone'],
                 completed_at=datetime.utcnow() if payment_status == 'paid' else None
             )
-            db.session.add(payment)
+            db.session.add_all([shipping, order, payment])
+            db.session.flush()
             
-            db.session.commit()
+            # The cart's reservations become the order's, topped up where
+            # they expired or the cart predates them
+            try:
+                commit_cart(cart.id, order.id, [
+                    (detail['book'], detail['quantity']) for detail in items_details
+                ])
+            except InsufficientStock as e:
+                db.session.rollback()
+                return {'error': f'Insufficient stock for "{books[e.book_id].title}"'}, 400
             
-            # Return order details
-            return {
+            # Order items in one bulk INSERT, ids read back in insertion order
+            order_items = [
+                {
+                    'order_id': order.id,
+                    'book_id': detail['book'].id,
+                    'quantity': detail['quantity'],
+                    'unit_price': detail['price'],
+                    'book_title': detail['book'].title,
+                    'book_author': detail['book'].author,
+                    'total_price': detail['item_total'],
+                    'cover_image': detail['book'].cover_image_url,
+                } for detail in items_details
+            ]
+            db.session.execute(insert(OrderItem), order_items)
+            item_ids = db.session.execute(
+                select(OrderItem.id).where(OrderItem.order_id == order.id).order_by(OrderItem.id)
+            ).scalars().all()
+            
+            # List endpoints read the summary, written in this transaction
+            OrderSummary.write(order, user, shipping, zip(item_ids, order_items))
+            
+            # Sales figures for every book in one relative UPDATE
+            db.session.execute(
+                update(Book).where(Book.id.in_(book_ids)).values(
+                    total_sold=func.coalesce(Book.total_sold, 0) + _per_book(items_details, 'quantity'),
+                    total_revenue=func.coalesce(Book.total_revenue, 0) + _per_book(items_details, 'item_total')
+                ).execution_options(synchronize_session=False)
+            )
+            
+            # Empty and deactivate the cart
+            CartItem.query.filter(CartItem.cart_id == cart.id).delete(synchronize_session=False)
+            cart.is_active = False
+            cart.updated_at = datetime.utcnow()
+            
+            # The STK push goes out from the job worker once this commits
+            if payment_method == 'mpesa':
+                start_mpesa_payment(payment)
+            
+            # Dashboard rollups last: their rows are shared with concurrent checkouts
+            record_order(order)
+            db.session.flush()
+            
+            # Build the response from the flushed objects (commit expires them)
+            response = {
                 'message': 'Order created successfully',
                 'order': {
                     'id': order.id,
                     'order_number': order.order_number,
                     'status': order.status,
                     'total_amount': float(order.total_amount),
-                    'item_count': len(order.items)if order.items else 0,
+                    'item_count': len(order_items),
                     'created_at': order.created_at.isoformat(),
                     'payment_method': order.payment_method,
                     'payment_status': payment_status,
+                    'payment_number': payment_number,
                     'transaction_id': transaction_id,
                     'shipping_address': {
-                        'full_name': order.shipping_address.full_name,
-                        'city': order.shipping_address.town,
-                        'state': order.shipping_address.county,
-                        'postal_code': order.shipping_address.postal_code,
-                        'country': order.shipping_address.country,
-                        'phone': order.user.phone,
-                        'email': order.user.email
+                        'full_name': shipping.full_name,
+                        'city': shipping.town,
+                        'state': shipping.county,
+                        'postal_code': shipping.postal_code,
+                        'country': shipping.country,
+                        'phone': user.phone,
+                        'email': user.email
                     },
                     'items': [
                         {
-                            'id': item.id,
-                            'book_id': item.book_id,
-                            'quantity': item.quantity,
-                            'unit_price': float(item.unit_price),
-                            'book_title': item.book_title,
-                            'book_author': item.book_author,
-                            'book_cover_url': item.cover_image
-                        } for item in order_items
+                            'id': item_id,
+                            'book_id': item['book_id'],
+                            'quantity': item['quantity'],
+                            'unit_price': float(item['unit_price']),
+                            'book_title': item['book_title'],
+                            'book_author': item['book_author'],
+                            'book_cover_url': item['cover_image']
+                        } for item_id, item in zip(item_ids, order_items)
                     ],
                     'financial_details': {
                         'subtotal': float(order.subtotal),
@@ -324,7 +361,12 @@ class OrderListResource(Resource):
                         'total': float(order.total_amount)
                     }
                 }
-            }, 201
+            }
+            
+            db.session.commit()
+            cart_store.checked_out(user_id, pending)
+            
+            return response, 201
             
         except Exception as e:
             db.session.rollback()
@@ -415,15 +457,14 @@ class OrderResource(Resource):
         # Only allow cancellation of pending or processing orders
         if data.get('action') == 'cancel' and order.status in ['pending', 'processing']:
             try:
+                before = order.status
                 order.status = 'cancelled'
                 order.updated_at = datetime.utcnow()
+                OrderSummary.sync(order)
                 
-                # Restock items if order is cancelled
-                if order.status in ['pending', 'processing']:
-                    for item in order.items:
-                        book = Book.query.get(item.book_id)
-                        if book and book.format != 'ebook':
-                            book.stock_quantity += item.quantity
+                # Hand the order's stock back
+                return_order_stock(order)
+                move_order(order, before)
                 
                 db.session.commit()
                 
@@ -439,60 +480,44 @@ class OrderResource(Resource):
         return {'error': 'Invalid action or order cannot be cancelled'}, 400
 
 
-# Add endpoint to simulate M-Pesa callback (for testing)
+def _callback_token_required(f):
+    """Safaricom does not sign callbacks; with MPESA_CALLBACK_TOKEN set, the
+    callback URL must carry `?token=...` for the request to be accepted"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('MPESA_CALLBACK_TOKEN')
+        if token and request.args.get('token') != token:
+            return {'error': 'Forbidden'}, 403
+        return f(*args, **kwargs)
+    return wrapper
+
+
+def _callback_key():
+    """Deduplicate callbacks per payment, keyed to the order's owner"""
+    data = request.get_json(silent=True) or {}
+    stk = (data.get('Body') or {}).get('stkCallback') or {}
+    payment = Payment.query.filter_by(
+        checkout_request_id=stk['CheckoutRequestID']
+    ).first() if stk.get('CheckoutRequestID') else None
+    if not payment:
+        return None
+    return payment.order.user_id, f'mpesa-callback:{payment.id}'
+
+
 class MpesaCallbackResource(Resource):
-    """Simulate M-Pesa callback for testing"""
+    """M-Pesa STK push result callback (MPESA_CALLBACK_URL)"""
     
+    @_callback_token_required
+    @idempotent(key_func=_callback_key)
     def post(self):
-        """Simulate M-Pesa callback"""
-        data = request.get_json()
-        
-        # This would be called by Safaricom's M-Pesa API
-        # For simulation, we accept a manual callback
-        transaction_id = data.get('transaction_id')
-        status = data.get('status', 'completed')  # 'completed' or 'failed'
-        
-        if not transaction_id:
-            return {'error': 'Transaction ID required'}, 400
+        """Queue the callback for the payment worker and acknowledge it;
+        duplicate deliveries replay the first acknowledgement"""
+        data = request.get_json(silent=True) or {}
+        stk = (data.get('Body') or {}).get('stkCallback') or {}
+        if not stk.get('CheckoutRequestID') or 'ResultCode' not in stk:
+            return {'ResultCode': 1, 'ResultDesc': 'Invalid callback payload'}, 400
         
-        # Find payment by transaction ID
-        payment = Payment.query.filter_by(transaction_id=transaction_id).first()
-        if not payment:
-            return {'error': 'Payment not found'}, 404
+        enqueue('mpesa.callback', {'callback': data})
+        db.session.commit()
         
-        order = Order.query.get(payment.order_id)
-        if not order:
-            return {'error': 'Order not found'}, 404
-        
-        try:
-            if status == 'completed':
-                payment.status = 'completed'
-                payment.paid_at = datetime.utcnow()
-                order.status = 'processing'
-                
-                # Update payment response data
-                payment.response_data = str(data)
-                
-                db.session.commit()
-                
-                return {
-                    'message': 'Payment confirmed successfully',
-                    'order_id': order.id,
-                    'order_status': order.status,
-                    'payment_status': payment.status
-                }, 200
-            else:
-                payment.status = 'failed'
-                payment.response_data = str(data)
-                db.session.commit()
-                
-                return {
-                    'message': 'Payment failed',
-                    'order_id': order.id,
-                    'order_status': order.status,
-                    'payment_status': payment.status
-                }, 200
-                
-        except Exception as e:
-            db.session.rollback()
-            return {'error': f'Failed to process callback: {str(e)}'}, 500
\ No newline at end of file
+        return {'ResultCode': 0, 'ResultDesc': 'Accepted'}, 200
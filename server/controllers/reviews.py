@@ -3,8 +3,18 @@ from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from server.models import Review, Book, User, Order, OrderItem
 from server.config import db
+from server.pagination import paginate, InvalidCursor
+from server.cache import response_cache
+from server.auth import is_admin
 from datetime import datetime
 
+# Sortable columns for review listings (`sort` query arg)
+REVIEW_SORT_COLUMNS = {
+    'rating': Review.rating,
+    'helpful': Review.helpful_count,
+    'created_at': Review.created_at,
+}
+
 class BookReviewsResource(Resource):
     """Get reviews for a book"""
     
@@ -16,6 +26,8 @@ class BookReviewsResource(Resource):
         sort = request.args.get('sort', 'created_at')
         order = request.args.get('order', 'desc')
         status = request.args.get('status', 'published')
+        cursor = request.args.get('cursor')
+        total = request.args.get('total')
         
         # Verify book exists
         book = Book.query.get(book_id)
@@ -28,28 +40,18 @@ class BookReviewsResource(Resource):
         if status:
             query = query.filter_by(status=status)
         
-        # Apply sorting
-        if sort == 'rating':
-            if order == 'asc':
-                query = query.order_by(Review.rating.asc())
-            else:
-                query = query.order_by(Review.rating.desc())
-        elif sort == 'helpful':
-            if order == 'asc':
-                query = query.order_by(Review.helpful_count.asc())
-            else:
-                query = query.order_by(Review.helpful_count.desc())
-        else:  # created_at
-            if order == 'asc':
-                query = query.order_by(Review.created_at.asc())
-            else:
-                query = query.order_by(Review.created_at.desc())
-        
-        # Pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Apply sorting and pagination (page/per_page, or keyset when a cursor is given)
+        try:
+            items, pagination = paginate(
+                query, REVIEW_SORT_COLUMNS.get(sort, Review.created_at), Review.id,
+                descending=order != 'asc', page=page, per_page=per_page,
+                cursor=cursor, total=total
+            )
+        except InvalidCursor:
+            return {'error': 'Invalid cursor'}, 400
         
         reviews = []
-        for review in pagination.items:
+        for review in items:
             user = User.query.get(review.user_id)
             reviews.append({
                 'id': review.id,
@@ -70,18 +72,8 @@ class BookReviewsResource(Resource):
                 'admin_response': review.admin_response
             })
         
-        # Calculate rating distribution
-        rating_stats = db.session.query(
-            Review.rating,
-            db.func.count(Review.id)
-        ).filter(
-            Review.book_id == book_id,
-            Review.status == 'published'
-        ).group_by(Review.rating).all()
-        
-        rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for rating, count in rating_stats:
-            rating_distribution[rating] = count
+        # Rating distribution is maintained on the book row
+        rating_distribution = book.get_rating_distribution()
         
         return {
             'book_id': book_id,
@@ -91,18 +83,13 @@ class BookReviewsResource(Resource):
             'review_count': book.review_count,
             'rating_distribution': rating_distribution,
             'reviews': reviews,
-            'pagination': {
-                'page': pagination.page,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'pages': pagination.pages
-            }
+            'pagination': pagination
         }, 200
     
     @jwt_required()
     def post(self, book_id):
         """Create a review for a book"""
-        user_id = get_jwt_identity()['id']
+        user_id = get_jwt_identity()
         
         data = request.get_json()
         if not data:
@@ -149,14 +136,13 @@ class BookReviewsResource(Resource):
                 rating=rating,
                 content=content,
                 status='pending',  # Could be 'published' based on moderation settings
-                verified_purchase=verified_purchase
+                is_verified_purchase=verified_purchase
             )
             
             db.session.add(review)
-            db.session.commit()
             
             # Update book rating stats
-            book.update_rating()
+            book.apply_rating_change(new=review.rating_contribution())
             db.session.commit()
             
             return {
@@ -176,7 +162,7 @@ class ReviewResource(Resource):
     @jwt_required()
     def put(self, review_id):
         """Update review"""
-        user_id = get_jwt_identity()['id']
+        user_id = get_jwt_identity()
         
         review = Review.query.get_or_404(review_id)
         
@@ -189,6 +175,8 @@ class ReviewResource(Resource):
             return {'error': 'No data provided'}, 400
         
         try:
+            before = review.rating_contribution()
+            
             if 'rating' in data:
                 rating = data['rating']
                 if isinstance(rating, (int, float)) and 1 <= rating <= 5:
@@ -200,13 +188,11 @@ class ReviewResource(Resource):
                     review.content = content
             
             review.updated_at = datetime.utcnow()
-            db.session.commit()
             
             # Update book rating stats
-            book = Book.query.get(review.book_id)
-            if book:
-                book.update_rating()
-                db.session.commit()
+            review.book.apply_rating_change(before, review.rating_contribution())
+            db.session.commit()
+            response_cache.invalidate('books', f'book:{review.book_id}')
             
             return {
                 'message': 'Review updated successfully',
@@ -220,27 +206,21 @@ class ReviewResource(Resource):
     @jwt_required()
     def delete(self, review_id):
         """Delete review"""
-        user_id = get_jwt_identity()['id']
+        user_id = get_jwt_identity()
         
         review = Review.query.get_or_404(review_id)
         
         # Check authorization
-        if review.user_id != user_id:
-            # Check if user is admin
-            user = User.query.get(user_id)
-            if not user or user.role != 'admin':
-                return {'error': 'Unauthorized'}, 403
+        if review.user_id != user_id and not is_admin():
+            return {'error': 'Unauthorized'}, 403
         
         try:
+            # Update book rating stats
             book_id = review.book_id
+            review.book.apply_rating_change(old=review.rating_contribution())
             db.session.delete(review)
             db.session.commit()
-            
-            # Update book rating stats
-            book = Book.query.get(book_id)
-            if book:
-                book.update_rating()
-                db.session.commit()
+            response_cache.invalidate('books', f'book:{book_id}')
             
             return {'message': 'Review deleted successfully'}, 200
             
@@ -255,7 +235,7 @@ class ReviewHelpfulResource(Resource):
     @jwt_required()
     def post(self, review_id, action):
         """Mark review as helpful or unhelpful"""
-        user_id = get_jwt_identity()['id']
+        user_id = get_jwt_identity()
         
         review = Review.query.get_or_404(review_id)
         
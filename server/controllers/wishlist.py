@@ -1,58 +1,69 @@
 from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from server.models import Wishlist, WishlistItem, Book, Cart, CartItem
+from sqlalchemy import select
+from server.models import Wishlist, WishlistItem, Book
+from server.inventory import hold_for_cart, InsufficientStock
+from server.carts import cart_store
 from server.config import db
+from server.serializers import BookSerializer
 from datetime import datetime
 
+# Book fields embedded in each wishlist entry
+WISHLIST_BOOK_VIEW = BookSerializer((
+    'title', 'author', 'cover_image_url', 'list_price', 'sale_price', 'current_price',
+    'is_available', 'stock_quantity', 'average_rating', 'rating_count', 'discount_percentage',
+))
+
 class WishlistResource(Resource):
     """Wishlist management"""
     
     @jwt_required()
     def get(self):
-        """Get user's wishlist"""
+        """Get user's wishlist: wishlist, items and their books in one query"""
         user_id = get_jwt_identity()
         
-        # Get or create wishlist
-        wishlist = Wishlist.query.filter_by(user_id=user_id).first()
-        
-        if not wishlist:
-            wishlist = Wishlist(user_id=user_id)
-            db.session.add(wishlist)
-            db.session.commit()
-        
-        # Get wishlist items with book details
-        wishlist_items = WishlistItem.query.filter_by(wishlist_id=wishlist.id).all()
-        
+        rows = db.session.execute(
+            select(
+                Wishlist.id.label('wishlist_id'), Wishlist.created_at.label('wishlist_created_at'),
+                Wishlist.updated_at.label('wishlist_updated_at'),
+                WishlistItem.id.label('item_id'), WishlistItem.book_id,
+                WishlistItem.created_at.label('added_at'), WishlistItem.added_price,
+                WishlistItem.lowest_price, WishlistItem.price_drop_alert,
+                *WISHLIST_BOOK_VIEW.columns
+            ).select_from(Wishlist)
+            .outerjoin(WishlistItem, WishlistItem.wishlist_id == Wishlist.id)
+            .outerjoin(Book, Book.id == WishlistItem.book_id)
+            .where(Wishlist.user_id == user_id)
+            .order_by(Wishlist.id, WishlistItem.id)
+        ).all()
+        
+        # No wishlist yet reads as empty (it is created by the first add)
+        wishlist = rows[0] if rows else None
         items = []
         
-        for item in wishlist_items:
-            book = Book.query.get(item.book_id)
-            if book:
-                items.append({
-                    'id': item.id,
-                    'book_id': item.book_id,
-                    'title': book.title,
-                    'author': book.author,
-                    'cover_image_url': book.cover_image_url,
-                    'list_price': float(book.list_price),
-                    'sale_price': float(book.sale_price) if book.sale_price else None,
-                    'current_price': float(book.get_current_price()),
-                    'is_available': book.is_available,
-                    'stock_quantity': book.stock_quantity,
-                    'average_rating': book.average_rating,
-                    'rating_count': book.rating_count,
-                    'discount_percentage': book.calculate_discount_percentage(),
-                    'added_at': item.created_at.isoformat() if item.created_at else None
-                })
+        for row in rows:
+            # Only the user's first wishlist, as before; no item (empty
+            # wishlist) or no book (deleted) is skipped
+            if row.wishlist_id != wishlist.wishlist_id or row.item_id is None or row.title is None:
+                continue
+            items.append({
+                'id': row.item_id,
+                'book_id': row.book_id,
+                **WISHLIST_BOOK_VIEW.serialize(row),
+                'added_price': float(row.added_price) if row.added_price is not None else None,
+                'lowest_price': float(row.lowest_price) if row.lowest_price is not None else None,
+                'price_drop_alert': bool(row.price_drop_alert),
+                'added_at': row.added_at.isoformat() if row.added_at else None
+            })
         
         return {
-            'wishlist_id': wishlist.id,
+            'wishlist_id': wishlist.wishlist_id if wishlist else None,
             'user_id': user_id,
             'items': items,
             'item_count': len(items),
-            'created_at': wishlist.created_at.isoformat() if wishlist.created_at else None,
-            'updated_at': wishlist.updated_at.isoformat() if wishlist.updated_at else None
+            'created_at': wishlist.wishlist_created_at.isoformat() if wishlist and wishlist.wishlist_created_at else None,
+            'updated_at': wishlist.wishlist_updated_at.isoformat() if wishlist and wishlist.wishlist_updated_at else None
         }, 200
 
 
@@ -62,7 +73,7 @@ class WishlistItemResource(Resource):
     @jwt_required()
     def post(self):
         """Add item to wishlist"""
-        user_id = get_jwt_identity()['id']
+        user_id = get_jwt_identity()
         
         data = request.get_json()
         if not data:
@@ -96,9 +107,14 @@ class WishlistItemResource(Resource):
                 return {'error': 'Book is already in wishlist'}, 400
             
             # Create wishlist item
+            # Price snapshot for price-drop tracking (see server/wishlists.py)
+            price = book.get_current_price()
             wishlist_item = WishlistItem(
                 wishlist_id=wishlist.id,
-                book_id=book_id
+                book_id=book_id,
+                added_price=price,
+                current_price=price,
+                lowest_price=price
             )
             
             db.session.add(wishlist_item)
@@ -116,7 +132,7 @@ class WishlistItemResource(Resource):
     @jwt_required()
     def delete(self, item_id):
         """Remove item from wishlist"""
-        user_id = get_jwt_identity()['id']
+        user_id = get_jwt_identity()
         
         # Find wishlist item
         wishlist_item = WishlistItem.query.get(item_id)
@@ -145,7 +161,7 @@ class WishlistMoveToCartResource(Resource):
     @jwt_required()
     def post(self, item_id):
         """Move item from wishlist to cart"""
-        user_id = get_jwt_identity()['id']
+        user_id = get_jwt_identity()
         
         # Find wishlist item
         wishlist_item = WishlistItem.query.get(item_id)
@@ -165,43 +181,29 @@ class WishlistMoveToCartResource(Resource):
         if not book.is_available:
             return {'error': 'Book is not available'}, 400
         
-        try:
-            # Get or create cart
-            cart = Cart.query.filter_by(user_id=user_id, is_active=True).first()
-            if not cart:
-                cart = Cart(user_id=user_id)
-                db.session.add(cart)
-                db.session.commit()
-            
-            # Check if item already exists in cart
-            cart_item = CartItem.query.filter_by(
-                cart_id=cart.id, 
-                book_id=wishlist_item.book_id
-            ).first()
-            
-            if cart_item:
-                # Update quantity
-                cart_item.quantity += 1
-            else:
-                # Create new cart item
-                cart_item = CartItem(
-                    cart_id=cart.id,
-                    book_id=wishlist_item.book_id,
-                    quantity=1
-                )
-                db.session.add(cart_item)
-            
-            # Remove from wishlist
-            db.session.delete(wishlist_item)
-            
-            db.session.commit()
-            
-            return {
-                'message': 'Item moved to cart',
-                'cart_item_id': cart_item.id,
-                'quantity': cart_item.quantity
-            }, 200
-            
-        except Exception as e:
-            db.session.rollback()
-            return {'error': f'Failed to move item to cart: {str(e)}'}, 500
\ No newline at end of file
+        with cart_store.editing(user_id) as cart:
+            try:
+                cart.ensure()
+                
+                # One more copy if the book is already in the cart
+                quantity = cart.quantity(book.id) + 1
+                hold_for_cart(cart.id, book, quantity)
+                cart_item_id = cart.set_quantity(book.id, quantity)
+                
+                # Remove from wishlist
+                db.session.delete(wishlist_item)
+                
+                cart.commit()
+                
+                return {
+                    'message': 'Item moved to cart',
+                    'cart_item_id': cart_item_id,
+                    'quantity': quantity
+                }, 200
+                
+            except InsufficientStock:
+                db.session.rollback()
+                return {'error': 'Insufficient stock'}, 400
+            except Exception as e:
+                db.session.rollback()
+                return {'error': f'Failed to move item to cart: {str(e)}'}, 500
\ No newline at end of file
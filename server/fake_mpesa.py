@@ -0,0 +1,126 @@
+"""Local stand-in for the Daraja API, for development and tests.
+
+    flask fake-mpesa --port 8089 --delay 2
+    FLASK_MPESA_BASE_URL=http://127.0.0.1:8089 flask jobs-worker
+
+Implements OAuth, STK push and STK query. Each accepted push posts a
+callback to its CallBackURL `delay` seconds later. The outcome depends on
+the phone number's last digit:
+  1 - the customer cancels (ResultCode 1032)
+  2 - the customer never answers: no callback, queries keep reporting
+      "being processed"
+  3 - the push itself is rejected with an errorCode (invalid number), so
+      the worker retries it until the job fails
+  anything else - paid
+"""
+import json
+import threading
+import urllib.request
+import uuid
+from datetime import datetime
+from flask import Flask, request, jsonify
+
+PROCESSING = {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}
+
+
+def _outcome(phone):
+    last = str(phone)[-1:]
+    if last == '1':
+        return 1032, 'Request cancelled by user'
+    if last == '2':
+        return None, None
+    return 0, 'The service request is processed successfully.'
+
+
+def _callback_body(push):
+    stk = {
+        'MerchantRequestID': push['merchant_request_id'],
+        'CheckoutRequestID': push['checkout_request_id'],
+        'ResultCode': push['result_code'],
+        'ResultDesc': push['result_desc'],
+    }
+    if push['result_code'] == 0:
+        stk['CallbackMetadata'] = {'Item': [
+            {'Name': 'Amount', 'Value': push['amount']},
+            {'Name': 'MpesaReceiptNumber', 'Value': push['receipt']},
+            {'Name': 'TransactionDate', 'Value': int(datetime.now().strftime('%Y%m%d%H%M%S'))},
+            {'Name': 'PhoneNumber', 'Value': int(push['phone'])},
+        ]}
+    return {'Body': {'stkCallback': stk}}
+
+
+def _send_callback(logger, url, body):
+    req = urllib.request.Request(
+        url, data=json.dumps(body).encode(), method='POST',
+        headers={'Content-Type': 'application/json'}
+    )
+    try:
+        urllib.request.urlopen(req, timeout=10).close()
+    except OSError as e:
+        logger.warning('fake-mpesa: callback to %s failed: %s', url, e)
+
+
+def create_app(delay=1.0):
+    app = Flask('fake_mpesa')
+    pushes = {}
+    lock = threading.Lock()
+
+    @app.get('/oauth/v1/generate')
+    def generate_token():
+        if not request.headers.get('Authorization', '').startswith('Basic '):
+            return jsonify(errorCode='400.008.01', errorMessage='Invalid Authentication passed'), 400
+        return jsonify(access_token=uuid.uuid4().hex, expires_in='3599')
+
+    @app.post('/mpesa/stkpush/v1/processrequest')
+    def stk_push():
+        data = request.get_json()
+        phone = str(data.get('PhoneNumber', ''))
+        if phone.endswith('3'):
+            return jsonify(errorCode='400.002.02', errorMessage='Bad Request - Invalid PhoneNumber'), 400
+
+        result_code, result_desc = _outcome(phone)
+        push = {
+            'merchant_request_id': f'{uuid.uuid4().int % 10**5}-{uuid.uuid4().int % 10**8}-1',
+            'checkout_request_id': f'ws_CO_{datetime.now():%d%m%Y%H%M%S}{uuid.uuid4().hex[:12]}',
+            'phone': phone,
+            'amount': data.get('Amount'),
+            'receipt': uuid.uuid4().hex[:10].upper(),
+            'result_code': result_code,
+            'result_desc': result_desc,
+            'resolved': False,
+        }
+        with lock:
+            pushes[push['checkout_request_id']] = push
+
+        if result_code is not None:
+            def resolve():
+                push['resolved'] = True
+                _send_callback(app.logger, data.get('CallBackURL'), _callback_body(push))
+            threading.Timer(delay, resolve).start()
+
+        return jsonify(
+            MerchantRequestID=push['merchant_request_id'],
+            CheckoutRequestID=push['checkout_request_id'],
+            ResponseCode='0',
+            ResponseDescription='Success. Request accepted for processing',
+            CustomerMessage='Success. Request accepted for processing'
+        )
+
+    @app.post('/mpesa/stkpushquery/v1/query')
+    def stk_query():
+        data = request.get_json()
+        push = pushes.get(data.get('CheckoutRequestID'))
+        if push is None:
+            return jsonify(errorCode='400.002.02', errorMessage='Bad Request - Invalid CheckoutRequestID'), 400
+        if not push['resolved']:
+            return jsonify(PROCESSING), 500
+        return jsonify(
+            ResponseCode='0',
+            ResponseDescription='The service request has been accepted successsfully',
+            MerchantRequestID=push['merchant_request_id'],
+            CheckoutRequestID=push['checkout_request_id'],
+            ResultCode=str(push['result_code']),
+            ResultDesc=push['result_desc']
+        )
+
+    return app
@@ -0,0 +1,209 @@
+"""Idempotency keys for retried writes.
+
+A client sends `Idempotency-Key: <unique string>` with a write. The first
+request with a given (user, key) claims a row in `idempotency_keys` and runs
+normally; its response is stored there for IDEMPOTENCY_KEY_TTL seconds.
+Retries with the same key get the stored response back (with an
+`Idempotent-Replayed: true` header) without running the handler again.
+Duplicates that arrive while the first request is still running wait for it
+(up to IDEMPOTENCY_WAIT_SECONDS, then 409) rather than racing it.
+
+Claims and results are written on their own autocommit connection, so other
+workers see them immediately and a handler rollback cannot undo them. 5xx
+responses and exceptions drop the claim so the request can be retried.
+Reusing a key for a different request body is rejected with 422.
+
+A claim still `processing` after IDEMPOTENCY_CLAIM_TIMEOUT seconds (default
+60) belonged to a worker that died before recording the result, and the
+next retry of the same request takes it over and runs the handler again.
+Keep the timeout above the slowest idempotent handler.
+
+Expired rows are deleted every IDEMPOTENCY_PURGE_INTERVAL seconds (default
+3600) by the `idempotency.purge_expired` job, or by
+`flask purge-idempotency-keys`.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from server.config import db
+from server.models import IdempotencyKey
+from server.jobs import handler
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_WAIT_SECONDS = 10
+DEFAULT_CLAIM_TIMEOUT = 60
+DEFAULT_PURGE_INTERVAL = 3600
+PURGE_BATCH_SIZE = 1000
+
+keys = IdempotencyKey.__table__
+
+
+def _autocommit():
+    return db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+
+
+def _fingerprint():
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _claim(user_id, key, request_hash):
+    """Insert a `processing` row for (user, key). Returns None if this
+    request now owns the key, otherwise the existing row."""
+    now = datetime.utcnow()
+    ttl = current_app.config.get('IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+    abandoned = now - timedelta(seconds=current_app.config.get(
+        'IDEMPOTENCY_CLAIM_TIMEOUT', DEFAULT_CLAIM_TIMEOUT
+    ))
+    with _autocommit() as conn:
+        while True:
+            try:
+                conn.execute(insert(keys).values(
+                    user_id=user_id, key=key, request_hash=request_hash,
+                    status='processing', created_at=now,
+                    expires_at=now + timedelta(seconds=ttl)
+                ))
+                return None
+            except IntegrityError:
+                pass
+            row = conn.execute(
+                select(keys).where(keys.c.user_id == user_id, keys.c.key == key)
+            ).first()
+            if row is None:
+                continue  # Released meanwhile; try again
+            if row.expires_at < now:
+                # Expired but not purged yet: drop it and claim afresh
+                conn.execute(delete(keys).where(keys.c.id == row.id))
+                continue
+            if row.status == 'processing' and row.created_at < abandoned and row.request_hash == request_hash:
+                # Its worker died mid-request: take the claim over, unless
+                # another retry just did
+                taken = conn.execute(
+                    update(keys).where(
+                        keys.c.id == row.id, keys.c.status == 'processing',
+                        keys.c.created_at == row.created_at
+                    ).values(created_at=now, expires_at=now + timedelta(seconds=ttl))
+                ).rowcount
+                if taken:
+                    return None
+                continue
+            return row
+
+
+def _lookup(user_id, key):
+    with _autocommit() as conn:
+        return conn.execute(
+            select(keys).where(keys.c.user_id == user_id, keys.c.key == key)
+        ).first()
+
+
+def _complete(user_id, key, status, body):
+    with _autocommit() as conn:
+        conn.execute(
+            update(keys).where(keys.c.user_id == user_id, keys.c.key == key)
+            .values(status='completed', response_code=status, response_body=body)
+        )
+
+
+def _release(user_id, key):
+    with _autocommit() as conn:
+        conn.execute(delete(keys).where(
+            keys.c.user_id == user_id, keys.c.key == key, keys.c.status == 'processing'
+        ))
+
+
+def _replay(row):
+    return row.response_body, row.response_code, {'Idempotent-Replayed': 'true'}
+
+
+def _header_key():
+    """(user_id, key) from the Idempotency-Key header of an authenticated request"""
+    key = request.headers.get(HEADER)
+    if not key:
+        return None
+    return get_jwt_identity(), key
+
+
+def idempotent(key_func=_header_key):
+    """Make a Resource method replay its first response for repeated keys.
+
+    `key_func` returns (user_id, key) for the current request, or None to
+    run without idempotency. The default reads the Idempotency-Key header
+    and the JWT identity, so apply it below @jwt_required().
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            resolved = key_func()
+            if resolved is None:
+                return f(*args, **kwargs)
+            user_id, key = resolved
+            if len(key) > MAX_KEY_LENGTH:
+                return {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}, 400
+
+            request_hash = _fingerprint()
+            deadline = time.monotonic() + current_app.config.get(
+                'IDEMPOTENCY_WAIT_SECONDS', DEFAULT_WAIT_SECONDS
+            )
+            delay = 0.05
+            while True:
+                row = _claim(user_id, key, request_hash)
+                if row is None:
+                    break
+                if row.request_hash != request_hash:
+                    return {'error': f'{HEADER} was already used for a different request'}, 422
+                if row.status == 'completed':
+                    return _replay(row)
+                # First request still running: wait for its result
+                while row is not None and row.status == 'processing':
+                    if time.monotonic() > deadline:
+                        return {'error': 'A request with this Idempotency-Key is still in progress'}, 409
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+                    row = _lookup(user_id, key)
+                if row is not None:
+                    return _replay(row)
+                # It failed and released the key: take over
+
+            try:
+                result = f(*args, **kwargs)
+            except BaseException:
+                _release(user_id, key)
+                raise
+
+            body, status = result[:2] if isinstance(result, tuple) else (result, 200)
+            if status >= 500:
+                _release(user_id, key)
+            else:
+                _complete(user_id, key, status, body)
+            return result
+        return wrapper
+    return decorator
+
+
+@handler('idempotency.purge_expired', every=lambda: current_app.config.get(
+    'IDEMPOTENCY_PURGE_INTERVAL', DEFAULT_PURGE_INTERVAL))
+def purge_expired_job(payload):
+    purge_expired()
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE):
+    """Delete expired keys in batches; returns the number deleted"""
+    purged = 0
+    while True:
+        batch = select(keys.c.id).where(
+            keys.c.expires_at < datetime.utcnow()
+        ).limit(batch_size).scalar_subquery()
+        deleted = db.session.execute(delete(keys).where(keys.c.id.in_(batch))).rowcount
+        db.session.commit()
+        purged += deleted
+        if deleted < batch_size:
+            return purged
@@ -0,0 +1,278 @@
+"""Stock reservations.
+
+Physical stock is taken out of `books.stock_quantity` as soon as a book goes
+into a cart, with a conditional UPDATE that only matches while enough is
+left:
+
+    UPDATE books SET stock_quantity = stock_quantity - :q
+    WHERE id = :id AND is_available AND stock_quantity >= :q
+
+The database serializes concurrent updates of the same row, so no two
+workers can both take the last copy. When stock runs short, books that allow
+backorders take what is left and the rest from their allowance
+(`backordered_quantity` grows up to `max_backorders`), recorded as separate
+stock and backorder parts. Every part is recorded as a StockReservation:
+
+  cart    - `active` until checkout, expiring after STOCK_RESERVATION_TTL
+            seconds without cart activity
+  order   - `committed` at checkout
+  release - expired carts (swept every STOCK_RELEASE_INTERVAL seconds,
+            default 60, by the `inventory.release_expired` job, or by
+            `flask release-expired-reservations`), removed cart
+            lines, abandoned carts (`sweep-carts`) and cancelled orders
+            hand their units back
+
+Returned and restocked units fill outstanding backorders first.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, case
+from server.config import db
+from server.models import Book, StockReservation
+from server.jobs import handler
+
+DEFAULT_TTL = 900
+DEFAULT_RELEASE_INTERVAL = 60
+SWEEP_BATCH_SIZE = 500
+# Retries of a split stock/backorder take that raced another take
+TAKE_ATTEMPTS = 3
+
+
+class InsufficientStock(Exception):
+    def __init__(self, book_id, quantity):
+        super().__init__(f'Insufficient stock for book {book_id} (wanted {quantity})')
+        self.book_id = book_id
+        self.quantity = quantity
+
+
+def tracks_stock(book):
+    """eBooks are never out of stock"""
+    return (book.format or '').lower() != 'ebook'
+
+
+def _expiry():
+    ttl = current_app.config.get('STOCK_RESERVATION_TTL', DEFAULT_TTL)
+    return datetime.utcnow() + timedelta(seconds=ttl)
+
+
+def _execute(statement):
+    return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+
+def take_stock(book_id, quantity):
+    """Atomically take `quantity` units of a book: from stock as far as it
+    goes, the rest from its backorder allowance. Returns the parts taken as
+    [(source, units)], source 'stock' or 'backorder'; raises
+    InsufficientStock if they do not fit."""
+    for _ in range(TAKE_ATTEMPTS):
+        if _execute(
+            update(Book).where(
+                Book.id == book_id,
+                Book.is_available == True,
+                Book.stock_quantity >= quantity
+            ).values(stock_quantity=Book.stock_quantity - quantity)
+        ):
+            return [('stock', quantity)]
+
+        row = db.session.execute(
+            select(Book.stock_quantity, Book.is_available).where(Book.id == book_id)
+        ).one_or_none()
+        if row is None or not row.is_available:
+            break
+        if row.stock_quantity >= quantity:
+            continue  # Restocked since; take it all from stock
+
+        # Whatever is left in stock, plus the shortfall as a backorder. The
+        # stock level is part of the condition, so a concurrent take makes
+        # this match nothing and is retried.
+        in_stock = max(row.stock_quantity, 0)
+        short = quantity - in_stock
+        if _execute(
+            update(Book).where(
+                Book.id == book_id,
+                Book.is_available == True,
+                Book.stock_quantity == row.stock_quantity,
+                Book.allow_backorders == True,
+                Book.backordered_quantity + short <= Book.max_backorders
+            ).values(
+                stock_quantity=Book.stock_quantity - in_stock,
+                backordered_quantity=Book.backordered_quantity + short
+            )
+        ):
+            return ([('stock', in_stock)] if in_stock else []) + [('backorder', short)]
+
+        current = db.session.execute(select(Book.stock_quantity).where(Book.id == book_id)).scalar()
+        if current == row.stock_quantity:
+            break  # Not enough backorder allowance
+    raise InsufficientStock(book_id, quantity)
+
+
+def restock(book_id, quantity):
+    """Add units to a book; outstanding backorders are filled first"""
+    filled = case(
+        (Book.backordered_quantity < quantity, Book.backordered_quantity),
+        else_=quantity
+    )
+    _execute(
+        update(Book).where(Book.id == book_id).values(
+            stock_quantity=Book.stock_quantity + quantity - filled,
+            backordered_quantity=Book.backordered_quantity - filled
+        )
+    )
+
+
+def _give_back(book_id, quantity):
+    """Return held units, whatever their source, as a restock: units that
+    came from stock fill outstanding backorders first, and cancelling a
+    backorder hands back whatever a restock already converted into stock."""
+    restock(book_id, quantity)
+
+
+def _release(reservations):
+    """Hand locked reservations back, one UPDATE per book"""
+    totals = {}
+    for reservation in reservations:
+        totals[reservation.book_id] = totals.get(reservation.book_id, 0) + reservation.quantity
+    for book_id, quantity in sorted(totals.items()):
+        _give_back(book_id, quantity)
+    for reservation in reservations:
+        reservation.status = 'released'
+        reservation.expires_at = None
+    return sum(totals.values())
+
+
+def _locked(*criteria):
+    return StockReservation.query.filter(*criteria).order_by(
+        StockReservation.book_id, StockReservation.id
+    ).with_for_update().all()
+
+
+def _adjust(cart_id, book_id, reservations, quantity):
+    """Make a cart's active `reservations` for a book add up to `quantity`"""
+    held = sum(r.quantity for r in reservations)
+    if quantity > held:
+        for source, units in take_stock(book_id, quantity - held):
+            db.session.add(StockReservation(
+                book_id=book_id,
+                cart_id=cart_id,
+                quantity=units,
+                source=source,
+                status='active',
+                expires_at=_expiry()
+            ))
+        return
+
+    # Trim the newest reservations first
+    excess = held - quantity
+    for reservation in reversed(reservations):
+        if excess == 0:
+            break
+        given = min(reservation.quantity, excess)
+        _give_back(book_id, given)
+        if given == reservation.quantity:
+            reservation.status = 'released'
+            reservation.expires_at = None
+        else:
+            reservation.quantity -= given
+        excess -= given
+
+
+def _extend(cart_id):
+    _execute(
+        update(StockReservation).where(
+            StockReservation.cart_id == cart_id, StockReservation.status == 'active'
+        ).values(expires_at=_expiry())
+    )
+
+
+def hold_for_cart(cart_id, book, quantity):
+    """Reserve `quantity` units of `book` for a cart line (the line's new
+    total, not a delta) and keep the whole cart's hold alive.
+    Raises InsufficientStock."""
+    if tracks_stock(book):
+        reservations = _locked(
+            StockReservation.cart_id == cart_id,
+            StockReservation.book_id == book.id,
+            StockReservation.status == 'active'
+        )
+        _adjust(cart_id, book.id, reservations, quantity)
+    _extend(cart_id)
+
+
+def release_cart(cart_id, book_id=None):
+    """Release a cart's active reservations (one book, or all of them)"""
+    criteria = [StockReservation.cart_id == cart_id, StockReservation.status == 'active']
+    if book_id is not None:
+        criteria.append(StockReservation.book_id == book_id)
+    return _release(_locked(*criteria))
+
+
+def release_carts(cart_ids):
+    """Release every active reservation of several carts"""
+    return _release(_locked(StockReservation.cart_id.in_(cart_ids), StockReservation.status == 'active'))
+
+
+def commit_cart(cart_id, order_id, lines):
+    """Move a cart's reservations to an order at checkout.
+
+    `lines` is [(book, quantity)]. Physical books are topped up where the
+    cart holds too little (its reservations expired, or the cart predates
+    them) and trimmed where it holds too much. Raises InsufficientStock.
+    """
+    wanted = {}
+    for book, quantity in lines:
+        if tracks_stock(book):
+            wanted[book.id] = wanted.get(book.id, 0) + quantity
+
+    by_book = {}
+    for reservation in _locked(StockReservation.cart_id == cart_id, StockReservation.status == 'active'):
+        by_book.setdefault(reservation.book_id, []).append(reservation)
+
+    for book_id in sorted(set(wanted) | set(by_book)):
+        _adjust(cart_id, book_id, by_book.get(book_id, []), wanted.get(book_id, 0))
+
+    db.session.flush()
+    _execute(
+        update(StockReservation).where(
+            StockReservation.cart_id == cart_id, StockReservation.status == 'active'
+        ).values(status='committed', order_id=order_id, expires_at=None)
+    )
+
+
+def return_order_stock(order):
+    """Give a cancelled order's units back. Orders placed before
+    reservations existed are restocked from their items."""
+    reservations = _locked(StockReservation.order_id == order.id)
+    if reservations:
+        return _release([r for r in reservations if r.status == 'committed'])
+
+    returned = 0
+    for item in order.items:
+        if item.book and tracks_stock(item.book):
+            restock(item.book_id, item.quantity)
+            returned += item.quantity
+    return returned
+
+
+@handler('inventory.release_expired', every=lambda: current_app.config.get(
+    'STOCK_RELEASE_INTERVAL', DEFAULT_RELEASE_INTERVAL))
+def release_expired_job(payload):
+    release_expired()
+
+
+def release_expired(batch_size=SWEEP_BATCH_SIZE):
+    """Release cart reservations past their expiry, in batches. Rows locked
+    by a checkout in progress are skipped (PostgreSQL SKIP LOCKED) and
+    picked up by a later sweep if still expired. Commits per batch and
+    returns the number of reservations released."""
+    released = 0
+    while True:
+        batch = StockReservation.query.filter(
+            StockReservation.status == 'active',
+            StockReservation.expires_at < datetime.utcnow()
+        ).order_by(StockReservation.id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not batch:
+            return released
+        _release(batch)
+        db.session.commit()
+        released += len(batch)
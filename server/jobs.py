@@ -0,0 +1,254 @@
+"""Background jobs backed by the `jobs` table.
+
+`enqueue()` adds a job to the caller's session, so it is created only if the
+request that queued it commits. Workers claim due jobs in batches with one
+statement:
+
+    UPDATE jobs SET status = 'running', attempts = attempts + 1, ...
+    WHERE id IN (SELECT id FROM jobs WHERE status = 'queued' AND run_at <= :now
+                 ORDER BY run_at LIMIT :n FOR UPDATE SKIP LOCKED)
+    RETURNING id
+
+so any number of worker threads and processes can poll the same table
+without handing out a job twice (SQLite serializes the UPDATE instead).
+
+Handlers are registered by kind with @handler. A plain handler is called
+with one job's payload; a `batch=True` handler gets the payloads of every
+claimed job of its kind in one call. A handler raises Retry(seconds) to be
+run again later without it counting as a failed attempt; any other
+exception is retried with exponential backoff until `max_attempts`, then
+the job is marked failed and its `on_failure` callback, if registered, is
+called with the same payload(s) and the last error. Jobs left `running` by a dead worker are requeued
+after JOB_LOCK_TIMEOUT seconds.
+
+A handler registered with `every=` (seconds, or a callable returning them)
+is recurring: workers queue its first run when they start, and each run,
+however it ends, queues the next one unless a run is already queued.
+Jobs of one kind are not deduplicated otherwise, so two workers starting
+together may queue it twice; the extra run then does not queue another.
+
+`flask jobs-worker` runs a pool of worker threads (see Worker).
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from server.config import db
+from server.models import Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_LOCK_TIMEOUT = 300
+MAX_BACKOFF = 600
+
+HANDLERS = {}  # kind -> (function, batch)
+RECURRING = {}  # kind -> interval in seconds, or a callable returning it
+ON_FAILURE = {}  # kind -> function called once a job has run out of attempts
+
+
+class Retry(Exception):
+    """Run the job again after `delay` seconds"""
+
+    def __init__(self, delay):
+        super().__init__(f'retry in {delay}s')
+        self.delay = delay
+
+
+def handler(kind, batch=False, every=None, on_failure=None):
+    def decorator(f):
+        HANDLERS[kind] = (f, batch)
+        if every is not None:
+            RECURRING[kind] = every
+        if on_failure is not None:
+            ON_FAILURE[kind] = on_failure
+        return f
+    return decorator
+
+
+def enqueue(kind, payload=None, delay=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Queue a job in the current session; it runs once the session commits"""
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+        max_attempts=max_attempts
+    )
+    db.session.add(job)
+    return job
+
+
+def schedule(kind, statuses=('queued',)):
+    """Queue the next run of a recurring job unless one is already in
+    `statuses`; commits. Returns the new job, or None."""
+    if db.session.execute(
+        select(Job.id).where(Job.kind == kind, Job.status.in_(statuses)).limit(1)
+    ).first():
+        return None
+    every = RECURRING[kind]
+    job = enqueue(kind, delay=every() if callable(every) else every)
+    db.session.commit()
+    return job
+
+
+def schedule_recurring():
+    """Queue every recurring job that is neither queued nor running"""
+    for kind in RECURRING:
+        schedule(kind, ('queued', 'running'))
+
+
+def _set(job_ids, **values):
+    db.session.execute(
+        update(Job).where(Job.id.in_(job_ids)).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim(worker_id, limit=DEFAULT_BATCH_SIZE):
+    """Mark up to `limit` due jobs as running for this worker and return them"""
+    now = datetime.utcnow()
+    due = select(Job.id).where(
+        Job.status == 'queued', Job.run_at <= now
+    ).order_by(Job.run_at, Job.id).limit(limit).with_for_update(skip_locked=True)
+    job_ids = db.session.execute(
+        update(Job).where(Job.id.in_(due.scalar_subquery()), Job.status == 'queued').values(
+            status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1
+        ).returning(Job.id).execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    if not job_ids:
+        return []
+    return Job.query.filter(Job.id.in_(job_ids)).order_by(Job.id).all()
+
+
+def requeue_stale(timeout=DEFAULT_LOCK_TIMEOUT):
+    """Give jobs claimed by workers that died mid-run back to the queue"""
+    count = db.session.execute(
+        update(Job).where(
+            Job.status == 'running',
+            Job.locked_at < datetime.utcnow() - timedelta(seconds=timeout)
+        ).values(status='queued', locked_by=None, locked_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def _execute(jobs, call, give_up=None):
+    """Run one handler call for `jobs` and record the outcome; `give_up(error)`
+    runs in its own transaction once they have no attempts left"""
+    job_ids = [job.id for job in jobs]
+    attempts = min(job.attempts for job in jobs)
+    max_attempts = min(job.max_attempts for job in jobs)
+    try:
+        call()
+        db.session.commit()
+    except Retry as e:
+        db.session.rollback()
+        _set(job_ids, status='queued', locked_by=None, locked_at=None,
+             attempts=Job.attempts - 1,
+             run_at=datetime.utcnow() + timedelta(seconds=e.delay))
+    except Exception as e:
+        db.session.rollback()
+        error = f'{type(e).__name__}: {e}'
+        if attempts >= max_attempts:
+            _set(job_ids, status='failed', last_error=error, finished_at=datetime.utcnow())
+            db.session.commit()
+            if give_up:
+                try:
+                    give_up(error)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception('Failure handler for jobs %s failed', job_ids)
+        else:
+            backoff = min(2 ** attempts, MAX_BACKOFF)
+            _set(job_ids, status='queued', last_error=error, locked_by=None, locked_at=None,
+                 run_at=datetime.utcnow() + timedelta(seconds=backoff))
+    else:
+        _set(job_ids, status='done', finished_at=datetime.utcnow())
+    db.session.commit()
+
+
+def run_jobs(jobs):
+    """Run claimed jobs, batching those whose handler takes batches"""
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+
+    for kind, group in by_kind.items():
+        if kind not in HANDLERS:
+            _set([job.id for job in group], status='failed',
+                 last_error=f'No handler for {kind}', finished_at=datetime.utcnow())
+            db.session.commit()
+            continue
+        f, batch = HANDLERS[kind]
+        on_failure = ON_FAILURE.get(kind)
+        if batch:
+            payloads = [job.payload for job in group]
+            _execute(group, lambda: f(payloads),
+                     on_failure and (lambda error: on_failure(payloads, error)))
+        else:
+            for job in group:
+                _execute([job], lambda payload=job.payload: f(payload),
+                         on_failure and (lambda error, payload=job.payload: on_failure(payload, error)))
+        if kind in RECURRING:
+            schedule(kind)
+
+
+class Worker:
+    """Pool of threads claiming and running jobs until stopped"""
+
+    def __init__(self, app, threads=2, batch_size=DEFAULT_BATCH_SIZE, poll_interval=None):
+        self.app = app
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval or app.config.get('JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.lock_timeout = app.config.get('JOB_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        with self.app.app_context():
+            schedule_recurring()
+        for n in range(self.threads):
+            thread = threading.Thread(target=self._loop, args=(n,), daemon=True, name=f'jobs-worker-{n}')
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        """Start the threads and block until interrupted"""
+        self.start()
+        try:
+            while not self._stop.wait(3600):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+
+    def run_once(self, worker_id):
+        """Claim and run one batch; returns the number of jobs run"""
+        with self.app.app_context():
+            jobs = claim(worker_id, self.batch_size)
+            if jobs:
+                run_jobs(jobs)
+            else:
+                requeue_stale(self.lock_timeout)
+            return len(jobs)
+
+    def _loop(self, n):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{n}'
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once(worker_id)
+            except Exception:
+                self.app.logger.exception('Job worker %s failed', worker_id)
+                ran = 0
+            if not ran:
+                self._stop.wait(self.poll_interval)
@@ -4,4 +4,11 @@ from server.models.book import Book, Publisher, BookImage, book_categories
 from server.models.order import Order, OrderItem, Payment, Cart, CartItem
 from server.models.category import Category
 from server.models.review import Review, ReviewVote
-from server.models.wishlist import Wishlist, WishlistItem
\ No newline at end of file
+from server.models.wishlist import Wishlist, WishlistItem
+from server.models.reservation import StockReservation
+from server.models.numbering import NumberBlock
+from server.models.idempotency import IdempotencyKey
+from server.models.job import Job
+from server.models.order_summary import OrderSummary
+from server.models.sales_rollup import SalesRollup
+from server.models.customer_stats import CustomerStats
@@ -10,7 +10,7 @@ class Address(db.Model, SerializerMixin):
     id = Column(Integer(), primary_key=True)
     
     # Foreign Key to User
-    user_id = Column(Integer(), ForeignKey('users.id'), nullable=False)
+    user_id = Column(Integer(), ForeignKey('users.id'), nullable=False, index=True)
     
     # Address Information
     full_name = Column(String(100), nullable=False)
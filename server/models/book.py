@@ -1,12 +1,51 @@
 from server.config import db
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, Numeric, ForeignKey, Enum, func
-from sqlalchemy.orm import relationship, validates
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, Numeric, ForeignKey, Enum, Index, func, update, case, cast
+from sqlalchemy.orm import relationship, validates, deferred
 from datetime import datetime
 import re
 
 STATUS = ('draft', 'published', 'archived')
 FORMAT = ('Paperback', 'Hardcover', 'eBook')
+RATINGS = (1, 2, 3, 4, 5)
+
+
+# Pricing/stock rules shared by the Book methods and the row serializers
+# (server/serializers.py), which compute them from plain column values
+
+def current_price(list_price, sale_price):
+    """Sale price if set, else list price"""
+    return sale_price if sale_price else list_price
+
+
+def current_price_sql(list_price, sale_price):
+    """current_price() as a SQL expression over the given columns"""
+    return func.coalesce(func.nullif(sale_price, 0), list_price)
+
+
+def discount_percentage(list_price, sale_price):
+    """Percentage off the list price, rounded to one decimal"""
+    if not sale_price or sale_price >= list_price:
+        return 0
+    
+    discount = ((list_price - sale_price) / list_price) * 100
+    return float(round(discount, 1))
+
+
+def stock_status(stock_quantity, low_stock_threshold):
+    """Human-readable stock status"""
+    if stock_quantity == 0:
+        return 'Out of Stock'
+    elif stock_quantity <= low_stock_threshold:
+        return f'Only {stock_quantity} left'
+    else:
+        return 'In Stock'
+
+
+def in_stock(stock_quantity, allow_backorders, max_backorders):
+    """In stock, or out of stock but still accepting backorders"""
+    return stock_quantity > 0 or bool(allow_backorders and max_backorders > 0)
+
 
 class Book(db.Model, SerializerMixin):
     __tablename__ = 'books'
@@ -25,8 +64,9 @@ class Book(db.Model, SerializerMixin):
     
     # Description
     short_description = Column(String(500), nullable=False)  # For listings
-    description = Column(Text, nullable=False)  # Full description
-    excerpt = Column(Text)  # Book excerpt/sample
+    # Unbounded Text, deferred: only loaded when accessed or explicitly selected
+    description = deferred(Column(Text, nullable=False))  # Full description
+    excerpt = deferred(Column(Text))  # Book excerpt/sample
     
     # Publisher Information
     publisher = Column(String(150), nullable=False)
@@ -53,12 +93,21 @@ class Book(db.Model, SerializerMixin):
     is_available = Column(Boolean, default=True, nullable=False)
     allow_backorders = Column(Boolean, default=False)
     max_backorders = Column(Integer, default=0)
+    backordered_quantity = Column(Integer, nullable=False, default=0, server_default='0')  # Reserved beyond stock
     
     # Ratings and Reviews
     average_rating = Column(Float, default=0.0)
     rating_count = Column(Integer, default=0)
     review_count = Column(Integer, default=0)
     
+    # Running rating aggregates over approved reviews (see apply_rating_change)
+    rating_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_1_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_2_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_3_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_4_count = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_5_count = Column(Integer, nullable=False, default=0, server_default='0')
+    
     # SEO and Marketing
     meta_title = Column(String(255))
     meta_description = Column(String(500))
@@ -92,6 +141,17 @@ class Book(db.Model, SerializerMixin):
     wishlists = relationship('WishlistItem', back_populates='book')
     images = relationship('BookImage', back_populates='book')
     
+    # Featured (newest first) and bestseller (top sellers) shelves, the
+    # dashboard's top sellers, and the newest-first listings (page or keyset
+    # on (created_at, id)), unfiltered or by status
+    __table_args__ = (
+        Index('ix_books_status_available_featured_created', 'status', 'is_available', 'is_featured', 'created_at'),
+        Index('ix_books_status_available_created_id', 'status', 'is_available', 'created_at', 'id'),
+        Index('ix_books_created_id', 'created_at', 'id'),
+        Index('ix_books_status_bestseller_sold', 'status', 'is_bestseller', 'total_sold'),
+        Index('ix_books_total_sold', 'total_sold'),
+    )
+    
     # Serialization rules
     serialize_rules = (
         '-publisher_rel.book',
@@ -220,34 +280,119 @@ class Book(db.Model, SerializerMixin):
     
     def calculate_discount_percentage(self):
         """Calculate discount percentage"""
-        if not self.sale_price or self.sale_price >= self.list_price:
-            return 0
-        
-        discount = ((self.list_price - self.sale_price) / self.list_price) * 100
-        return float(round(discount, 1))
+        return discount_percentage(self.list_price, self.sale_price)
     
     def get_current_price(self):
         """Get current price (sale price if available, else list price)"""
-        return self.sale_price if self.sale_price else self.list_price
+        return current_price(self.list_price, self.sale_price)
     
     def is_in_stock(self):
         """Check if book is in stock"""
-        return self.stock_quantity > 0 or (self.allow_backorders and self.max_backorders > 0)
+        return in_stock(self.stock_quantity, self.allow_backorders, self.max_backorders)
     
     def update_rating(self):
-        """Update average rating and rating count from reviews"""
-        from models.review import Review
-        reviews = Review.query.filter_by(book_id=self.id, status='approved').all()
+        """Rebuild rating aggregates for this book from its approved reviews"""
+        Book.rebuild_rating_aggregates(book_ids=[self.id])
+    
+    def apply_rating_change(self, old=None, new=None):
+        """Incrementally update rating aggregates for a single review event.
+        
+        `old` and `new` are the review's contribution before and after the
+        event as returned by Review.rating_contribution() - a (rating, has_content)
+        tuple, or None when the review does not count (i.e. is not approved).
+        Runs as one UPDATE of the book row, so concurrent events don't lose counts.
+        """
+        if old == new:
+            return
+        
+        deltas = {}
+        sum_delta = count_delta = review_delta = 0
+        for contribution, sign in ((old, -1), (new, 1)):
+            if contribution is None:
+                continue
+            rating, has_content = contribution
+            deltas[rating] = deltas.get(rating, 0) + sign
+            sum_delta += rating * sign
+            count_delta += sign
+            review_delta += sign if has_content else 0
+        
+        new_sum = Book.rating_sum + sum_delta
+        new_count = Book.rating_count + count_delta
+        values = {
+            Book.rating_sum: new_sum,
+            Book.rating_count: new_count,
+            Book.review_count: Book.review_count + review_delta,
+            Book.average_rating: case(
+                (new_count > 0, func.round(cast(new_sum, Numeric) / new_count, 1)),
+                else_=0.0
+            ),
+        }
+        for rating, delta in deltas.items():
+            column = getattr(Book, f'rating_{rating}_count')
+            values[column] = column + delta
         
-        if reviews:
-            total_rating = sum(review.rating for review in reviews)
-            self.average_rating = round(total_rating / len(reviews), 1)
-            self.rating_count = len(reviews)
-            self.review_count = len([r for r in reviews if r.content])
-        else:
-            self.average_rating = 0.0
-            self.rating_count = 0
-            self.review_count = 0
+        db.session.execute(
+            update(Book).where(Book.id == self.id).values(values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(self, [
+            'average_rating', 'rating_count', 'review_count', 'rating_sum',
+            *(f'rating_{rating}_count' for rating in RATINGS)
+        ])
+    
+    def get_rating_distribution(self):
+        """Get number of approved reviews per star rating"""
+        return {rating: getattr(self, f'rating_{rating}_count') or 0 for rating in RATINGS}
+    
+    @classmethod
+    def rebuild_rating_aggregates(cls, book_ids=None):
+        """Recompute rating aggregates from approved reviews in one grouped query.
+        
+        Rebuilds every book when `book_ids` is None. Returns the number of books
+        that have at least one approved review.
+        """
+        from server.models.review import Review
+        
+        has_content = case((func.coalesce(Review.content, '') != '', 1), else_=0)
+        stats = db.session.query(
+            Review.book_id,
+            func.count(Review.id),
+            func.sum(Review.rating),
+            func.sum(has_content),
+            *(func.sum(case((Review.rating == rating, 1), else_=0)) for rating in RATINGS)
+        ).filter(Review.status == 'approved')
+        
+        reset = update(cls)
+        if book_ids is not None:
+            stats = stats.filter(Review.book_id.in_(book_ids))
+            reset = reset.where(cls.id.in_(book_ids))
+        
+        zeroes = {f'rating_{rating}_count': 0 for rating in RATINGS}
+        db.session.execute(
+            reset.values(average_rating=0.0, rating_count=0, review_count=0, rating_sum=0, **zeroes)
+            .execution_options(synchronize_session=False)
+        )
+        
+        rows = []
+        for book_id, count, total, with_content, *per_star in stats.group_by(Review.book_id):
+            row = {
+                'id': book_id,
+                'average_rating': round(total / count, 1),
+                'rating_count': count,
+                'review_count': with_content,
+                'rating_sum': total,
+            }
+            row.update({f'rating_{rating}_count': n for rating, n in zip(RATINGS, per_star)})
+            rows.append(row)
+        
+        if rows:
+            db.session.execute(update(cls), rows)
+        db.session.expire_all()
+        return len(rows)
+    
+    def counted_category_ids(self):
+        """Ids of the categories whose book_count includes this book"""
+        return {category.id for category in self.categories} if self.status == 'published' else set()
     
     def increment_sales(self, quantity, price):
         """Increment sales data when book is purchased"""
@@ -263,12 +408,7 @@ class Book(db.Model, SerializerMixin):
     
     def get_stock_status(self):
         """Get human-readable stock status"""
-        if self.stock_quantity == 0:
-            return 'Out of Stock'
-        elif self.stock_quantity <= self.low_stock_threshold:
-            return f'Only {self.stock_quantity} left'
-        else:
-            return 'In Stock'
+        return stock_status(self.stock_quantity, self.low_stock_threshold)
     
 
 
@@ -301,7 +441,9 @@ class Publisher(db.Model, SerializerMixin):
 book_categories = db.Table('book_categories',
     Column('book_id', Integer, ForeignKey('books.id'), primary_key=True),
     Column('category_id', Integer, ForeignKey('categories.id'), primary_key=True),
-    Column('created_at', DateTime, server_default=func.now())
+    Column('created_at', DateTime, server_default=func.now()),
+    # The primary key serves book -> categories; this one category -> books
+    Index('ix_book_categories_category_book', 'category_id', 'book_id')
 )
 
 
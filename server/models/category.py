@@ -1,6 +1,6 @@
 from server.config import db
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy import Column, Integer, Text, Boolean, String, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, Text, Boolean, String, DateTime, func, ForeignKey, update, select
 from sqlalchemy.orm import relationship
 
 class Category(db.Model, SerializerMixin):
@@ -15,6 +15,10 @@ class Category(db.Model, SerializerMixin):
     is_active = Column(Boolean, default=True)
     image_url = Column(String(500))
     
+    # Number of published books in this category, kept current by
+    # update_book_counts() on every book status/category change
+    book_count = Column(Integer, nullable=False, default=0, server_default='0')
+    
     created_at = Column(DateTime, server_default=func.now())
     
     books = relationship('Book', secondary='book_categories', back_populates='categories')
@@ -25,3 +29,38 @@ class Category(db.Model, SerializerMixin):
         return f"<Category {self.id}: {self.name}>"
     
  
+    
+    @classmethod
+    def update_book_counts(cls, before, after):
+        """Move one book's contribution from the `before` to the `after`
+        category ids (see Book.counted_category_ids) with atomic updates"""
+        removed = set(before) - set(after)
+        added = set(after) - set(before)
+        if removed:
+            db.session.execute(
+                update(cls).where(cls.id.in_(removed))
+                .values(book_count=cls.book_count - 1)
+                .execution_options(synchronize_session=False)
+            )
+        if added:
+            db.session.execute(
+                update(cls).where(cls.id.in_(added))
+                .values(book_count=cls.book_count + 1)
+                .execution_options(synchronize_session=False)
+            )
+    
+    @classmethod
+    def rebuild_book_counts(cls):
+        """Recount published books for every category"""
+        from server.models.book import Book, book_categories
+        
+        published = select(func.count()).select_from(book_categories).join(
+            Book, Book.id == book_categories.c.book_id
+        ).where(
+            book_categories.c.category_id == cls.id,
+            Book.status == 'published'
+        ).scalar_subquery()
+        db.session.execute(
+            update(cls).values(book_count=published).execution_options(synchronize_session=False)
+        )
+        db.session.expire_all()
@@ -0,0 +1,18 @@
+from server.config import db
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import Column, Integer, DateTime, Numeric, ForeignKey, func
+
+
+class CustomerStats(db.Model, SerializerMixin):
+    """Lifetime order totals per user, cached for the admin user list (see server/sales.py)"""
+    __tablename__ = 'customer_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0, server_default='0')
+    total_spent = Column(Numeric(14, 2), nullable=False, default=0, server_default='0')
+    last_order_at = Column(DateTime)
+
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<CustomerStats user {self.user_id}: {self.order_count} orders, {self.total_spent}>"
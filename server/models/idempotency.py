@@ -0,0 +1,30 @@
+from server.config import db
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, JSON, UniqueConstraint, func
+
+# processing: the first request is still running; completed: response stored
+IDEMPOTENCY_STATUS = ('processing', 'completed')
+
+
+class IdempotencyKey(db.Model, SerializerMixin):
+    """Stored outcome of a request made with an Idempotency-Key (see server/idempotency.py)"""
+    __tablename__ = 'idempotency_keys'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # Method, path and body of the first request
+
+    status = Column(Enum(*IDEMPOTENCY_STATUS, name='idempotency_status'), default='processing', nullable=False)
+    response_code = Column(Integer)
+    response_body = Column(JSON)
+
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'key', name='uq_idempotency_user_key'),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.user_id}:{self.key} ({self.status})>"
@@ -0,0 +1,35 @@
+from server.config import db
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import Column, Integer, String, DateTime, Text, Enum, JSON, Index, func
+
+# queued: waiting for run_at; running: claimed by a worker; done/failed: finished
+JOB_STATUS = ('queued', 'running', 'done', 'failed')
+
+
+class Job(db.Model, SerializerMixin):
+    """Background job (see server/jobs.py)"""
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(100), nullable=False)  # Registered handler name, e.g. 'mpesa.stk_push'
+    payload = Column(JSON, nullable=False, default=dict)
+
+    status = Column(Enum(*JOB_STATUS, name='job_status'), default='queued', nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    last_error = Column(Text)
+
+    run_at = Column(DateTime, nullable=False, server_default=func.now())  # Not before
+    locked_by = Column(String(100))  # Worker that claimed it
+    locked_at = Column(DateTime)
+
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime)
+
+    # Workers poll for due jobs by (status, run_at)
+    __table_args__ = (
+        Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    def __repr__(self):
+        return f"<Job {self.id}: {self.kind} ({self.status}, attempt {self.attempts})>"
@@ -0,0 +1,14 @@
+from server.config import db
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import Column, String, BigInteger
+
+
+class NumberBlock(db.Model, SerializerMixin):
+    """High-water mark of a hi/lo counter (see server/numbering.py)"""
+    __tablename__ = 'number_blocks'
+
+    name = Column(String(50), primary_key=True)  # e.g. 'order', 'payment'
+    next_value = Column(BigInteger, nullable=False, default=1)  # First value not yet handed out
+
+    def __repr__(self):
+        return f"<NumberBlock {self.name}: {self.next_value}>"
@@ -1,6 +1,7 @@
 from server.config import db
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, Numeric, ForeignKey, Enum, func, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, Numeric, ForeignKey, Enum, Index, func, text, JSON
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 import re
@@ -17,7 +18,7 @@ class Order(db.Model, SerializerMixin):
     # Primary Key
     id = Column(Integer, primary_key=True)
     order_number = Column(String(50), unique=True, nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # Indexed by ix_orders_user_created
     
     # Order Status
     status = Column(Enum(*ORDER_STATUS, name='order_status'), default='pending', nullable=False)
@@ -63,6 +64,12 @@ class Order(db.Model, SerializerMixin):
     shipping_address_id = Column(Integer, ForeignKey('addresses.id'), nullable=False)
     billing_address_id = Column(Integer, ForeignKey('addresses.id'), nullable=False)
     
+    # Order history per user and dashboard filters by status, newest first
+    __table_args__ = (
+        Index('ix_orders_user_created', 'user_id', 'created_at', 'id'),
+        Index('ix_orders_status_created', 'status', 'created_at', 'id'),
+    )
+    
     # Serialization rules
     serialize_rules = (
         '-user.orders',
@@ -78,23 +85,9 @@ class Order(db.Model, SerializerMixin):
     # Generate order number
     @classmethod
     def generate_order_number(cls):
-        """Generate unique order number (e.g., ORD-20240115-0001)"""
-        from datetime import datetime
-        today = datetime.now()
-        date_str = today.strftime('%Y%m%d')
-        
-        # Find the last order today and increment
-        last_order = cls.query.filter(
-            cls.order_number.like(f'ORD-{date_str}-%')
-        ).order_by(cls.order_number.desc()).first()
-        
-        if last_order:
-            last_num = int(last_order.order_number.split('-')[-1])
-            new_num = f"{last_num + 1:04d}"
-        else:
-            new_num = "0001"
-        
-        return f"ORD-{date_str}-{new_num}"
+        """Generate unique order number (e.g., ORD-20240115-000123)"""
+        from server.numbering import next_order_number
+        return next_order_number()
     
     # Calculate totals
     def calculate_totals(self):
@@ -196,7 +189,7 @@ class Payment(db.Model, SerializerMixin):
     
     id = Column(Integer, primary_key=True)
     order_id = Column(Integer, ForeignKey('orders.id'), nullable=False, index=True)
-    payment_number = Column(String(50), unique=True, nullable=False)  # e.g., PAY-20241226-0001
+    payment_number = Column(String(50), unique=True, nullable=False)  # e.g., PAY-20241226-000123
     
     # Payment Details
     amount = Column(Numeric(10, 2), nullable=False)
@@ -232,20 +225,9 @@ class Payment(db.Model, SerializerMixin):
     
     @classmethod
     def generate_payment_number(cls):
-        """Generate unique payment number"""
-        from datetime import datetime
-        date_str = datetime.now().strftime('%Y%m%d')
-        last_payment = cls.query.filter(
-            cls.payment_number.like(f'PAY-{date_str}-%')
-        ).order_by(cls.payment_number.desc()).first()
-        
-        if last_payment:
-            last_num = int(last_payment.payment_number.split('-')[-1])
-            new_num = f"{last_num + 1:04d}"
-        else:
-            new_num = "0001"
-        
-        return f"PAY-{date_str}-{new_num}"
+        """Generate unique payment number (e.g., PAY-20240115-000123)"""
+        from server.numbering import next_payment_number
+        return next_payment_number()
     
     def update_from_callback(self, callback_data):
         """Update payment status from M-Pesa callback"""
@@ -288,6 +270,29 @@ class Cart(db.Model, SerializerMixin):
     
     user = relationship('User', back_populates='carts')
     items = relationship('CartItem', back_populates='cart', cascade='all, delete-orphan')
+    
+    # A user's carts by state, and at most one active cart per user
+    __table_args__ = (
+        Index('ix_carts_user_active', 'user_id', 'is_active'),
+        Index('ix_carts_one_active_per_user', 'user_id', unique=True,
+              postgresql_where=text('is_active'), sqlite_where=text('is_active')),
+    )
+
+    @classmethod
+    def active_for(cls, user_id, create=False):
+        """The user's active cart. With `create`, one is added and flushed
+        (not committed) when there is none, so it is only ever created by a
+        write and rolls back with it"""
+        cart = cls.query.filter_by(user_id=user_id, is_active=True).first()
+        if cart is None and create:
+            try:
+                with db.session.begin_nested():
+                    cart = cls(user_id=user_id)
+                    db.session.add(cart)
+            except IntegrityError:
+                # Another request created it first
+                cart = cls.query.filter_by(user_id=user_id, is_active=True).one()
+        return cart
 
 
 class CartItem(db.Model, SerializerMixin):
@@ -301,4 +306,9 @@ class CartItem(db.Model, SerializerMixin):
     updated_at = Column(DateTime, onupdate=func.now())
     
     cart = relationship('Cart', back_populates='items')
-    book = relationship('Book')
\ No newline at end of file
+    book = relationship('Book')
+    
+    # Items of a cart, and one book's line in it (at most one per book)
+    __table_args__ = (
+        Index('ix_cart_items_cart_book', 'cart_id', 'book_id', unique=True),
+    )
@@ -0,0 +1,176 @@
+from server.config import db
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import (Column, Integer, String, DateTime, Numeric, ForeignKey, Enum, JSON, Index,
+                        func, select, update, delete, insert)
+from server.models.order import ORDER_STATUS, PAYMENT_STATUS, PAYMENT_METHODS
+
+
+class OrderSummary(db.Model, SerializerMixin):
+    """Denormalized copy of an order for list endpoints.
+
+    Written with the order at checkout (write()) and kept current by sync()
+    wherever the order's status, payment status or tracking number change,
+    in the same transaction. Order lists read this table alone: no items,
+    addresses or users are loaded per row.
+    """
+    __tablename__ = 'order_summaries'
+
+    order_id = Column(Integer, ForeignKey('orders.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    order_number = Column(String(50), nullable=False)
+
+    # Mirrored from the order by sync()
+    status = Column(Enum(*ORDER_STATUS, name='order_status'), nullable=False)
+    payment_status = Column(Enum(*PAYMENT_STATUS, name='payment_status'), nullable=False)
+    payment_method = Column(Enum(*PAYMENT_METHODS, name='payment_methods'))
+    tracking_number = Column(String(100))
+
+    # Fixed at checkout
+    subtotal = Column(Numeric(10, 2), nullable=False, default=0)
+    tax_amount = Column(Numeric(10, 2), nullable=False, default=0)
+    shipping_amount = Column(Numeric(10, 2), nullable=False, default=0)
+    total_amount = Column(Numeric(10, 2), nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    first_cover_image = Column(String(500))
+    items = Column(JSON, nullable=False, default=list)  # Line snapshots for the admin order modal
+
+    customer_name = Column(String(255))
+    customer_email = Column(String(255))
+    customer_phone = Column(String(50))
+    shipping_full_name = Column(String(100))
+    shipping_city = Column(String(50))
+    shipping_state = Column(String(50))
+    shipping_country = Column(String(50))
+
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime)
+
+    # Customer lists by user, admin lists by date or status, newest first
+    __table_args__ = (
+        Index('ix_order_summaries_user_created', 'user_id', 'created_at', 'order_id'),
+        Index('ix_order_summaries_created', 'created_at', 'order_id'),
+        Index('ix_order_summaries_status_created', 'status', 'created_at', 'order_id'),
+        Index('ix_order_summaries_order_number', 'order_number'),
+    )
+
+    def __repr__(self):
+        return f"<OrderSummary {self.order_number}: {self.item_count} items - {self.status}>"
+
+    @staticmethod
+    def _item(item_id, title, author, cover_image, unit_price, quantity, total_price):
+        return {
+            'id': item_id,
+            'book_image': cover_image,
+            'book_title': title,
+            'book_author': author,
+            'unit_price': float(unit_price),
+            'quantity': quantity,
+            'total_price': float(total_price),
+        }
+
+    @classmethod
+    def write(cls, order, user, address, items):
+        """Insert the summary of a just-flushed order.
+
+        `items` are (id, OrderItem values) pairs as bulk-inserted at
+        checkout, so nothing is read back from the database.
+        """
+        lines = [
+            cls._item(item_id, item['book_title'], item['book_author'], item.get('cover_image'),
+                      item['unit_price'], item['quantity'], item['total_price'])
+            for item_id, item in items
+        ]
+        db.session.execute(insert(cls).values(
+            order_id=order.id,
+            user_id=order.user_id,
+            order_number=order.order_number,
+            status=order.status,
+            payment_status=order.payment_status or 'pending',
+            payment_method=order.payment_method,
+            tracking_number=order.tracking_number,
+            subtotal=order.subtotal,
+            tax_amount=order.tax_amount,
+            shipping_amount=order.shipping_amount,
+            total_amount=order.total_amount,
+            item_count=len(lines),
+            first_cover_image=next((line['book_image'] for line in lines if line['book_image']), None),
+            items=lines,
+            customer_name=f'{user.firstName} {user.secondName}' if user else None,
+            customer_email=user.email if user else None,
+            customer_phone=user.phone if user else None,
+            shipping_full_name=address.full_name,
+            shipping_city=address.town,
+            shipping_state=address.county,
+            shipping_country=address.country,
+            created_at=order.created_at or func.now(),
+            updated_at=order.updated_at,
+        ))
+
+    @classmethod
+    def sync(cls, order):
+        """Copy the order's mutable fields to its summary (call after changing them)"""
+        db.session.execute(
+            update(cls).where(cls.order_id == order.id).values(
+                status=order.status,
+                payment_status=order.payment_status,
+                tracking_number=order.tracking_number,
+                updated_at=order.updated_at or func.now(),
+            ).execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def rebuild(cls):
+        """Recreate every summary from orders, items, addresses and users;
+        returns the number of orders summarized"""
+        from server.models import Order, OrderItem, Address, User, Book
+
+        db.session.execute(delete(cls).execution_options(synchronize_session=False))
+
+        lines = {}
+        rows = db.session.execute(
+            select(
+                OrderItem.order_id, OrderItem.id, OrderItem.book_title, OrderItem.book_author,
+                func.coalesce(OrderItem.cover_image, Book.cover_image_url),
+                OrderItem.unit_price, OrderItem.quantity, OrderItem.total_price
+            ).outerjoin(Book, Book.id == OrderItem.book_id).order_by(OrderItem.order_id, OrderItem.id)
+        )
+        for order_id, *item in rows:
+            lines.setdefault(order_id, []).append(cls._item(*item))
+
+        orders = db.session.execute(
+            select(Order, Address, User)
+            .outerjoin(Address, Address.id == Order.shipping_address_id)
+            .outerjoin(User, User.id == Order.user_id)
+            .order_by(Order.id)
+        ).all()
+        summaries = []
+        for order, address, user in orders:
+            order_lines = lines.get(order.id, [])
+            summaries.append({
+                'order_id': order.id,
+                'user_id': order.user_id,
+                'order_number': order.order_number,
+                'status': order.status,
+                'payment_status': order.payment_status,
+                'payment_method': order.payment_method,
+                'tracking_number': order.tracking_number,
+                'subtotal': order.subtotal,
+                'tax_amount': order.tax_amount,
+                'shipping_amount': order.shipping_amount,
+                'total_amount': order.total_amount,
+                'item_count': len(order_lines),
+                'first_cover_image': next((line['book_image'] for line in order_lines if line['book_image']), None),
+                'items': order_lines,
+                'customer_name': f'{user.firstName} {user.secondName}' if user else None,
+                'customer_email': user.email if user else None,
+                'customer_phone': user.phone if user else None,
+                'shipping_full_name': address.full_name if address else None,
+                'shipping_city': address.town if address else None,
+                'shipping_state': address.county if address else None,
+                'shipping_country': address.country if address else None,
+                'created_at': order.created_at,
+                'updated_at': order.updated_at,
+            })
+        if summaries:
+            db.session.execute(insert(cls), summaries)
+        return len(summaries)
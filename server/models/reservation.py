@@ -0,0 +1,39 @@
+from server.config import db
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Enum, Index, func
+from sqlalchemy.orm import relationship
+
+# active: held by a cart until expires_at; committed: sold with an order;
+# released: handed back to stock (cart expired/emptied, order cancelled)
+RESERVATION_STATUS = ('active', 'committed', 'released')
+# Whether the units came out of stock_quantity or the backorder allowance
+RESERVATION_SOURCES = ('stock', 'backorder')
+
+
+class StockReservation(db.Model, SerializerMixin):
+    __tablename__ = 'stock_reservations'
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False, index=True)
+    cart_id = Column(Integer, ForeignKey('carts.id'), index=True)
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
+
+    quantity = Column(Integer, nullable=False)
+    source = Column(Enum(*RESERVATION_SOURCES, name='reservation_source'), default='stock', nullable=False)
+    status = Column(Enum(*RESERVATION_STATUS, name='reservation_status'), default='active', nullable=False)
+    expires_at = Column(DateTime)  # Only for active (cart) reservations
+
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, onupdate=func.now())
+
+    book = relationship('Book')
+
+    serialize_rules = ('-book',)
+
+    # The expiry sweep scans active reservations by expiry time
+    __table_args__ = (
+        Index('ix_stock_reservations_status_expires', 'status', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f"<StockReservation {self.id}: book {self.book_id} x{self.quantity} ({self.source}, {self.status})>"
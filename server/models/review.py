@@ -1,6 +1,6 @@
 from server.config import db
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, ForeignKey, Enum, func
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, ForeignKey, Enum, Index, func
 from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 
@@ -13,7 +13,7 @@ class Review(db.Model, SerializerMixin):
     id = Column(Integer, primary_key=True)
     
     # Relationships
-    book_id = Column(Integer, ForeignKey('books.id'), nullable=False, index=True)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False)  # Indexed by ix_reviews_book_status_created
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
     
     # Review Content
@@ -46,6 +46,14 @@ class Review(db.Model, SerializerMixin):
     user = relationship('User', foreign_keys=[user_id])
     moderator = relationship('User', foreign_keys=[moderated_by])
     
+    # A book's reviews by status, newest first; the moderation queue newest
+    # first, all reviews or by status
+    __table_args__ = (
+        Index('ix_reviews_book_status_created', 'book_id', 'status', 'created_at', 'id'),
+        Index('ix_reviews_status_created_id', 'status', 'created_at', 'id'),
+        Index('ix_reviews_created_id', 'created_at', 'id'),
+    )
+    
     # Serialization rules
     serialize_rules = (
         '-book.reviews',
@@ -80,18 +88,26 @@ class Review(db.Model, SerializerMixin):
         return title
     
     # Helper methods
+    def rating_contribution(self):
+        """What this review adds to its book's rating aggregates (None unless approved)"""
+        if self.status != 'approved':
+            return None
+        return (int(self.rating), bool(self.content))
+    
     def approve(self, moderator_id=None):
         """Approve this review"""
+        before = self.rating_contribution()
         self.status = 'approved'
         self.moderated_by = moderator_id
         self.moderated_at = datetime.utcnow()
         self.published_at = datetime.utcnow()
         
         # Update book's average rating
-        self.book.update_rating()
+        self.book.apply_rating_change(before, self.rating_contribution())
     
     def reject(self, moderator_id=None, reason=None):
         """Reject this review"""
+        before = self.rating_contribution()
         self.status = 'rejected'
         self.moderated_by = moderator_id
         self.moderated_at = datetime.utcnow()
@@ -99,14 +115,18 @@ class Review(db.Model, SerializerMixin):
             self.moderation_notes = reason
         
         # Update book's average rating
-        self.book.update_rating()
+        self.book.apply_rating_change(before, self.rating_contribution())
     
     def flag(self, reason=None):
         """Flag this review for moderation"""
+        before = self.rating_contribution()
         self.status = 'flagged'
         self.report_count += 1
         if reason:
             self.report_reason = reason
+        
+        # Flagged reviews stop counting towards the book's rating
+        self.book.apply_rating_change(before, self.rating_contribution())
     
     def mark_helpful(self, user_id):
         """Mark review as helpful (prevent duplicate votes per user)"""
@@ -0,0 +1,23 @@
+from server.config import db
+from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, Enum, func
+from server.models.order import ORDER_STATUS
+
+GRANULARITIES = ('hour', 'day')
+
+
+class SalesRollup(db.Model, SerializerMixin):
+    """Orders and revenue per hour or day and order status (see server/sales.py)"""
+    __tablename__ = 'sales_rollups'
+
+    granularity = Column(Enum(*GRANULARITIES, name='rollup_granularity'), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Start of the hour/day the orders were placed in (UTC)
+    status = Column(Enum(*ORDER_STATUS, name='order_status'), primary_key=True)
+
+    order_count = Column(Integer, nullable=False, default=0, server_default='0')
+    revenue = Column(Numeric(14, 2), nullable=False, default=0, server_default='0')
+
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SalesRollup {self.granularity} {self.bucket} {self.status}: {self.order_count} / {self.revenue}>"
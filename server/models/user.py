@@ -1,6 +1,6 @@
 from server.config import db
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy import Column, Integer, String, DateTime, func, Enum
+from sqlalchemy import Column, Integer, String, DateTime, func, Enum, Index
 from sqlalchemy.orm import relationship
 
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -25,6 +25,11 @@ class User(db.Model, SerializerMixin):
     addresses = relationship('Address', back_populates='user', cascade='all, delete-orphan')
     wishlists = relationship('Wishlist', back_populates='user', cascade='all, delete-orphan')
     
+    # Admin user list, newest first
+    __table_args__ = (
+        Index('ix_users_created', 'created_at', 'id'),
+    )
+    
     serialize_only = ('firstName', 'secondName', 'phone', 'role',
                       'email', 'created_at', 'updated_at',)
     serialize_rules = ('-orders.user', '-addresses.user', '-wishlists.user',)
@@ -1,8 +1,9 @@
 from server.config import db
 from sqlalchemy_serializer import SerializerMixin
-from sqlalchemy import Column, Numeric, Integer, String, DateTime, Boolean, Text, ForeignKey, Enum, func
+from sqlalchemy import Column, Numeric, Integer, String, DateTime, Boolean, Text, ForeignKey, Enum, func, select, update, case, or_
 from sqlalchemy.orm import relationship, validates
 from datetime import datetime
+from decimal import Decimal
 
 class Wishlist(db.Model, SerializerMixin):
     __tablename__ = 'wishlists'
@@ -110,12 +111,16 @@ class Wishlist(db.Model, SerializerMixin):
         return self.items.count()
     
     def get_total_value(self):
-        """Calculate total value of all books in wishlist"""
-        total = 0
-        for item in self.items:
-            if item.book:
-                total += float(item.book.get_current_price())
-        return round(total, 2)
+        """Calculate total value of all books in wishlist (one SUM over the
+        items joined to their books)"""
+        from server.models.book import Book, current_price_sql
+        
+        total = db.session.execute(
+            select(func.sum(current_price_sql(Book.list_price, Book.sale_price)))
+            .select_from(WishlistItem).join(Book, Book.id == WishlistItem.book_id)
+            .where(WishlistItem.wishlist_id == self.id)
+        ).scalar()
+        return round(float(total or 0), 2)
     
     def generate_share_token(self):
         """Generate unique share token for public access"""
@@ -254,6 +259,43 @@ class WishlistItem(db.Model, SerializerMixin):
             else:
                 self.price_drop_alert = False
     
+    @classmethod
+    def refresh_price_info(cls, book_ids=None):
+        """update_price_info() for every item whose book's price changed, as
+        one UPDATE ... FROM books.
+        
+        Items added without a price snapshot take the current price as their
+        `added_price`. Refreshes every book when `book_ids` is None. Returns
+        the number of items updated.
+        """
+        from server.models.book import Book, current_price_sql
+        
+        price = current_price_sql(Book.list_price, Book.sale_price)
+        # SET expressions read the row as it was, so this is the old snapshot
+        added = func.coalesce(cls.added_price, price)
+        refresh = update(cls).where(
+            cls.book_id == Book.id,
+            cls.current_price.is_distinct_from(price)
+        )
+        if book_ids is not None:
+            refresh = refresh.where(cls.book_id.in_(book_ids))
+        
+        updated = db.session.execute(
+            refresh.values(
+                added_price=added,
+                current_price=price,
+                lowest_price=case(
+                    (or_(cls.lowest_price.is_(None), price < cls.lowest_price), price),
+                    else_=cls.lowest_price
+                ),
+                # 10% below the price when added, as in update_price_info()
+                price_drop_alert=price < added * Decimal('0.9'),
+                updated_at=func.now()
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.expire_all()
+        return updated
+    
     def get_price_difference(self):
         """Calculate price difference from when added"""
         if self.added_price and self.current_price:
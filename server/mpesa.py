@@ -0,0 +1,145 @@
+"""Minimal client for the Safaricom Daraja M-Pesa Express (STK push) API.
+
+Configuration (app config, usually FLASK_-prefixed env vars):
+  MPESA_BASE_URL         https://sandbox.safaricom.co.ke (default), the live
+                         API, or a local `flask fake-mpesa`
+  MPESA_CONSUMER_KEY / MPESA_CONSUMER_SECRET
+  MPESA_SHORTCODE / MPESA_PASSKEY
+  MPESA_CALLBACK_URL     public URL of /api/payments/mpesa/callback
+  MPESA_TIMEOUT          HTTP timeout in seconds (default 10)
+
+Uses only the standard library so the worker needs no extra packages.
+"""
+import base64
+import json
+import math
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from flask import current_app
+
+DEFAULT_BASE_URL = 'https://sandbox.safaricom.co.ke'
+DEFAULT_TIMEOUT = 10
+
+
+class MpesaError(Exception):
+    pass
+
+
+def normalize_phone(phone):
+    """'0712 345 678', '+254712345678', '712345678' -> '254712345678'; None if invalid"""
+    digits = re.sub(r'\D', '', str(phone or ''))
+    if digits.startswith('0'):
+        digits = '254' + digits[1:]
+    elif len(digits) == 9:
+        digits = '254' + digits
+    return digits if re.fullmatch(r'254[17]\d{8}', digits) else None
+
+
+class MpesaClient:
+    def __init__(self, base_url, consumer_key, consumer_secret, shortcode, passkey,
+                 callback_url, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.shortcode = shortcode
+        self.passkey = passkey
+        self.callback_url = callback_url
+        self.timeout = timeout
+        self._token = None
+        self._token_expires = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            base_url=config.get('MPESA_BASE_URL', DEFAULT_BASE_URL),
+            consumer_key=config.get('MPESA_CONSUMER_KEY', ''),
+            consumer_secret=config.get('MPESA_CONSUMER_SECRET', ''),
+            shortcode=str(config.get('MPESA_SHORTCODE', '')),
+            passkey=config.get('MPESA_PASSKEY', ''),
+            callback_url=config.get('MPESA_CALLBACK_URL', ''),
+            timeout=config.get('MPESA_TIMEOUT', DEFAULT_TIMEOUT)
+        )
+
+    def _request(self, path, body=None, headers=None):
+        """Call the API and return its JSON body. Daraja reports errors as
+        JSON with a 4xx/5xx status, so those are returned too; only
+        transport failures and non-JSON replies raise MpesaError."""
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method='POST' if data is not None else 'GET',
+            headers={'Content-Type': 'application/json', **(headers or {})}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                raw = response.read()
+        except urllib.error.HTTPError as e:
+            raw = e.read()
+        except (urllib.error.URLError, OSError) as e:
+            raise MpesaError(f'M-Pesa request to {path} failed: {e}') from e
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise MpesaError(f'M-Pesa returned a non-JSON response for {path}') from e
+
+    def access_token(self):
+        with self._lock:
+            if self._token and time.monotonic() < self._token_expires:
+                return self._token
+            credentials = base64.b64encode(f'{self.consumer_key}:{self.consumer_secret}'.encode()).decode()
+            result = self._request(
+                '/oauth/v1/generate?grant_type=client_credentials',
+                headers={'Authorization': f'Basic {credentials}'}
+            )
+            if 'access_token' not in result:
+                raise MpesaError(f'M-Pesa authentication failed: {result}')
+            self._token = result['access_token']
+            # Renew a minute early
+            self._token_expires = time.monotonic() + int(result.get('expires_in', 3599)) - 60
+            return self._token
+
+    def _authorized(self, path, body):
+        return self._request(path, body, {'Authorization': f'Bearer {self.access_token()}'})
+
+    def _password(self):
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        password = base64.b64encode(f'{self.shortcode}{self.passkey}{timestamp}'.encode()).decode()
+        return password, timestamp
+
+    def stk_push(self, phone, amount, reference, description):
+        """Prompt `phone` to pay `amount` (rounded up to whole shillings)"""
+        password, timestamp = self._password()
+        return self._authorized('/mpesa/stkpush/v1/processrequest', {
+            'BusinessShortCode': self.shortcode,
+            'Password': password,
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerPayBillOnline',
+            'Amount': int(math.ceil(amount)),
+            'PartyA': phone,
+            'PartyB': self.shortcode,
+            'PhoneNumber': phone,
+            'CallBackURL': self.callback_url,
+            'AccountReference': reference[:12],
+            'TransactionDesc': description[:13],
+        })
+
+    def stk_query(self, checkout_request_id):
+        password, timestamp = self._password()
+        return self._authorized('/mpesa/stkpushquery/v1/query', {
+            'BusinessShortCode': self.shortcode,
+            'Password': password,
+            'Timestamp': timestamp,
+            'CheckoutRequestID': checkout_request_id,
+        })
+
+
+def get_client():
+    """Client for the current app, reused so the OAuth token is cached"""
+    extensions = current_app.extensions
+    if 'mpesa' not in extensions:
+        extensions['mpesa'] = MpesaClient.from_config(current_app.config)
+    return extensions['mpesa']
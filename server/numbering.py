@@ -0,0 +1,78 @@
+"""Order and payment numbers.
+
+Numbers keep their human-readable shape (ORD-20240115-000123) but the serial
+comes from a hi/lo counter instead of scanning for the last number issued:
+each worker takes a block of NUMBER_BLOCK_SIZE serials with one atomic
+
+    UPDATE number_blocks SET next_value = next_value + :size
+    WHERE name = :name RETURNING next_value
+
+on its own autocommit connection, so no lock outlives that statement, and
+hands the block out from memory. Serials are unique across threads, workers
+and hosts and cost one round trip per block. They increase within a worker
+but interleave between workers, and a restarted worker abandons the rest of
+its block, so expect gaps. The date part is informational only.
+"""
+import os
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError
+from server.config import db
+from server.models import NumberBlock
+
+DEFAULT_BLOCK_SIZE = 50
+
+
+class HiLoCounter:
+    def __init__(self, name):
+        self.name = name
+        self._next = self._end = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _allocate(self, size):
+        """Reserve the next `size` serials in the database; returns [start, end)"""
+        blocks = NumberBlock.__table__
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            end = conn.execute(
+                update(blocks).where(blocks.c.name == self.name)
+                .values(next_value=blocks.c.next_value + size)
+                .returning(blocks.c.next_value)
+            ).scalar()
+            if end is None:
+                try:
+                    conn.execute(insert(blocks).values(name=self.name, next_value=1 + size))
+                except IntegrityError:
+                    # Another worker created the counter first
+                    return self._allocate(size)
+                end = 1 + size
+        return end - size, end
+
+    def next(self):
+        with self._lock:
+            # A forked worker must not reuse the block its parent was serving
+            if self._next >= self._end or self._pid != os.getpid():
+                size = current_app.config.get('NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+                self._next, self._end = self._allocate(size)
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+            return value
+
+
+order_numbers = HiLoCounter('order')
+payment_numbers = HiLoCounter('payment')
+
+
+def format_number(prefix, serial):
+    return f"{prefix}-{datetime.utcnow():%Y%m%d}-{serial:06d}"
+
+
+def next_order_number():
+    return format_number('ORD', order_numbers.next())
+
+
+def next_payment_number():
+    return format_number('PAY', payment_numbers.next())
@@ -0,0 +1,155 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+A cursor is an opaque url-safe token holding the sort key and id of the last
+row served. The next page is a range scan on (sort column, id) instead of an
+OFFSET, and no COUNT(*) is issued unless the client asks for a total.
+
+Nullable sort columns keep the database's own NULL ordering (last ascending
+on PostgreSQL, first on SQLite), so their indexes still serve the ORDER BY;
+the keyset predicate follows the same order, so rows with a NULL sort value
+are neither skipped nor repeated.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, or_
+from server.config import db
+
+MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+        raise InvalidCursor('Invalid cursor')
+    return value
+
+
+def encode_cursor(sort_key, value, row_id):
+    payload = json.dumps([sort_key, _dump(value), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort_key):
+    """Return (sort value, id) from a cursor issued for the same sort order"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        key, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        value = _load(value)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+    if key != sort_key or not isinstance(row_id, int):
+        raise InvalidCursor('Invalid cursor')
+    return value, row_id
+
+
+def keyset_order(query, sort_column, id_column, descending=True):
+    """Order by the sort column with the id as a unique tie-breaker"""
+    if descending:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column.asc(), id_column.asc())
+
+
+def _nulls_sort_high():
+    """Whether NULLs sort after every value in ascending order"""
+    return db.session.get_bind().dialect.name in ('postgresql', 'oracle')
+
+
+def keyset_after(sort_column, id_column, value, last_id, descending=True):
+    """Filter for the rows after (value, last_id) in keyset_order's order"""
+    id_after = id_column < last_id if descending else id_column > last_id
+    nulls_last = _nulls_sort_high() != descending
+    if value is None:
+        if nulls_last:
+            return and_(sort_column.is_(None), id_after)
+        return or_(and_(sort_column.is_(None), id_after), sort_column.is_not(None))
+
+    beyond = sort_column < value if descending else sort_column > value
+    after = or_(beyond, and_(sort_column == value, id_after))
+    if nulls_last and getattr(sort_column, 'nullable', True):
+        after = or_(after, sort_column.is_(None))
+    return after
+
+
+def estimate_count(query):
+    """Planner row estimate for `query` (PostgreSQL only, otherwise None)"""
+    bind = db.session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return None
+    compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+    plan = db.session.connection().exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params
+    ).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def paginate(query, sort_column, id_column, descending=True, page=1, per_page=20,
+             cursor=None, total=None):
+    """Fetch one page of `query` ordered by (sort_column, id_column).
+
+    When `cursor` is None this is the classic page/per_page mode. Otherwise
+    it is keyset mode: pass an empty cursor for the first page and the
+    returned `next_cursor` for the following ones. In keyset mode `total`
+    may be 'exact' (COUNT(*)) or 'estimate' (planner estimate); anything
+    else skips counting.
+
+    `per_page` is clamped to 1..MAX_PER_PAGE in both modes.
+
+    Returns (items, pagination dict). Raises InvalidCursor for a malformed
+    cursor or one issued for a different sort order.
+    """
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    if cursor is None:
+        pagination = keyset_order(query, sort_column, id_column, descending).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return pagination.items, {
+            'page': pagination.page,
+            'per_page': pagination.per_page,
+            'total': pagination.total,
+            'pages': pagination.pages,
+            'has_next': pagination.has_next,
+            'has_prev': pagination.has_prev
+        }
+
+    sort_key = f"{sort_column.key}:{'desc' if descending else 'asc'}"
+    page_query = query
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_key)
+        page_query = page_query.filter(keyset_after(sort_column, id_column, value, last_id, descending))
+
+    rows = keyset_order(page_query, sort_column, id_column, descending).limit(per_page + 1).all()
+    items = rows[:per_page]
+    has_next = len(rows) > per_page
+
+    pagination_data = {
+        'per_page': per_page,
+        'cursor': cursor or None,
+        'next_cursor': encode_cursor(
+            sort_key, getattr(items[-1], sort_column.key), getattr(items[-1], id_column.key)
+        ) if has_next else None,
+        'has_next': has_next
+    }
+    if total == 'exact':
+        pagination_data['total'] = query.order_by(None).count()
+    elif total == 'estimate':
+        pagination_data['total_estimate'] = estimate_count(query)
+
+    return items, pagination_data
@@ -0,0 +1,151 @@
+"""M-Pesa payments, processed outside the request path.
+
+Checkout only records a pending Payment and queues `mpesa.stk_push`
+(start_mpesa_payment). The job worker then runs:
+
+  mpesa.stk_push   send the STK push, store MerchantRequestID and
+                   CheckoutRequestID, and schedule a status query in case
+                   the callback never arrives
+  mpesa.callback   (batched) apply the callbacks received by
+                   /api/payments/mpesa/callback, one query per batch
+  mpesa.stk_query  poll the push status every MPESA_QUERY_INTERVAL seconds
+                   until it resolves or MPESA_PAYMENT_TIMEOUT passes
+
+A paid payment moves its order to `processing`. A failed or timed-out one
+cancels the order and returns its stock. So does a push that could not be
+sent: Daraja errors without a ResponseCode (5xx, expired token, ...) and
+transport failures are retried, and once the job runs out of attempts the
+payment is settled as failed. Every step re-checks that the
+payment is still pending, so duplicate callbacks and late queries are no-ops.
+"""
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from server.config import db
+from server.models import Payment, OrderSummary
+from server.jobs import handler, enqueue, Retry
+from server.mpesa import get_client, MpesaError
+from server.inventory import return_order_stock
+from server.sales import move_order
+
+DEFAULT_QUERY_DELAY = 30
+DEFAULT_QUERY_INTERVAL = 15
+DEFAULT_PAYMENT_TIMEOUT = 180
+CALLBACK_RETRIES = 3
+# Daraja result code for a push the customer never answered
+TIMEOUT_RESULT_CODE = 1037
+# Result code recorded for a push that could not be sent at all
+PUSH_FAILED_RESULT_CODE = 1
+
+
+def start_mpesa_payment(payment):
+    """Queue the STK push for a flushed pending payment; sent once the caller commits"""
+    return enqueue('mpesa.stk_push', {'payment_id': payment.id})
+
+
+def _config(key, default):
+    return current_app.config.get(key, default)
+
+
+def settle(payment, callback):
+    """Apply an stkCallback-shaped result to a pending payment and its order"""
+    order = payment.order
+    before = order.status
+    payment.update_from_callback(callback)
+    if payment.status == 'failed' and order.status == 'pending':
+        order.status = 'cancelled'
+        order.updated_at = datetime.utcnow()
+        return_order_stock(order)
+    OrderSummary.sync(order)
+    move_order(order, before)
+
+
+def _result(payment, code, description):
+    return {'Body': {'stkCallback': {
+        'MerchantRequestID': payment.merchant_request_id,
+        'CheckoutRequestID': payment.checkout_request_id,
+        'ResultCode': code,
+        'ResultDesc': description,
+    }}}
+
+
+def _push_failed(payload, error):
+    """The push could not be sent in any attempt: fail the payment"""
+    payment = db.session.get(Payment, payload['payment_id'])
+    if payment and payment.status == 'pending' and not payment.checkout_request_id:
+        settle(payment, _result(payment, PUSH_FAILED_RESULT_CODE, f'STK push failed: {error}'[:255]))
+
+
+@handler('mpesa.stk_push', on_failure=_push_failed)
+def send_stk_push(payload):
+    payment = db.session.get(Payment, payload['payment_id'])
+    if not payment or payment.status != 'pending' or payment.checkout_request_id:
+        return
+
+    response = get_client().stk_push(
+        phone=payment.customer_phone,
+        amount=payment.amount,
+        reference=payment.order.order_number,
+        description=f'Order {payment.order.id}'
+    )
+    code = response.get('ResponseCode')
+    if code is None:
+        # An API error ({errorCode, errorMessage}), not an answer to the push
+        raise MpesaError(f"{response.get('errorCode')}: {response.get('errorMessage')}")
+
+    payment.stk_push_response = response
+    payment.initiated_at = datetime.utcnow()
+    if str(code) == '0':
+        payment.merchant_request_id = response.get('MerchantRequestID')
+        payment.checkout_request_id = response.get('CheckoutRequestID')
+        enqueue('mpesa.stk_query', {'payment_id': payment.id},
+                delay=_config('MPESA_QUERY_DELAY', DEFAULT_QUERY_DELAY))
+    else:
+        # Rejected outright
+        code = str(code)
+        settle(payment, _result(
+            payment, int(code) if code.isdigit() else PUSH_FAILED_RESULT_CODE,
+            response.get('ResponseDescription')
+        ))
+
+
+@handler('mpesa.callback', batch=True)
+def apply_callbacks(payloads):
+    callbacks = {}
+    for payload in payloads:
+        callback = payload['callback']
+        checkout_request_id = callback['Body']['stkCallback']['CheckoutRequestID']
+        callbacks.setdefault(checkout_request_id, payload)  # Duplicates: first one wins
+
+    payments = Payment.query.options(joinedload(Payment.order)).filter(
+        Payment.checkout_request_id.in_(callbacks)
+    ).all()
+    for payment in payments:
+        if payment.status == 'pending':
+            settle(payment, callbacks.pop(payment.checkout_request_id)['callback'])
+        else:
+            callbacks.pop(payment.checkout_request_id)
+
+    # A callback can beat the commit of its own stk_push job; try those again shortly
+    for payload in callbacks.values():
+        if payload.get('tries', 0) < CALLBACK_RETRIES:
+            enqueue('mpesa.callback', {**payload, 'tries': payload.get('tries', 0) + 1},
+                    delay=_config('MPESA_QUERY_INTERVAL', DEFAULT_QUERY_INTERVAL))
+
+
+@handler('mpesa.stk_query')
+def query_stk_push(payload):
+    payment = db.session.get(Payment, payload['payment_id'])
+    if not payment or payment.status != 'pending' or not payment.checkout_request_id:
+        return
+
+    response = get_client().stk_query(payment.checkout_request_id)
+    if 'ResultCode' in response:
+        settle(payment, _result(payment, int(response['ResultCode']), response.get('ResultDesc')))
+    elif payment.initiated_at < datetime.utcnow() - timedelta(
+        seconds=_config('MPESA_PAYMENT_TIMEOUT', DEFAULT_PAYMENT_TIMEOUT)
+    ):
+        settle(payment, _result(payment, TIMEOUT_RESULT_CODE, 'Timed out waiting for the customer'))
+    else:
+        # Still waiting on the customer
+        raise Retry(_config('MPESA_QUERY_INTERVAL', DEFAULT_QUERY_INTERVAL))
@@ -0,0 +1,171 @@
+"""Query-plan regression check for the API's read endpoints.
+
+    flask check-query-plans [--min-rows 1000] [--verbose]
+
+Calls every endpoint in ENDPOINTS through the test client against the
+configured (seeded) database, records the SELECTs each one runs, and
+EXPLAINs them with the parameters they ran with. A plan fails when it reads
+a large table with a sequential scan: one of LARGE_TABLES, or any table with
+at least `min_rows` rows.
+
+On PostgreSQL the EXPLAINs run with `enable_seqscan = off`, so the planner
+picks an index whenever one can serve the query and a remaining Seq Scan
+means no index matches, however small the seeded tables are. On SQLite a
+plain `SCAN <table>` in EXPLAIN QUERY PLAN is the equivalent (full index
+scans, `SCAN ... USING INDEX`, are fine).
+
+Requests carry a bearer token, which also keeps them out of the anonymous
+response cache. The command exits with status 1 when any plan fails.
+"""
+import re
+from sqlalchemy import event, func, select
+from server.config import db
+from server.auth import token_for
+from server.models import User, Book, Order, Review
+
+DEFAULT_MIN_ROWS = 1000
+
+# Tables that grow with traffic or the catalog; a scan on these always fails
+LARGE_TABLES = {
+    'books', 'book_categories', 'reviews', 'review_votes', 'users', 'addresses',
+    'orders', 'order_items', 'order_summaries', 'customer_stats', 'payments', 'carts', 'cart_items',
+    'wishlists', 'wishlist_items', 'stock_reservations', 'idempotency_keys', 'jobs',
+}
+
+# (who, path); {book_id}, {order_id} and {user_id} are filled from the database
+ENDPOINTS = [
+    (None, '/api/books'),
+    (None, '/api/books?featured=true'),
+    (None, '/api/books?bestseller=true&sort=total_sold'),
+    (None, '/api/books/{book_id}'),
+    (None, '/api/books/featured'),
+    (None, '/api/books/bestsellers'),
+    (None, '/api/categories'),
+    (None, '/api/books/search?q=the'),
+    (None, '/api/books/suggest?q=th'),
+    (None, '/api/books/{book_id}/reviews'),
+    (None, '/api/books/{book_id}/reviews?status=approved'),
+    ('customer', '/api/cart'),
+    ('customer', '/api/orders'),
+    ('customer', '/api/orders?status=pending'),
+    ('customer', '/api/orders/{order_id}'),
+    ('customer', '/api/wishlist'),
+    ('admin', '/api/admin/books'),
+    ('admin', '/api/admin/dashboard/stats'),
+    ('admin', '/api/admin/users'),
+    ('admin', '/api/admin/users/{user_id}/orders'),
+    ('admin', '/api/admin/orders'),
+    ('admin', '/api/admin/orders?status=pending'),
+    ('admin', '/api/admin/reviews'),
+    ('admin', '/api/admin/reviews?status=pending'),
+]
+
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def _sample_ids():
+    """Ids to fill the endpoint paths with, and the users to call them as"""
+    admin = User.query.filter_by(role='admin').order_by(User.id).first()
+    order = Order.query.order_by(Order.id.desc()).first()
+    customer = db.session.get(User, order.user_id) if order else \
+        User.query.filter(User.role != 'admin').order_by(User.id).first()
+    book_id = db.session.execute(
+        select(Review.book_id).group_by(Review.book_id).order_by(func.count().desc()).limit(1)
+    ).scalar() or db.session.execute(select(func.min(Book.id))).scalar()
+    ids = {
+        'book_id': book_id,
+        'order_id': order.id if order else 0,
+        'user_id': customer.id if customer else 0,
+    }
+    return ids, {'admin': admin, 'customer': customer}
+
+
+def _table_rows():
+    rows = {}
+    for table in db.metadata.sorted_tables:
+        try:
+            rows[table.name] = db.session.execute(select(func.count()).select_from(table)).scalar()
+        except Exception:
+            db.session.rollback()  # Table not migrated yet
+    return rows
+
+
+def _pg_seq_scans(plan):
+    """Relations read by Seq Scan nodes anywhere in a JSON plan"""
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan':
+        scans.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        scans.extend(_pg_seq_scans(child))
+    return scans
+
+
+def explain(cursor, dialect, statement, parameters):
+    """(plan lines, tables read by sequential scan) for one recorded statement"""
+    if dialect == 'postgresql':
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        scans = _pg_seq_scans(cursor.fetchone()[0][0]['Plan'])
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        return [row[0] for row in cursor.fetchall()], scans
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    details = [row[-1] for row in cursor.fetchall()]
+    return details, [m.group(1) for m in map(_SQLITE_SCAN.match, details) if m]
+
+
+def record_selects(app, path, headers):
+    """Request `path` and return (status code, SELECTs run with their parameters)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')) and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = app.test_client().get(path, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, statements
+
+
+def check_query_plans(app, min_rows=DEFAULT_MIN_ROWS, echo=print, verbose=False):
+    """Run the check and return the number of failing statements"""
+    ids, users = _sample_ids()
+    rows = _table_rows()
+    large = {name for name, count in rows.items() if name in LARGE_TABLES or count >= min_rows}
+    tokens = {
+        who: token_for(user)
+        for who, user in users.items() if user
+    }
+    # Any valid token bypasses the anonymous response cache
+    anonymous = tokens.get('customer') or next(iter(tokens.values()), None)
+    db.session.commit()
+
+    dialect = db.engine.dialect.name
+    failures = 0
+    with db.engine.connect() as connection:
+        raw = connection.connection
+        cursor = raw.cursor()
+        if dialect == 'postgresql':
+            cursor.execute('SET enable_seqscan = off')
+        for who, template in ENDPOINTS:
+            path = template.format(**ids)
+            token = tokens.get(who) if who else anonymous
+            if who and not token:
+                echo(f'SKIP {path} (no {who} user)')
+                continue
+            status, statements = record_selects(app, path, {'Authorization': f'Bearer {token}'} if token else {})
+            echo(f'{status} {path} ({len(statements)} queries)')
+            for statement, parameters in statements:
+                plan, scans = explain(cursor, dialect, statement, parameters)
+                bad = sorted({table for table in scans if table in large})
+                if bad:
+                    failures += 1
+                    echo(f'  FAIL sequential scan on {", ".join(bad)}')
+                    echo('    ' + ' '.join(statement.split())[:300])
+                if verbose or bad:
+                    for line in plan:
+                        echo(f'    | {line}')
+        cursor.close()
+        raw.rollback()
+    return failures
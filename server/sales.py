@@ -0,0 +1,247 @@
+"""Sales rollups for the admin dashboard, and per-customer lifetime totals.
+
+`sales_rollups` holds the number and value of orders per (hour, status) and
+(day, status), bucketed by when the order was placed. It is kept current in
+the order's own transaction:
+
+  record_order(order)          at checkout: +1 order in its status
+  move_order(order, before)    after a status change: moves the order from
+                               the `before` status to its current one
+
+Each is a single multi-row upsert (INSERT ... ON CONFLICT DO UPDATE with
+relative increments), so concurrent checkouts never lose counts. Call them
+last before committing: the rollup rows are shared by every order in the
+same hour, and their row locks are held until commit.
+
+Reads need no scan of `orders`: totals() sums day rows for a range and
+chart() buckets them by hour, day, week or month with one GROUP BY over
+date_trunc (strftime on SQLite).
+
+record_order() also adds the order to its customer's `customer_stats` row
+(order count, total spent, last order date over every order placed).
+customer_stats() reads those rows for a page of users and computes any
+missing ones from one grouped query over their orders, without writing:
+it serves GET requests.
+
+`flask rebuild-sales-rollups` recomputes both tables from `orders`.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert, func, case
+from sqlalchemy.dialects import postgresql, sqlite
+from server.config import db
+from server.models import Order, SalesRollup, CustomerStats
+
+INTERVALS = ('hour', 'day', 'week', 'month')
+# Longest range charted by the hour (one point per hour)
+MAX_HOURLY_SPAN = timedelta(days=31)
+
+_SQLITE_TRUNCATE = {
+    'hour': ('%Y-%m-%d %H:00:00',),
+    'day': ('%Y-%m-%d 00:00:00',),
+    'month': ('%Y-%m-01 00:00:00',),
+    # Monday-start weeks, like date_trunc('week', ...)
+    'week': ('%Y-%m-%d 00:00:00', '-6 days', 'weekday 1'),
+}
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def truncate(interval, value):
+    """Start of the hour/day/week/month containing `value` (a datetime)"""
+    if interval == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _advance(interval, value):
+    if interval == 'hour':
+        return value + timedelta(hours=1)
+    if interval == 'day':
+        return value + timedelta(days=1)
+    if interval == 'week':
+        return value + timedelta(weeks=1)
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _truncate_column(interval, column):
+    """SQL expression for the start of the interval containing `column`"""
+    if _dialect() == 'postgresql':
+        return func.date_trunc(interval, column)
+    fmt, *modifiers = _SQLITE_TRUNCATE[interval]
+    if modifiers:
+        return func.strftime(fmt, column, *modifiers)
+    return func.strftime(fmt, column)
+
+
+def _insert(model, rows):
+    return {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}[_dialect()](model).values(rows)
+
+
+def _upsert(rows):
+    """Add each row's order_count and revenue to the stored totals"""
+    if not rows:
+        return
+    statement = _insert(SalesRollup, rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['granularity', 'bucket', 'status'],
+        set_={
+            'order_count': SalesRollup.order_count + statement.excluded.order_count,
+            'revenue': SalesRollup.revenue + statement.excluded.revenue,
+            'updated_at': func.now(),
+        }
+    ))
+
+
+def _add_to_customer(user_id, placed_at, amount):
+    statement = _insert(CustomerStats, [{
+        'user_id': user_id, 'order_count': 1, 'total_spent': amount, 'last_order_at': placed_at
+    }])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={
+            'order_count': CustomerStats.order_count + 1,
+            'total_spent': CustomerStats.total_spent + statement.excluded.total_spent,
+            'last_order_at': case(
+                (CustomerStats.last_order_at > statement.excluded.last_order_at, CustomerStats.last_order_at),
+                else_=statement.excluded.last_order_at
+            ),
+            'updated_at': func.now(),
+        }
+    ))
+
+
+def _rows(placed_at, status, count, amount):
+    return [
+        {'granularity': granularity, 'bucket': truncate(granularity, placed_at),
+         'status': status, 'order_count': count, 'revenue': amount}
+        for granularity in ('hour', 'day')
+    ]
+
+
+def record_order(order):
+    """Count a new order in its hour and day, and in its customer's totals"""
+    placed_at = order.created_at or datetime.utcnow()
+    _upsert(_rows(placed_at, order.status, 1, order.total_amount))
+    _add_to_customer(order.user_id, placed_at, order.total_amount)
+
+
+def move_order(order, before):
+    """Move an order from status `before` to its current status"""
+    if before == order.status:
+        return
+    placed_at = order.created_at or datetime.utcnow()
+    # Sorted by key so concurrent moves lock rows in the same order
+    rows = _rows(placed_at, before, -1, -order.total_amount) + \
+        _rows(placed_at, order.status, 1, order.total_amount)
+    _upsert(sorted(rows, key=lambda row: (row['granularity'], row['status'])))
+
+
+def totals(start=None, end=None, statuses=None):
+    """(orders, revenue) placed in [start, end), from day rows; `start` and
+    `end` are rounded down to whole days"""
+    query = select(
+        func.coalesce(func.sum(SalesRollup.order_count), 0),
+        func.coalesce(func.sum(SalesRollup.revenue), 0)
+    ).where(SalesRollup.granularity == 'day')
+    if start:
+        query = query.where(SalesRollup.bucket >= truncate('day', start))
+    if end:
+        query = query.where(SalesRollup.bucket < truncate('day', end))
+    if statuses:
+        query = query.where(SalesRollup.status.in_(statuses))
+    return tuple(db.session.execute(query).one())
+
+
+def chart(start, end, interval='day', statuses=None):
+    """Orders and revenue per `interval` for orders placed in [start, end),
+    one GROUP BY over the rollups; empty intervals are included as zeros"""
+    granularity = 'hour' if interval == 'hour' else 'day'
+    start, end = truncate(granularity, start), truncate(granularity, end)
+    period = _truncate_column(interval, SalesRollup.bucket).label('period')
+    query = select(
+        period, func.sum(SalesRollup.order_count), func.sum(SalesRollup.revenue)
+    ).where(
+        SalesRollup.granularity == granularity,
+        SalesRollup.bucket >= start,
+        SalesRollup.bucket < end
+    ).group_by(period).order_by(period)
+    if statuses:
+        query = query.where(SalesRollup.status.in_(statuses))
+
+    found = {}
+    for bucket, count, revenue in db.session.execute(query):
+        if isinstance(bucket, str):
+            bucket = datetime.fromisoformat(bucket)
+        found[bucket.replace(tzinfo=None)] = (int(count or 0), float(revenue or 0))
+
+    points = []
+    bucket = truncate(interval, start)
+    while bucket < end:
+        count, revenue = found.get(bucket, (0, 0.0))
+        points.append({'period': bucket.isoformat(), 'orders': count, 'revenue': revenue})
+        bucket = _advance(interval, bucket)
+    return points
+
+
+def _grouped_customer_stats(user_ids=None):
+    """Order count, total spent and last order date per user, in one GROUP BY"""
+    query = select(
+        Order.user_id, func.count(), func.coalesce(func.sum(Order.total_amount), 0), func.max(Order.created_at)
+    ).group_by(Order.user_id)
+    if user_ids is not None:
+        query = query.where(Order.user_id.in_(user_ids))
+    return [
+        {'user_id': user_id, 'order_count': count, 'total_spent': spent, 'last_order_at': last}
+        for user_id, count, spent, last in db.session.execute(query)
+    ]
+
+
+def customer_stats(user_ids):
+    """{user_id: (order_count, total_spent, last_order_at)} for a page of users.
+
+    Users without a cached row (no orders yet, or never backfilled) are
+    computed from their orders. Nothing is written; `flask
+    rebuild-sales-rollups` backfills the missing rows.
+    """
+    user_ids = list(user_ids)
+    stats = {
+        row.user_id: (row.order_count, row.total_spent, row.last_order_at)
+        for row in CustomerStats.query.filter(CustomerStats.user_id.in_(user_ids))
+    }
+    missing = [user_id for user_id in user_ids if user_id not in stats]
+    if missing:
+        for row in _grouped_customer_stats(missing):
+            stats[row['user_id']] = (row['order_count'], row['total_spent'], row['last_order_at'])
+    return {user_id: stats.get(user_id, (0, 0, None)) for user_id in user_ids}
+
+
+def rebuild_sales_rollups():
+    """Recompute every rollup and customer total from the orders table;
+    returns the number of rollup rows"""
+    db.session.execute(delete(CustomerStats).execution_options(synchronize_session=False))
+    rows = _grouped_customer_stats()
+    if rows:
+        db.session.execute(insert(CustomerStats), rows)
+
+    db.session.execute(delete(SalesRollup).execution_options(synchronize_session=False))
+    for granularity in ('hour', 'day'):
+        bucket = _truncate_column(granularity, Order.created_at)
+        grouped = select(
+            bucket, Order.status, func.count(), func.coalesce(func.sum(Order.total_amount), 0)
+        ).group_by(bucket, Order.status)
+        rows = [
+            {'granularity': granularity,
+             'bucket': datetime.fromisoformat(value) if isinstance(value, str) else value,
+             'status': status, 'order_count': count, 'revenue': revenue}
+            for value, status, count, revenue in db.session.execute(grouped)
+        ]
+        if rows:
+            db.session.execute(insert(SalesRollup), rows)
+    return db.session.execute(select(func.count()).select_from(SalesRollup)).scalar()
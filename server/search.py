@@ -0,0 +1,163 @@
+"""Full-text search over the book catalog.
+
+PostgreSQL: a generated, weighted `books.search_vector` tsvector column with a
+GIN index, plus pg_trgm GIN indexes on title and author for substring matches.
+SQLite: an external-content FTS5 table (`books_fts`) kept in sync by triggers.
+
+Both are maintained by the database itself, so every write to `books`
+(including the admin create/update endpoints) keeps the index current.
+Other dialects fall back to the original ILIKE scan.
+"""
+import re
+from sqlalchemy import DDL, event, or_, func, literal_column, table, column
+from server.config import db
+from server.models import Book
+
+# Columns that feed the search index, with their relevance weight
+SEARCH_FIELDS = (
+    ('title', 'A'),
+    ('author', 'A'),
+    ('short_description', 'B'),
+    ('description', 'C'),
+)
+FTS_WEIGHTS = {'A': 10.0, 'B': 3.0, 'C': 1.0}
+
+_search_vector_sql = ' || '.join(
+    f"setweight(to_tsvector('english', coalesce({name}, '')), '{weight}')"
+    for name, weight in SEARCH_FIELDS
+)
+
+POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({_search_vector_sql}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_books_search_vector ON books USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_books_title_trgm ON books USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_trgm ON books USING gin (author gin_trgm_ops)",
+)
+
+_fts_columns = ', '.join(name for name, _ in SEARCH_FIELDS)
+_fts_new = ', '.join(f'new.{name}' for name, _ in SEARCH_FIELDS)
+_fts_old = ', '.join(f'old.{name}' for name, _ in SEARCH_FIELDS)
+
+SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+    f"{_fts_columns}, content='books', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN "
+    f"INSERT INTO books_fts(rowid, {_fts_columns}) VALUES (new.id, {_fts_new}); END",
+    f"CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN "
+    f"INSERT INTO books_fts(books_fts, rowid, {_fts_columns}) VALUES ('delete', old.id, {_fts_old}); END",
+    f"CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF {_fts_columns} ON books BEGIN "
+    f"INSERT INTO books_fts(books_fts, rowid, {_fts_columns}) VALUES ('delete', old.id, {_fts_old}); "
+    f"INSERT INTO books_fts(rowid, {_fts_columns}) VALUES (new.id, {_fts_new}); END",
+)
+
+# Build the index whenever `books` is created through metadata.create_all
+for statement in POSTGRES_DDL:
+    event.listen(Book.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in SQLITE_DDL:
+    event.listen(Book.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+books_fts = table('books_fts', column('rowid'), column('books_fts'))
+search_vector = literal_column('books.search_vector')
+
+ISBN_PATTERN = re.compile(r'^(\d{13}|\d{9}[\dXx])$')
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _terms(search_query):
+    return re.findall(r'\w+', search_query.lower())
+
+
+def find_by_isbn(search_query, query=None):
+    """Exact ISBN-10/13 lookup; returns None unless the query looks like an ISBN"""
+    isbn = search_query.replace('-', '').replace(' ', '')
+    if not ISBN_PATTERN.match(isbn):
+        return None
+    query = query if query is not None else Book.query
+    column = Book.isbn_13 if len(isbn) == 13 else Book.isbn_10
+    return query.filter(column == isbn.upper()).first()
+
+
+def search_books(search_query, limit=10, query=None):
+    """Return books matching `search_query`, most relevant first.
+
+    `query` is the base Book query to search within (status/availability
+    filters); defaults to all books.
+    """
+    query = query if query is not None else Book.query
+
+    isbn_match = find_by_isbn(search_query, query)
+    if isbn_match is not None:
+        return [isbn_match]
+
+    terms = _terms(search_query)
+    if not terms:
+        return []
+
+    dialect = _dialect()
+    if dialect == 'postgresql':
+        query = _search_postgres(query, search_query, terms)
+    elif dialect == 'sqlite':
+        query = _search_sqlite(query, terms)
+    else:
+        query = _search_like(query, search_query)
+
+    return query.limit(limit).all()
+
+
+def _search_postgres(query, search_query, terms):
+    # Prefix-match every term so partially typed words still hit the index
+    ts_query = func.to_tsquery('english', ' & '.join(f'{term}:*' for term in terms))
+    search_term = f"%{search_query}%"
+    rank = (
+        func.ts_rank(search_vector, ts_query)
+        + func.greatest(func.similarity(Book.title, search_query),
+                        func.similarity(Book.author, search_query))
+    )
+    return query.filter(
+        or_(
+            search_vector.op('@@')(ts_query),
+            Book.title.ilike(search_term),
+            Book.author.ilike(search_term)
+        )
+    ).order_by(rank.desc(), Book.id)
+
+
+def _search_sqlite(query, terms):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    rank = func.bm25(literal_column('books_fts'), *(FTS_WEIGHTS[weight] for _, weight in SEARCH_FIELDS))
+    return query.join(books_fts, books_fts.c.rowid == Book.id).filter(
+        books_fts.c.books_fts.op('MATCH')(match)
+    ).order_by(rank, Book.id)
+
+
+def _search_like(query, search_query):
+    search_term = f"%{search_query}%"
+    return query.filter(
+        or_(
+            Book.title.ilike(search_term),
+            Book.author.ilike(search_term),
+            Book.short_description.ilike(search_term),
+            Book.description.ilike(search_term),
+            Book.isbn_10.ilike(search_term),
+            Book.isbn_13.ilike(search_term)
+        )
+    )
+
+
+def rebuild_search_index():
+    """Create the search index if missing and repopulate it from `books`"""
+    dialect = _dialect()
+    if dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text('REINDEX INDEX ix_books_search_vector'))
+    elif dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text("INSERT INTO books_fts(books_fts) VALUES ('rebuild')"))
+    return dialect
@@ -402,6 +402,7 @@ def create_books_with_categories(books_data, book_categories_map):
             book.categories.extend(categories)
             linked_count += 1
     
+    Category.rebuild_book_counts()
     db.session.commit()
     print(f"Linked {linked_count} books to categories")
 
@@ -0,0 +1,371 @@
+"""Book serializers.
+
+Every field a book endpoint can return is declared once in BOOK_FIELDS,
+together with the columns it is computed from. A BookSerializer is a fixed
+selection of those fields: it knows the exact columns to SELECT
+(`serializer.columns`) and turns each row into a dict with precompiled
+getters. Rows can be plain result tuples from `query.with_entities(...)` or
+Book instances; both expose the columns as attributes.
+
+Named views live in BOOK_VIEWS:
+  card   - featured, bestsellers, search
+  list   - the /api/books listing
+  detail - single book page
+  admin  - detail plus cost and revenue figures
+
+Public list and search endpoints also accept sparse fieldsets through
+`select_fields()`: `fields=` picks the columns (and whether categories are
+embedded), `include=reviews` opts into a capped array of approved reviews.
+"""
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from sqlalchemy import func
+from sqlalchemy.orm import load_only, selectinload, joinedload
+from server.config import db
+from server.models import Book, Category, Review, User, book_categories
+from server.models.book import current_price, discount_percentage, stock_status, in_stock, RATINGS
+
+
+class Field:
+    """One output key, the Book columns it reads and how to compute it from
+    their values (`convert`; None returns a single column's value as is)"""
+
+    __slots__ = ('name', 'columns', 'convert')
+
+    def __init__(self, name, columns, convert=None):
+        self.name = name
+        self.columns = columns
+        self.convert = convert
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def plain(col):
+    return Field(col.key, (col,))
+
+
+def money(col):
+    """Numeric column rendered as a float"""
+    return Field(col.key, (col,), _float)
+
+
+def timestamp(col):
+    return Field(col.key, (col,), _isoformat)
+
+
+def derived(name, columns, func):
+    """Field computed from several columns; `func` gets their values in order"""
+    return Field(name, tuple(columns), func)
+
+
+def _getter(field, get):
+    """Compile `field` over `get`, which returns its column values (a tuple
+    when it reads several columns)"""
+    convert = field.convert
+    if len(field.columns) > 1:
+        return lambda row: convert(*get(row))
+    if convert is None:
+        return get
+    return lambda row: convert(get(row))
+
+
+BOOK_FIELDS = {field.name: field for field in (
+    plain(Book.id),
+    plain(Book.title),
+    plain(Book.author),
+    plain(Book.slug),
+    plain(Book.isbn_10),
+    plain(Book.isbn_13),
+    plain(Book.short_description),
+    plain(Book.description),
+    plain(Book.excerpt),
+    plain(Book.publisher),
+    timestamp(Book.publication_date),
+    plain(Book.edition),
+    plain(Book.language),
+    plain(Book.page_count),
+    plain(Book.format),
+    plain(Book.dimensions),
+    plain(Book.weight_grams),
+    money(Book.list_price),
+    money(Book.sale_price),
+    money(Book.cost_price),
+    plain(Book.sku),
+    plain(Book.stock_quantity),
+    plain(Book.low_stock_threshold),
+    plain(Book.is_available),
+    plain(Book.allow_backorders),
+    plain(Book.max_backorders),
+    plain(Book.average_rating),
+    plain(Book.rating_count),
+    plain(Book.review_count),
+    plain(Book.meta_title),
+    plain(Book.meta_description),
+    plain(Book.keywords),
+    plain(Book.cover_image_url),
+    plain(Book.cover_image_alt),
+    plain(Book.sample_pdf_url),
+    plain(Book.status),
+    plain(Book.is_featured),
+    plain(Book.is_bestseller),
+    plain(Book.is_new_release),
+    plain(Book.total_sold),
+    money(Book.total_revenue),
+    timestamp(Book.created_at),
+    timestamp(Book.updated_at),
+    timestamp(Book.published_at),
+    derived('current_price', (Book.list_price, Book.sale_price),
+            lambda list_price, sale_price: _float(current_price(list_price, sale_price))),
+    derived('discount_percentage', (Book.list_price, Book.sale_price), discount_percentage),
+    derived('stock_status', (Book.stock_quantity, Book.low_stock_threshold), stock_status),
+    derived('is_in_stock', (Book.stock_quantity, Book.allow_backorders, Book.max_backorders), in_stock),
+    derived('rating_distribution',
+            tuple(getattr(Book, f'rating_{rating}_count') for rating in RATINGS),
+            lambda *counts: {rating: count or 0 for rating, count in zip(RATINGS, counts)}),
+)}
+
+
+class BookSerializer:
+    """A fixed selection of BOOK_FIELDS, compiled once.
+
+    Rows from `query()` start with `columns` in order and are read by
+    position; anything else (Book instances, other queries) by attribute.
+    """
+
+    def __init__(self, names):
+        unknown = [name for name in names if name not in BOOK_FIELDS]
+        if unknown:
+            raise KeyError(f'Unknown book fields: {", ".join(unknown)}')
+
+        self.names = tuple(names)
+
+        # Columns to SELECT, de-duplicated, in first-use order
+        columns = {}
+        for name in self.names:
+            for col in BOOK_FIELDS[name].columns:
+                columns.setdefault(col.key, col)
+        self.columns = tuple(columns.values())
+        self._keys = tuple(columns)
+
+        positions = {key: i for i, key in enumerate(self._keys)}
+        fields = [BOOK_FIELDS[name] for name in self.names]
+        self._getters = tuple(
+            (field.name, _getter(field, attrgetter(*(col.key for col in field.columns))))
+            for field in fields
+        )
+        self._row_getters = tuple(
+            (field.name, _getter(field, itemgetter(*(positions[col.key] for col in field.columns))))
+            for field in fields
+        )
+
+    def query(self, query, extra_columns=()):
+        """Restrict a Book query to this view's columns (plus `extra_columns`,
+        e.g. a sort key); rows come back as tuples"""
+        keys = {col.key for col in self.columns}
+        return query.with_entities(
+            *self.columns, *(col for col in extra_columns if col.key not in keys)
+        )
+
+    def load_options(self):
+        """load_only() for when Book instances are needed anyway"""
+        return load_only(*self.columns)
+
+    def _getters_for(self, row):
+        if getattr(row, '_fields', ())[:len(self._keys)] == self._keys:
+            return self._row_getters
+        return self._getters
+
+    def serialize(self, row):
+        return {name: get(row) for name, get in self._getters_for(row)}
+
+    def serialize_many(self, rows):
+        if not rows:
+            return []
+        getters = self._getters_for(rows[0])
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+CARD_FIELDS = (
+    'id', 'title', 'author', 'slug', 'short_description', 'list_price', 'sale_price',
+    'cover_image_url', 'average_rating', 'current_price', 'discount_percentage',
+)
+
+# No `description`/`excerpt`: they are unbounded Text, ask for them with fields=
+LIST_FIELDS = (
+    'id', 'title', 'isbn_10', 'isbn_13', 'author', 'slug', 'format', 'publication_date',
+    'short_description', 'publisher', 'edition', 'language', 'page_count',
+    'dimensions', 'weight_grams', 'list_price', 'sale_price', 'cover_image_url',
+    'cover_image_alt', 'average_rating', 'rating_count', 'review_count', 'is_available',
+    'stock_quantity', 'is_featured', 'is_bestseller', 'is_new_release', 'total_sold',
+    'status', 'created_at', 'discount_percentage', 'current_price', 'stock_status',
+)
+
+DETAIL_FIELDS = (
+    'id', 'title', 'author', 'slug', 'isbn_10', 'isbn_13', 'short_description',
+    'description', 'excerpt', 'publisher', 'publication_date', 'edition', 'language',
+    'page_count', 'format', 'dimensions', 'weight_grams', 'list_price', 'sale_price',
+    'sku', 'stock_quantity', 'low_stock_threshold', 'is_available', 'allow_backorders',
+    'max_backorders', 'average_rating', 'rating_count', 'review_count',
+    'rating_distribution', 'meta_title', 'meta_description', 'keywords',
+    'cover_image_url', 'cover_image_alt', 'sample_pdf_url', 'status', 'is_featured',
+    'is_bestseller', 'is_new_release', 'total_sold', 'created_at', 'updated_at',
+    'published_at', 'discount_percentage', 'current_price', 'stock_status', 'is_in_stock',
+)
+
+ADMIN_FIELDS = DETAIL_FIELDS + ('cost_price', 'total_revenue')
+
+BOOK_VIEWS = {
+    'card': BookSerializer(CARD_FIELDS),
+    'list': BookSerializer(LIST_FIELDS),
+    'detail': BookSerializer(DETAIL_FIELDS),
+    'admin': BookSerializer(ADMIN_FIELDS),
+}
+
+# Fields any client may request with `fields=`; cost and revenue stay admin-only
+PUBLIC_FIELDS = frozenset(BOOK_FIELDS) - {'cost_price', 'total_revenue'}
+
+# Related arrays that can be embedded in listing rows
+BOOK_RELATIONS = ('categories', 'reviews')
+
+REVIEWS_PER_BOOK = 3
+MAX_REVIEWS_PER_BOOK = 10
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+@lru_cache(maxsize=256)
+def _sparse_view(names):
+    return BookSerializer(names)
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()] if value else []
+
+
+def select_fields(fields, include, default_view, default_relations=()):
+    """Resolve `fields=` and `include=` query args to (serializer, relations).
+    
+    Without `fields` the default view and relations are used. `id` is always
+    returned. Raises InvalidFields for names the caller may not ask for.
+    """
+    allowed = PUBLIC_FIELDS | set(default_view.names)
+    
+    if fields:
+        names = _split(fields)
+        unknown = [name for name in names if name not in allowed and name not in BOOK_RELATIONS]
+        if unknown:
+            raise InvalidFields(f'Unknown fields: {", ".join(unknown)}')
+        columns = tuple(dict.fromkeys(['id'] + [name for name in names if name not in BOOK_RELATIONS]))
+        view = _sparse_view(columns)
+        relations = [name for name in BOOK_RELATIONS if name in names]
+    else:
+        view = default_view
+        relations = list(default_relations)
+    
+    for name in _split(include):
+        if name not in BOOK_RELATIONS:
+            raise InvalidFields(f'Unknown include: {name}')
+        if name not in relations:
+            relations.append(name)
+    
+    return view, tuple(relations)
+
+
+# Related data for rows serialized without ORM objects: one IN-query each
+
+def load_categories(book_ids):
+    """book_id -> [{'id', 'name', 'slug'}]"""
+    categories = {book_id: [] for book_id in book_ids}
+    if not book_ids:
+        return categories
+    rows = db.session.query(
+        book_categories.c.book_id, Category.id, Category.name, Category.slug
+    ).join(Category, Category.id == book_categories.c.category_id).filter(
+        book_categories.c.book_id.in_(book_ids)
+    ).order_by(book_categories.c.book_id, Category.id)
+    for book_id, category_id, name, slug in rows:
+        categories[book_id].append({'id': category_id, 'name': name, 'slug': slug})
+    return categories
+
+
+def load_reviews(book_ids, limit=REVIEWS_PER_BOOK):
+    """book_id -> up to `limit` approved reviews, most helpful first:
+    [{'id', 'user', 'content', 'helpful_count', 'rating'}]"""
+    reviews = {book_id: [] for book_id in book_ids}
+    if not book_ids:
+        return reviews
+    position = func.row_number().over(
+        partition_by=Review.book_id,
+        order_by=(Review.helpful_count.desc(), Review.id)
+    ).label('position')
+    ranked = db.session.query(
+        Review.book_id, Review.id, Review.user_id, Review.content,
+        Review.helpful_count, Review.rating, position
+    ).filter(
+        Review.book_id.in_(book_ids), Review.status == 'approved'
+    ).subquery()
+    rows = db.session.query(
+        ranked.c.book_id, ranked.c.id, User.firstName, ranked.c.content,
+        ranked.c.helpful_count, ranked.c.rating
+    ).join(User, User.id == ranked.c.user_id).filter(
+        ranked.c.position <= limit
+    ).order_by(ranked.c.book_id, ranked.c.position)
+    for book_id, review_id, first_name, content, helpful_count, rating in rows:
+        reviews[book_id].append({
+            'id': review_id, 'user': first_name, 'content': content,
+            'helpful_count': helpful_count, 'rating': rating
+        })
+    return reviews
+
+
+def serialize_book_rows(rows, view, relations=(), reviews_limit=REVIEWS_PER_BOOK):
+    """Serialize listing rows and attach the requested relations"""
+    books = view.serialize_many(rows)
+    book_ids = [row.id for row in rows]
+    if 'categories' in relations:
+        by_book = load_categories(book_ids)
+        for book in books:
+            book['categories'] = by_book[book['id']]
+    if 'reviews' in relations:
+        by_book = load_reviews(book_ids, reviews_limit)
+        for book in books:
+            book['reviews'] = by_book[book['id']]
+    return books
+
+
+def book_detail_options(view):
+    return (
+        view.load_options(),
+        joinedload(Book.publisher_rel),
+        selectinload(Book.categories),
+        selectinload(Book.images),
+    )
+
+
+def serialize_book_detail(book, view):
+    """Detail/admin payload: the view's fields plus publisher, categories and images"""
+    data = view.serialize(book)
+    data['publisher_info'] = {
+        'id': book.publisher_rel.id,
+        'name': book.publisher_rel.name,
+        'slug': book.publisher_rel.slug
+    } if book.publisher_rel else None
+    data['categories'] = [{'id': c.id, 'name': c.name, 'slug': c.slug} for c in book.categories]
+    data['images'] = [
+        {
+            'id': img.id,
+            'image_url': img.image_url,
+            'alt_text': img.alt_text,
+            'display_order': img.display_order,
+            'is_main': img.is_main
+        } for img in book.images
+    ]
+    return data
@@ -0,0 +1,118 @@
+"""In-process prefix index for search-as-you-type suggestions.
+
+Keeps a sorted array of (key, book_id, source) tuples over published books
+and answers prefix queries with bisect, without touching the database. Every
+word start of a title or author is a key, so "pot" completes "Harry Potter".
+Admin writes update the index of the worker that served them incrementally;
+other workers pick the change up on their next periodic reload
+(SUGGEST_INDEX_TTL seconds).
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import current_app
+from server.models import Book
+
+DEFAULT_TTL = 300
+
+
+def _normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def _word_suffixes(text):
+    """'harry potter' -> ['harry potter', 'potter']"""
+    words = _normalize(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._keys = []      # sorted [(key, book_id, source)]
+        self._books = {}     # book_id -> ({(key, source)}, suggestion payload)
+        self._lock = threading.Lock()
+        self._loaded_at = None
+
+    def _entries(self, book_id, title, author, slug, isbn_10, isbn_13):
+        keys = set()
+        for source, text in (('title', title), ('author', author)):
+            keys.update((key, source) for key in _word_suffixes(text))
+        for isbn in (isbn_13, isbn_10):
+            if isbn:
+                keys.add((isbn.lower(), 'isbn'))
+        payload = {'id': book_id, 'title': title, 'author': author, 'slug': slug}
+        return keys, payload
+
+    def load(self):
+        """(Re)build the whole index from published, available books"""
+        rows = Book.query.with_entities(
+            Book.id, Book.title, Book.author, Book.slug, Book.isbn_10, Book.isbn_13
+        ).filter(Book.status == 'published', Book.is_available == True).all()
+
+        keys, books = [], {}
+        for row in rows:
+            entries, payload = self._entries(*row)
+            books[row.id] = (entries, payload)
+            keys.extend((key, row.id, source) for key, source in entries)
+        keys.sort()
+
+        with self._lock:
+            self._keys = keys
+            self._books = books
+            self._loaded_at = time.monotonic()
+
+    def clear(self):
+        """Drop the index; the next query rebuilds it"""
+        with self._lock:
+            self._keys, self._books, self._loaded_at = [], {}, None
+
+    def _ensure_loaded(self):
+        ttl = current_app.config.get('SUGGEST_INDEX_TTL', DEFAULT_TTL)
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+            self.load()
+
+    def _remove(self, book_id):
+        entries, _ = self._books.pop(book_id, (set(), None))
+        for key, source in entries:
+            i = bisect_left(self._keys, (key, book_id, source))
+            if i < len(self._keys) and self._keys[i] == (key, book_id, source):
+                del self._keys[i]
+
+    def refresh_book(self, book):
+        """Re-index a single book after its title, author, ISBN or status changed"""
+        if self._loaded_at is None:
+            return  # Not built yet in this worker; first query loads everything
+        with self._lock:
+            self._remove(book.id)
+            if book.status == 'published' and book.is_available:
+                entries, payload = self._entries(
+                    book.id, book.title, book.author, book.slug, book.isbn_10, book.isbn_13
+                )
+                self._books[book.id] = (entries, payload)
+                for key, source in entries:
+                    insort(self._keys, (key, book.id, source))
+
+    def suggest(self, prefix, limit=10):
+        """Return up to `limit` distinct books with a key starting with `prefix`"""
+        compact = prefix.replace('-', '').replace(' ', '')
+        prefix = compact.lower() if compact[:-1].isdigit() else _normalize(prefix)
+        if not prefix:
+            return []
+        self._ensure_loaded()
+
+        results, seen = [], set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, book_id, source = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if book_id not in seen:
+                    seen.add(book_id)
+                    results.append(dict(self._books[book_id][1], match=source))
+                i += 1
+        return results
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,19 @@
+"""Wishlist price tracking, kept current in the background.
+
+WishlistItem.refresh_price_info() brings every item whose book's price
+changed up to date (current and lowest price, price-drop alert) with one
+UPDATE ... FROM books. The `wishlist.refresh_prices` job runs it every
+WISHLIST_REFRESH_INTERVAL seconds (default 900); `flask
+refresh-wishlist-prices` runs it on demand.
+"""
+from flask import current_app
+from server.jobs import handler
+from server.models import WishlistItem
+
+DEFAULT_REFRESH_INTERVAL = 900
+
+
+@handler('wishlist.refresh_prices', every=lambda: current_app.config.get(
+    'WISHLIST_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL))
+def refresh_prices_job(payload):
+    WishlistItem.refresh_price_info()
@@ -0,0 +1,151 @@
+"""Test fixtures: the app on a throwaway SQLite file, rebuilt per test.
+
+The app reads its config from FLASK_-prefixed environment variables when
+server.app is imported, so they are set here first. A file (not :memory:)
+database lets threaded tests share it across connections.
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+_DB_DIR = tempfile.mkdtemp(prefix='bookstore-tests-')
+os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(_DB_DIR, "test.db")}'
+os.environ['FLASK_SQLALCHEMY_ENGINE_OPTIONS'] = json.dumps({
+    'pool_size': 64, 'connect_args': {'timeout': 60, 'check_same_thread': False}
+})
+os.environ['FLASK_JWT_SECRET_KEY'] = 'test-secret-key-with-enough-length-for-hs256'
+os.environ['FLASK_JWT_TOKEN_LOCATION'] = '["headers"]'
+
+import pytest
+from sqlalchemy import event
+
+from server.app import app as flask_app
+from server.auth import token_for, role_cache
+from server.cache import response_cache
+from server.carts import cart_store
+from server.config import db
+from server.models import Book, Category, Publisher, Review, User
+from server.suggest import suggest_index
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        if response_cache.enabled:
+            response_cache.backend.clear()
+        role_cache.clear()
+        suggest_index.clear()
+        yield flask_app
+        db.session.remove()
+        cart_store.init_app(flask_app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class QueryCounter:
+    """Statements sent to the database (every connection of the engine)"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def count_queries(app):
+    """count_queries() is a context manager yielding a QueryCounter"""
+    @contextmanager
+    def counting():
+        counter = QueryCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter._record)
+        try:
+            yield counter
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', counter._record)
+    return counting
+
+
+def make_user(email, role='customer', **fields):
+    user = User(firstName='Test', secondName='User', email=email, role=role, **fields)
+    user._password_hash = 'x'
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def auth(user):
+    return {'Authorization': f'Bearer {token_for(user)}'}
+
+
+@pytest.fixture
+def customer(app):
+    user = make_user('customer@example.com', phone='0712000000')
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def admin(app):
+    user = make_user('admin@example.com', role='admin')
+    db.session.commit()
+    return user
+
+
+def isbn13(n):
+    base = f'978{n:09d}'
+    total = sum(int(digit) * weight for digit, weight in zip(base, [1, 3] * 6))
+    return base + str((10 - total % 10) % 10)
+
+
+@pytest.fixture
+def make_books(app):
+    """make_books(n, reviews=0, **fields) adds n published books, each in one
+    of three categories with `reviews` approved reviews; returns their ids"""
+    def make(count, reviews=0, **fields):
+        publisher = Publisher.query.first() or Publisher(name='Publisher', slug='publisher')
+        db.session.add(publisher)
+        categories = Category.query.all() or [
+            Category(name=f'Category {i}', slug=f'category-{i}') for i in range(3)
+        ]
+        db.session.add_all(categories)
+        reviewer = User.query.filter_by(email='reviewer@example.com').first() or make_user('reviewer@example.com')
+        db.session.flush()
+
+        start = Book.query.count()
+        ids = []
+        for i in range(start, start + count):
+            values = dict(
+                title=f'Book {i}', author=f'Author {i % 5}', slug=f'book-{i}', isbn_13=isbn13(i),
+                short_description='Short', description='Long description', publisher='Publisher',
+                publisher_id=publisher.id, publication_date=datetime(2020, 1, 1), page_count=100,
+                list_price=Decimal('10.00') + i, sale_price=Decimal('8.00') if i % 2 else None,
+                sku=f'SKU{i}', stock_quantity=5, status='published',
+                created_at=datetime(2021, 1, 1) + timedelta(minutes=i),
+            )
+            values.update(fields)
+            book = Book(**values)
+            book.categories = [categories[i % 3]]
+            db.session.add(book)
+            db.session.flush()
+            for r in range(reviews):
+                db.session.add(Review(
+                    book_id=book.id, user_id=reviewer.id, rating=r % 5 + 1, content='A good read overall',
+                    status='approved', created_at=datetime(2021, 1, 1) + timedelta(minutes=i, seconds=r)
+                ))
+            ids.append(book.id)
+        db.session.commit()
+        return ids
+    return make
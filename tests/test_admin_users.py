@@ -0,0 +1,24 @@
+"""The admin user list reports order totals without writing"""
+from conftest import auth
+from server.config import db
+from server.models import CustomerStats
+from test_checkout import checkout, fill_cart
+
+
+def test_missing_customer_totals_are_computed_read_only(client, customer, admin, make_books, count_queries):
+    book_ids = make_books(2)
+    headers = auth(customer)
+    fill_cart(client, headers, book_ids)
+    total = checkout(client, headers).get_json()['order']['total_amount']
+    CustomerStats.query.delete()
+    db.session.commit()
+
+    with count_queries() as queries:
+        response = client.get('/api/admin/users', headers=auth(admin))
+
+    assert response.status_code == 200, response.get_json()
+    listed = {user['id']: user for user in response.get_json()['users']}
+    assert (listed[customer.id]['order_count'], listed[customer.id]['totalSpent']) == (1, total)
+    assert listed[admin.id]['order_count'] == 0
+    assert [s for s in queries.statements if not s.lstrip().upper().startswith(('SELECT', 'WITH'))] == []
+    assert CustomerStats.query.count() == 0
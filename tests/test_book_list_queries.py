@@ -0,0 +1,16 @@
+"""GET /api/books issues a fixed number of queries whatever the page size"""
+
+
+def test_book_page_query_count_is_constant(client, make_books, count_queries):
+    make_books(30, reviews=3)
+
+    counts = {}
+    for per_page in (5, 20):
+        with count_queries() as queries:
+            response = client.get(f'/api/books?per_page={per_page}&include=reviews')
+        assert response.status_code == 200
+        assert len(response.get_json()['books']) == per_page
+        counts[per_page] = queries.count
+
+    assert counts[5] == counts[20]
+    assert counts[20] <= 4
@@ -0,0 +1,59 @@
+"""Book payloads for each named view and for sparse fieldsets"""
+from conftest import auth
+from server.config import db
+from server.models import Book
+from server.serializers import BOOK_VIEWS, CARD_FIELDS, LIST_FIELDS, DETAIL_FIELDS, ADMIN_FIELDS
+
+DETAIL_RELATIONS = {'publisher_info', 'categories', 'images'}
+
+
+def test_each_view_returns_exactly_its_fields(client, admin, make_books):
+    book_id, = make_books(1, is_featured=True, cost_price=4, total_revenue=100)
+
+    listed, = client.get('/api/books').get_json()['books']
+    assert set(listed) == set(LIST_FIELDS) | {'categories'}
+    card, = client.get('/api/books/featured').get_json()['books']
+    assert set(card) == set(CARD_FIELDS)
+    found, = client.get('/api/books/search?q=book').get_json()['books']
+    assert set(found) == set(CARD_FIELDS)
+
+    detail = client.get(f'/api/books/{book_id}').get_json()
+    assert set(detail) == set(DETAIL_FIELDS) | DETAIL_RELATIONS
+    assert 'cost_price' not in detail and 'total_revenue' not in detail
+
+    admin_detail = client.get(f'/api/admin/books/{book_id}', headers=auth(admin)).get_json()
+    assert set(admin_detail) == set(ADMIN_FIELDS) | DETAIL_RELATIONS
+    assert (admin_detail['cost_price'], admin_detail['total_revenue']) == (4.0, 100.0)
+    admin_listed, = client.get('/api/admin/books', headers=auth(admin)).get_json()['books']
+    assert admin_listed['cost_price'] == 4.0
+
+
+def test_derived_fields(client, make_books):
+    book_id, = make_books(1, list_price=20, sale_price=15, stock_quantity=3, low_stock_threshold=5)
+
+    detail = client.get(f'/api/books/{book_id}').get_json()
+
+    assert (detail['list_price'], detail['sale_price'], detail['current_price']) == (20.0, 15.0, 15.0)
+    assert detail['discount_percentage'] == 25
+    assert (detail['stock_status'], detail['is_in_stock']) == ('Only 3 left', True)
+    assert detail['rating_distribution'] == {str(rating): 0 for rating in range(1, 6)}
+    assert detail['publication_date'].startswith('2020-01-01')
+
+
+def test_sparse_fieldsets_keep_cost_figures_admin_only(client, make_books):
+    make_books(1)
+
+    book, = client.get('/api/books?fields=title,categories').get_json()['books']
+    assert set(book) == {'id', 'title', 'categories'}
+    assert client.get('/api/books?fields=title,cost_price').status_code == 400
+    assert client.get('/api/books/search?q=book&fields=total_revenue').status_code == 400
+    assert client.get('/api/books?include=votes').status_code == 400
+
+
+def test_rows_and_instances_serialize_alike(app, make_books):
+    make_books(3, reviews=2)
+    for view in BOOK_VIEWS.values():
+        rows = view.query(Book.query.order_by(Book.id)).all()
+        books = Book.query.order_by(Book.id).all()
+        assert view.serialize_many(rows) == [view.serialize(book) for book in books]
+    db.session.rollback()
@@ -0,0 +1,108 @@
+"""Cart-mutation load test.
+
+Threads of customers add, update and remove cart lines at random, then
+everyone checks out. Runs against each cart store backend and reports
+throughput (run with -s to see it). Every cart view must match the stock
+its cart holds, and every order must contain exactly what its cart showed.
+"""
+import random
+import statistics
+import threading
+import time
+import pytest
+from sqlalchemy import event, func
+from conftest import auth, make_user
+from server.carts import cart_store
+from server.config import db
+from server.models import Book, Cart, StockReservation
+
+CUSTOMERS = 16
+THREADS = 4
+REQUESTS_PER_THREAD = 60
+BOOKS = 40
+ADDRESS = {
+    'fullName': 'Test User', 'address': '1 Test Road', 'street': 'Test Street',
+    'city': 'Nairobi', 'phone': '0712000000', 'email': 'customer@example.com',
+}
+
+
+@pytest.mark.parametrize('backend', ['null', 'memory'])
+def test_cart_mutation_load(app, make_books, backend, monkeypatch, record_property):
+    monkeypatch.setitem(app.config, 'CART_STORE_BACKEND', backend)
+    monkeypatch.setitem(app.config, 'CART_FLUSH_INTERVAL', 0.5)
+    cart_store.init_app(app)
+
+    book_ids = make_books(BOOKS, stock_quantity=100000)
+    users = [make_user(f'shopper{i}@example.com') for i in range(CUSTOMERS)]
+    db.session.commit()
+    headers = {user.id: auth(user) for user in users}
+    user_ids = list(headers)
+
+    queries = []
+    count = lambda *args: queries.append(1)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    errors, latencies = [], []
+
+    def shop(mine):
+        rnd = random.Random(mine[0])
+        client = app.test_client()
+        for n in range(REQUESTS_PER_THREAD):
+            h = headers[rnd.choice(mine)]
+            started = time.perf_counter()
+            items = client.get('/api/cart', headers=h).get_json()['items'] if n % 5 == 0 else None
+            choice = rnd.random()
+            if items and choice < 0.45:
+                item = rnd.choice(items)
+                response = client.put(f"/api/cart/items/{item['id']}", json={'quantity': rnd.randint(1, 5)}, headers=h)
+            elif items and choice < 0.55:
+                item = rnd.choice(items)
+                response = client.delete(f"/api/cart/items/{item['id']}", headers=h)
+            else:
+                response = client.post('/api/cart/items', json={'bookId': rnd.choice(book_ids), 'quantity': 1},
+                                       headers=h)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 300:
+                errors.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=shop, args=(user_ids[i::THREADS],)) for i in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+    total = THREADS * REQUESTS_PER_THREAD
+    record_property('requests_per_second', round(total / elapsed))
+    print(f'\n{backend}: {total} requests in {elapsed:.2f}s = {total / elapsed:.0f} req/s, '
+          f'p50 {statistics.median(latencies) * 1e3:.2f} ms, {len(queries) / total:.1f} queries/request')
+    assert errors == []
+
+    client = app.test_client()
+    for user_id in user_ids:
+        h = headers[user_id]
+        view = {item['book_id']: item['quantity'] for item in client.get('/api/cart', headers=h).get_json()['items']}
+        db.session.expire_all()
+        cart = Cart.active_for(user_id)
+        held = dict(db.session.execute(
+            db.select(StockReservation.book_id, func.sum(StockReservation.quantity))
+            .where(StockReservation.cart_id == cart.id, StockReservation.status == 'active')
+            .group_by(StockReservation.book_id)
+        ).all()) if cart else {}
+        assert view == held
+
+        if view:
+            response = client.post('/api/orders', json={'shipping_address': ADDRESS, 'payment_method': 'cash'},
+                                   headers=h)
+            assert response.status_code == 201, response.get_json()
+            ordered = {item['book_id']: item['quantity'] for item in response.get_json()['order']['items']}
+            assert ordered == view
+        db.session.rollback()
+
+    if cart_store.enabled:
+        assert cart_store.backend.pending_stats()[0] == 0
+    db.session.expire_all()
+    assert sum(book.stock_quantity for book in Book.query) + db.session.query(
+        func.coalesce(func.sum(StockReservation.quantity), 0)
+    ).filter(StockReservation.status.in_(('active', 'committed'))).scalar() == BOOKS * 100000
@@ -0,0 +1,38 @@
+"""GET /api/cart runs the same queries whatever the cart's size"""
+import pytest
+from conftest import auth, make_user
+from server.carts import cart_store
+from server.config import db
+from server.models import Cart, CartItem
+
+
+def make_cart(user, book_ids):
+    cart = Cart(user_id=user.id)
+    db.session.add(cart)
+    db.session.flush()
+    db.session.add_all(CartItem(cart_id=cart.id, book_id=book_id, quantity=1) for book_id in book_ids)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('backend', ['null', 'memory'])
+@pytest.mark.parametrize('lines', [1, 10, 50, 200])
+def test_cart_view_query_count_does_not_grow_with_the_cart(app, client, make_books, count_queries,
+                                                          monkeypatch, backend, lines):
+    monkeypatch.setitem(app.config, 'CART_STORE_BACKEND', backend)
+    cart_store.init_app(app)
+    book_ids = make_books(lines)
+    small, large = make_user('small@example.com'), make_user('large@example.com')
+    make_cart(small, book_ids[:1])
+    make_cart(large, book_ids)
+
+    counts = {}
+    for user in (small, large):
+        for visit in ('first', 'again'):  # The memory backend loads the cart, then serves it cached
+            with count_queries() as queries:
+                response = client.get('/api/cart', headers=auth(user))
+            assert response.status_code == 200
+            counts[user.email, visit] = queries.count
+        assert response.get_json()['item_count'] == (1 if user is small else lines)
+
+    assert counts['small@example.com', 'first'] == counts['large@example.com', 'first'] <= 3
+    assert counts['small@example.com', 'again'] == counts['large@example.com', 'again']
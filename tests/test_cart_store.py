@@ -0,0 +1,50 @@
+"""Cart store write-behind"""
+import threading
+from conftest import auth
+from server.carts import cart_store
+from server.config import db
+from server.models import CartItem
+import server.carts
+
+
+def test_overlapping_flushes_never_commit_an_older_quantity(app, client, customer, make_books, monkeypatch):
+    monkeypatch.setitem(app.config, 'CART_STORE_BACKEND', 'memory')
+    monkeypatch.setitem(app.config, 'CART_FLUSH_INTERVAL', 3600)
+    cart_store.init_app(app)
+    book_id, = make_books(1, stock_quantity=10)
+    headers = auth(customer)
+    item_id = client.post('/api/cart/items', json={'bookId': book_id, 'quantity': 1}, headers=headers).get_json()['cart_item_id']
+    assert client.put(f'/api/cart/items/{item_id}', json={'quantity': 2}, headers=headers).status_code == 200
+
+    # Flush A reads quantity 2, then stalls before writing it
+    peeked, resume = threading.Event(), threading.Event()
+    write_changes = server.carts.write_changes
+
+    def stalled(changes):
+        if not peeked.is_set():
+            peeked.set()
+            resume.wait(10)
+        write_changes(changes)
+
+    def flush_a():
+        with app.app_context():
+            cart_store.flush()
+
+    monkeypatch.setattr(server.carts, 'write_changes', stalled)
+    first = threading.Thread(target=flush_a)
+    first.start()
+    assert peeked.wait(10)
+
+    # The customer sets 3 meanwhile; a request's flush must not overtake A
+    assert client.put(f'/api/cart/items/{item_id}', json={'quantity': 3}, headers=headers).status_code == 200
+    assert cart_store.flush(wait=False) == 0
+
+    resume.set()
+    first.join(10)
+    assert cart_store.backend.pending_stats()[0] == 1  # A wrote 2; the 3 is still queued
+    assert cart_store.flush() == 1
+
+    db.session.expire_all()
+    assert db.session.get(CartItem, item_id).quantity == 3
+    assert cart_store.backend.pending_stats()[0] == 0
+    assert client.get('/api/cart', headers=headers).get_json()['items'][0]['quantity'] == 3
@@ -0,0 +1,55 @@
+"""Cart sweep and the one-active-cart-per-user index"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+from conftest import auth, make_user
+from test_checkout import checkout, fill_cart
+from server.carts import sweep_carts
+from server.config import db
+from server.models import Book, Cart, CartItem, StockReservation
+
+
+def age(cart_id, days, lines=True):
+    then = datetime.utcnow() - timedelta(days=days)
+    Cart.query.filter_by(id=cart_id).update({'created_at': then, 'updated_at': then})
+    if lines:
+        CartItem.query.filter_by(cart_id=cart_id).update({'created_at': then, 'updated_at': then})
+    db.session.commit()
+
+
+def test_sweep_deletes_checked_out_and_abandoned_carts(app, client, customer, make_books, monkeypatch):
+    monkeypatch.setitem(app.config, 'CART_ABANDON_DAYS', 30)
+    book_id, = make_books(1, stock_quantity=10)
+    users = [customer] + [make_user(f'shopper{n}@example.com') for n in range(2)]
+    db.session.commit()
+    for user in users:
+        fill_cart(client, auth(user), [book_id], quantity=2)
+    _, abandoned, kept = (Cart.active_for(user.id).id for user in users)
+
+    assert checkout(client, auth(customer)).status_code == 201
+    age(abandoned, 31)
+    age(kept, 31, lines=False)  # An old cart whose lines changed recently
+    assert db.session.get(Book, book_id).stock_quantity == 4
+
+    assert sweep_carts() == (2, 1)  # Checkout already emptied its cart
+
+    assert [cart.id for cart in Cart.query] == [kept]
+    assert db.session.get(Book, book_id).stock_quantity == 6  # The abandoned cart's hold is back
+    held = StockReservation.query.filter_by(status='active').one()
+    assert (held.cart_id, held.quantity) == (kept, 2)
+    assert StockReservation.query.filter_by(status='released').one().cart_id is None
+    assert StockReservation.query.filter_by(status='committed').one().order_id is not None
+    assert client.get('/api/cart', headers=auth(users[1])).get_json()['items'] == []
+
+
+def test_a_user_has_at_most_one_active_cart(customer):
+    db.session.add_all([Cart(user_id=customer.id), Cart(user_id=customer.id, is_active=False)])
+    db.session.commit()
+
+    db.session.add(Cart(user_id=customer.id, is_active=False))
+    db.session.commit()
+    db.session.add(Cart(user_id=customer.id))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    assert Cart.query.filter_by(user_id=customer.id, is_active=True).count() == 1
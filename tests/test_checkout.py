@@ -0,0 +1,58 @@
+"""Checkout is one transaction with a fixed number of round-trips"""
+from conftest import auth
+from server.config import db
+from server.models import Book, Cart, CartItem, Order
+
+ADDRESS = {
+    'fullName': 'Test User', 'address': '1 Test Road', 'street': 'Test Street',
+    'city': 'Nairobi', 'phone': '0712000000', 'email': 'customer@example.com',
+}
+
+
+def checkout(client, headers, **body):
+    return client.post('/api/orders', json={'shipping_address': ADDRESS, 'payment_method': 'cash', **body},
+                       headers=headers)
+
+
+def fill_cart(client, headers, book_ids, quantity=1):
+    for book_id in book_ids:
+        response = client.post('/api/cart/items', json={'bookId': book_id, 'quantity': quantity}, headers=headers)
+        assert response.status_code == 201, response.get_json()
+
+
+def test_checkout_query_count_does_not_grow_with_the_cart(client, customer, make_books, count_queries):
+    book_ids = make_books(20, stock_quantity=100)
+    headers = auth(customer)
+
+    # The first order also allocates a block of order numbers
+    fill_cart(client, headers, book_ids[:1])
+    assert checkout(client, headers).status_code == 201
+
+    counts = {}
+    for size in (2, 20):
+        fill_cart(client, headers, book_ids[:size])
+        with count_queries() as queries:
+            response = checkout(client, headers)
+        assert response.status_code == 201, response.get_json()
+        assert response.get_json()['order']['item_count'] == size
+        counts[size] = queries.count
+
+    assert counts[2] == counts[20]
+    assert counts[20] <= 16
+
+
+def test_checkout_is_all_or_nothing(client, customer, make_books):
+    book_ids = make_books(3, stock_quantity=100)
+    headers = auth(customer)
+    fill_cart(client, headers, book_ids)
+
+    # Someone else takes the stock of the last book out from under the cart
+    Book.query.filter_by(id=book_ids[-1]).update({'stock_quantity': 0, 'is_available': False})
+    db.session.commit()
+
+    response = checkout(client, headers)
+    assert response.status_code == 400
+    db.session.expire_all()
+    assert Order.query.count() == 0
+    assert CartItem.query.join(Cart).filter(Cart.user_id == customer.id).count() == 3
+    assert [book.stock_quantity for book in Book.query.filter(Book.id.in_(book_ids[:2]))] == [99, 99]
@@ -0,0 +1,69 @@
+"""Idempotency-Key replays, abandoned claims and the purge job"""
+from datetime import datetime, timedelta
+from conftest import auth
+from server.config import db
+from server.jobs import Worker, schedule_recurring
+from server.models import IdempotencyKey, Job, Order
+from test_checkout import checkout, fill_cart
+import server.idempotency
+
+
+def keyed(customer, key='key-1'):
+    return {**auth(customer), 'Idempotency-Key': key}
+
+
+def test_retry_replays_the_first_response(client, customer, make_books):
+    fill_cart(client, auth(customer), make_books(1))
+
+    first = checkout(client, keyed(customer))
+    again = checkout(client, keyed(customer))
+
+    assert first.status_code == again.status_code == 201
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert again.get_json() == first.get_json()
+    assert Order.query.count() == 1
+    assert checkout(client, keyed(customer), notes='Different body').status_code == 422
+
+
+def test_claim_of_a_dead_worker_is_taken_over(app, client, customer, make_books, monkeypatch):
+    monkeypatch.setitem(app.config, 'IDEMPOTENCY_WAIT_SECONDS', 0.2)
+    fill_cart(client, auth(customer), make_books(1))
+    # The worker dies after the handler commits, before recording the result
+    with monkeypatch.context() as dying:
+        dying.setattr(server.idempotency, '_complete', lambda *args: None)
+        assert checkout(client, keyed(customer)).status_code == 201
+    claim = IdempotencyKey.query.one()
+    assert claim.status == 'processing'
+
+    # Within the claim timeout a retry waits for it, then gives up
+    assert checkout(client, keyed(customer)).status_code == 409
+
+    claim.created_at = datetime.utcnow() - timedelta(seconds=server.idempotency.DEFAULT_CLAIM_TIMEOUT + 1)
+    db.session.commit()
+    assert checkout(client, keyed(customer), notes='Different body').status_code == 422
+
+    retried = checkout(client, keyed(customer))
+    assert retried.status_code == 400  # The handler ran again; the cart is already ordered
+    assert 'Idempotent-Replayed' not in retried.headers
+    db.session.expire_all()
+    assert IdempotencyKey.query.one().status == 'completed'
+    assert checkout(client, keyed(customer)).headers['Idempotent-Replayed'] == 'true'
+
+
+def test_expired_keys_are_purged_by_a_recurring_job(app, customer):
+    now = datetime.utcnow()
+    db.session.add_all(
+        IdempotencyKey(user_id=customer.id, key=f'key-{i}', request_hash='x', status='completed',
+                       response_code=201, created_at=now, expires_at=now + timedelta(seconds=seconds))
+        for i, seconds in enumerate((-10, -1, 3600))
+    )
+    db.session.commit()
+
+    schedule_recurring()
+    Job.query.filter_by(kind='idempotency.purge_expired').update({'run_at': now - timedelta(seconds=1)})
+    db.session.commit()
+
+    assert Worker(app).run_once('test-worker') == 1
+    assert [key.key for key in IdempotencyKey.query] == ['key-2']
+    statuses = sorted(job.status for job in Job.query.filter_by(kind='idempotency.purge_expired'))
+    assert statuses == ['done', 'queued']
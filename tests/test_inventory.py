@@ -0,0 +1,76 @@
+"""Stock reservations: holds, backorders and releases"""
+from datetime import datetime, timedelta
+from conftest import auth, make_user
+from server.config import db
+from server.jobs import Worker, schedule_recurring
+from server.models import Book, Job, StockReservation
+
+
+def stock_of(book_id):
+    db.session.expire_all()
+    book = db.session.get(Book, book_id)
+    return book.stock_quantity, book.backordered_quantity
+
+
+def add_to_cart(client, user, book_id, quantity):
+    return client.post('/api/cart/items', json={'bookId': book_id, 'quantity': quantity}, headers=auth(user))
+
+
+def test_returned_stock_fills_backorders_first(client, customer, make_books):
+    [book_id] = make_books(1, stock_quantity=1, allow_backorders=True, max_backorders=5)
+    other = make_user('other@example.com')
+    db.session.commit()
+
+    assert add_to_cart(client, customer, book_id, 1).status_code == 201
+    assert add_to_cart(client, other, book_id, 2).status_code == 201
+    assert stock_of(book_id) == (0, 2)
+
+    # The customer's copy goes to the backorder, not back on the shelf
+    assert client.delete('/api/cart', headers=auth(customer)).status_code == 200
+    assert stock_of(book_id) == (0, 1)
+
+
+def test_short_stock_is_split_between_stock_and_backorder(client, customer, make_books):
+    [book_id] = make_books(1, stock_quantity=3, allow_backorders=True, max_backorders=5)
+
+    assert add_to_cart(client, customer, book_id, 5).status_code == 201
+    assert stock_of(book_id) == (0, 2)
+    parts = sorted(
+        (r.source, r.quantity) for r in StockReservation.query.filter_by(book_id=book_id, status='active')
+    )
+    assert parts == [('backorder', 2), ('stock', 3)]
+
+    assert client.delete('/api/cart', headers=auth(customer)).status_code == 200
+    assert stock_of(book_id) == (3, 0)
+
+
+def test_short_stock_without_backorders_takes_nothing(client, customer, make_books):
+    [book_id] = make_books(1, stock_quantity=3)
+
+    assert add_to_cart(client, customer, book_id, 5).status_code == 400
+    assert stock_of(book_id) == (3, 0)
+    assert StockReservation.query.count() == 0
+
+
+def test_expired_holds_are_released_by_a_recurring_job(app, client, customer, make_books):
+    [book_id] = make_books(1, stock_quantity=5)
+    assert add_to_cart(client, customer, book_id, 2).status_code == 201
+    assert stock_of(book_id) == (3, 0)
+
+    schedule_recurring()
+    schedule_recurring()
+    [job] = Job.query.filter_by(kind='inventory.release_expired').all()
+    assert job.run_at > datetime.utcnow()
+
+    # The hold expires and the job comes due
+    past = datetime.utcnow() - timedelta(seconds=1)
+    StockReservation.query.update({'expires_at': past})
+    Job.query.filter_by(kind='inventory.release_expired').update({'run_at': past})
+    db.session.commit()
+
+    assert Worker(app).run_once('test-worker') == 1
+    assert stock_of(book_id) == (5, 0)
+    assert StockReservation.query.one().status == 'released'
+    # ...and queues its next run
+    statuses = sorted(job.status for job in Job.query.filter_by(kind='inventory.release_expired'))
+    assert statuses == ['done', 'queued']
@@ -0,0 +1,85 @@
+"""Flash sale: many customers race for too few copies. Nothing may be oversold."""
+import threading
+import time
+from sqlalchemy import func
+from conftest import auth, make_user
+from server.config import db
+from server.models import Book, OrderItem, StockReservation
+
+CUSTOMERS = 40
+STOCK = 25
+BACKORDER_STOCK, MAX_BACKORDERS = 10, 5
+ADDRESS = {
+    'fullName': 'Test User', 'address': '1 Test Road', 'street': 'Test Street',
+    'city': 'Nairobi', 'phone': '0712000000', 'email': 'customer@example.com',
+}
+
+
+def book_state(book_id):
+    """(stock, backordered, sold, held by carts and orders)"""
+    db.session.expire_all()
+    book = db.session.get(Book, book_id)
+    sold = db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter(
+        OrderItem.book_id == book_id).scalar()
+    held = db.session.query(func.coalesce(func.sum(StockReservation.quantity), 0)).filter(
+        StockReservation.book_id == book_id, StockReservation.status.in_(('active', 'committed'))).scalar()
+    return book.stock_quantity, book.backordered_quantity, sold, held
+
+
+def test_concurrent_checkouts_never_oversell(app, make_books, record_property):
+    hot_id, = make_books(1, stock_quantity=STOCK)
+    backorder_id, = make_books(1, stock_quantity=BACKORDER_STOCK, allow_backorders=True,
+                               max_backorders=MAX_BACKORDERS)
+    headers = [auth(make_user(f'buyer{i}@example.com')) for i in range(CUSTOMERS)]
+    db.session.commit()
+
+    outcomes = {'added': 0, 'ordered': 0, 'errors': []}
+    lock = threading.Lock()
+    barrier = threading.Barrier(CUSTOMERS)
+
+    def shop(h):
+        client = app.test_client()
+        barrier.wait()
+        added = False
+        for book_id in (hot_id, backorder_id):
+            response = client.post('/api/cart/items', json={'bookId': book_id, 'quantity': 2}, headers=h)
+            with lock:
+                if response.status_code == 201:
+                    outcomes['added'] += 1
+                    added = True
+                elif response.status_code != 400:
+                    outcomes['errors'].append(('add', response.status_code, response.get_json()))
+        if not added:
+            return
+        response = client.post('/api/orders', json={'shipping_address': ADDRESS, 'payment_method': 'cash'},
+                               headers=h)
+        with lock:
+            if response.status_code == 201:
+                outcomes['ordered'] += 1
+            elif response.status_code != 400:
+                outcomes['errors'].append(('order', response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=shop, args=(h,)) for h in headers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    rate = outcomes['ordered'] / elapsed
+    record_property('checkouts_per_second', round(rate, 1))
+    print(f"\n{outcomes['ordered']} checkouts of {CUSTOMERS} customers in {elapsed:.2f}s ({rate:.1f}/s)")
+
+    assert outcomes['errors'] == []
+    assert outcomes['ordered'] > 0
+
+    stock, backordered, sold, held = book_state(hot_id)
+    assert stock >= 0 and backordered == 0
+    assert sold <= STOCK
+    assert stock + held == STOCK
+
+    stock, backordered, sold, held = book_state(backorder_id)
+    assert stock >= 0 and backordered <= MAX_BACKORDERS
+    assert sold <= BACKORDER_STOCK + MAX_BACKORDERS
+    assert stock + held == BACKORDER_STOCK + backordered
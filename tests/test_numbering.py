@@ -0,0 +1,45 @@
+"""Order and payment numbers stay unique under concurrent workers"""
+import re
+import threading
+from server import numbering
+from server.numbering import HiLoCounter, format_number
+
+WORKERS = 4  # Separate counters, as separate processes would have
+THREADS = 4
+PER_THREAD = 250
+
+
+def test_numbers_are_unique_across_workers_and_threads(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'NUMBER_BLOCK_SIZE', 10)
+    counters = [HiLoCounter('order') for _ in range(WORKERS)]
+    issued = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(WORKERS * THREADS)
+
+    def draw(counter):
+        with app.app_context():
+            barrier.wait()
+            mine = [counter.next() for _ in range(PER_THREAD)]
+        with lock:
+            issued.extend(mine)
+
+    threads = [threading.Thread(target=draw, args=(counter,)) for counter in counters for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(issued) == WORKERS * THREADS * PER_THREAD
+    assert len(set(issued)) == len(issued)
+    # Blocks are handed out without overlap, so the serials are dense
+    assert max(issued) == len(issued)
+
+
+def test_number_format(app, monkeypatch):
+    monkeypatch.setattr(numbering, 'order_numbers', HiLoCounter('order'))
+    monkeypatch.setattr(numbering, 'payment_numbers', HiLoCounter('payment'))
+
+    assert re.fullmatch(r'ORD-\d{8}-000001', numbering.next_order_number())
+    assert re.fullmatch(r'ORD-\d{8}-000002', numbering.next_order_number())
+    assert re.fullmatch(r'PAY-\d{8}-000001', numbering.next_payment_number())
+    assert format_number('ORD', 1234567).endswith('-1234567')
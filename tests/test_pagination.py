@@ -0,0 +1,40 @@
+"""Keyset pagination: page size bounds and NULL sort values"""
+import pytest
+from conftest import auth
+from server.config import db
+from server.models import Book
+from server.pagination import MAX_PER_PAGE
+
+
+@pytest.mark.parametrize('per_page, served', [(0, 1), (-5, 1), (1000, MAX_PER_PAGE)])
+@pytest.mark.parametrize('mode', ['cursor=', 'page=1'])
+def test_per_page_is_clamped(client, admin, per_page, served, mode):
+    response = client.get(f'/api/admin/users?{mode}&per_page={per_page}', headers=auth(admin))
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['pagination']['per_page'] == served
+    assert len(response.get_json()['users']) == 1
+
+
+def walk(client, path):
+    """Ids from every page of a cursor walk over `path`"""
+    ids, cursor = [], ''
+    while cursor is not None:
+        page = client.get(f'{path}&cursor={cursor}').get_json()
+        ids.extend(book['id'] for book in page['books'])
+        cursor = page['pagination']['next_cursor']
+    return ids
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_walk_covers_rows_with_a_null_sort_value(client, make_books, order):
+    book_ids = make_books(9)
+    for book_id, rating in zip(book_ids, [None, 4.5, None, 3.0, 4.5, None, 1.0, None, 3.0]):
+        db.session.get(Book, book_id).average_rating = rating
+    db.session.commit()
+
+    listed = [book['id'] for book in client.get(f'/api/books?sort=rating&order={order}&per_page=20').get_json()['books']]
+    walked = walk(client, f'/api/books?sort=rating&order={order}&per_page=2')
+
+    assert sorted(listed) == sorted(book_ids)
+    assert walked == listed
@@ -0,0 +1,143 @@
+"""M-Pesa checkouts end to end against the fake Daraja server.
+
+Both apps are served on local ports, so the fake's callbacks reach
+/api/payments/mpesa/callback over HTTP; the jobs run in this thread.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.serving import make_server
+
+from conftest import auth
+from server.config import db
+from server.fake_mpesa import create_app as create_fake_mpesa
+from server.jobs import Worker
+from server.models import Book, Job, Order, Payment
+from test_checkout import fill_cart
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(wsgi_app):
+        server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def mpesa(app, serve):
+    config = dict(
+        MPESA_BASE_URL=serve(create_fake_mpesa(delay=0.05)),
+        MPESA_CALLBACK_URL=serve(app) + '/api/payments/mpesa/callback',
+        MPESA_SHORTCODE='174379', MPESA_PASSKEY='passkey',
+        MPESA_CONSUMER_KEY='key', MPESA_CONSUMER_SECRET='secret',
+        MPESA_QUERY_DELAY=60, MPESA_PAYMENT_TIMEOUT=180,
+    )
+    app.config.update(config)
+    app.extensions.pop('mpesa', None)
+    yield Worker(app)
+    app.extensions.pop('mpesa', None)
+    for key in config:
+        app.config.pop(key)
+
+
+def mpesa_checkout(client, customer, book_ids, phone):
+    headers = auth(customer)
+    fill_cart(client, headers, book_ids, quantity=2)
+    response = client.post('/api/orders', json={
+        'shipping_address': {
+            'fullName': 'Test User', 'address': '1 Test Road', 'street': 'Test Street',
+            'city': 'Nairobi', 'phone': phone, 'email': 'customer@example.com',
+        },
+        'payment_method': 'mpesa',
+    }, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['order']['id']
+
+
+def run_until_settled(worker, order_id, timeout=10):
+    """Run jobs until the order's payment leaves `pending`"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        worker.run_once('test-worker')
+        db.session.expire_all()
+        payment = Payment.query.filter_by(order_id=order_id).one()
+        if payment.status != 'pending':
+            return payment
+        time.sleep(0.02)
+    pytest.fail('payment still pending')
+
+
+def stock(book_ids):
+    db.session.expire_all()
+    return [db.session.get(Book, book_id).stock_quantity for book_id in book_ids]
+
+
+def test_paid_push_moves_the_order_to_processing(client, customer, make_books, mpesa):
+    book_ids = make_books(2)
+    order_id = mpesa_checkout(client, customer, book_ids, '0712000000')
+
+    payment = run_until_settled(mpesa, order_id)
+
+    assert payment.status == 'paid' and payment.mpesa_receipt_number
+    assert payment.checkout_request_id
+    order = db.session.get(Order, order_id)
+    assert (order.status, order.payment_status) == ('processing', 'paid')
+    assert stock(book_ids) == [3, 3]
+    assert Job.query.filter_by(kind='mpesa.callback', status='done').count() == 1
+
+
+def test_cancelled_push_cancels_the_order_and_returns_stock(client, customer, make_books, mpesa):
+    book_ids = make_books(2)
+    order_id = mpesa_checkout(client, customer, book_ids, '0712000001')
+
+    payment = run_until_settled(mpesa, order_id)
+
+    assert (payment.status, payment.result_code) == ('failed', 1032)
+    order = db.session.get(Order, order_id)
+    assert (order.status, order.payment_status) == ('cancelled', 'failed')
+    assert stock(book_ids) == [5, 5]
+
+
+def test_unanswered_push_times_out_through_the_status_query(app, client, customer, make_books, mpesa):
+    app.config.update(MPESA_QUERY_DELAY=0, MPESA_PAYMENT_TIMEOUT=0)
+    book_ids = make_books(1)
+    order_id = mpesa_checkout(client, customer, book_ids, '0712000002')
+
+    payment = run_until_settled(mpesa, order_id)
+
+    assert (payment.status, payment.result_code) == ('failed', 1037)
+    assert db.session.get(Order, order_id).status == 'cancelled'
+    assert stock(book_ids) == [5]
+
+
+def test_push_errors_are_retried_then_fail_the_payment(client, customer, make_books, mpesa):
+    book_ids = make_books(1)
+    order_id = mpesa_checkout(client, customer, book_ids, '0712000003')  # The fake rejects it with an errorCode
+    job = Job.query.filter_by(kind='mpesa.stk_push').one()
+
+    for attempt in range(1, job.max_attempts + 1):
+        Job.query.filter_by(id=job.id).update({Job.run_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        assert mpesa.run_once('test-worker') == 1
+        db.session.expire_all()
+        if attempt < job.max_attempts:
+            # Retried, not settled
+            assert (job.status, job.attempts) == ('queued', attempt)
+            assert db.session.get(Order, order_id).status == 'pending'
+            assert stock(book_ids) == [3]
+
+    assert job.status == 'failed' and '400.002.02' in job.last_error
+    payment = Payment.query.filter_by(order_id=order_id).one()
+    assert payment.status == 'failed' and payment.result_description.startswith('STK push failed')
+    assert db.session.get(Order, order_id).status == 'cancelled'
+    assert stock(book_ids) == [5]
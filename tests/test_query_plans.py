@@ -0,0 +1,16 @@
+"""check-query-plans passes against the models' schema"""
+from conftest import auth
+from server.queryplans import check_query_plans
+from test_checkout import checkout, fill_cart
+
+
+def test_no_sequential_scans_on_large_tables(app, client, customer, admin, make_books):
+    book_ids = make_books(30, reviews=3)
+    headers = auth(customer)
+    fill_cart(client, headers, book_ids[:2])
+    assert checkout(client, headers).status_code == 201
+
+    output = []
+    failures = check_query_plans(app, echo=output.append)
+
+    assert failures == 0, '\n'.join(output)
@@ -0,0 +1,32 @@
+"""Anonymous catalog responses are cached per normalized URL"""
+from werkzeug.datastructures import MultiDict
+from server.cache import ResponseCache
+
+
+def test_key_is_independent_of_arg_order():
+    assert ResponseCache.make_key('/api/books', MultiDict([('page', '2'), ('per_page', '5')])) == \
+        ResponseCache.make_key('/api/books', MultiDict([('per_page', '5'), ('page', '2')]))
+
+
+def test_empty_args_are_part_of_the_key():
+    assert ResponseCache.make_key('/api/books', MultiDict([('per_page', '5'), ('cursor', '')])) != \
+        ResponseCache.make_key('/api/books', MultiDict([('per_page', '5')]))
+
+
+def test_cursor_and_page_modes_are_cached_apart(client, make_books, count_queries):
+    make_books(12)
+
+    for first, second in (('?per_page=5&cursor=', '?per_page=5'), ('?per_page=4', '?per_page=4&cursor=')):
+        client.get(f'/api/books{first}')
+        with count_queries() as queries:
+            body = client.get(f'/api/books{second}').get_json()
+        assert queries.count > 0
+        if 'cursor=' in second:
+            assert 'next_cursor' in body['pagination']
+        else:
+            assert 'total' in body['pagination']
+
+    # A repeat of the same URL is served from the cache
+    with count_queries() as queries:
+        client.get('/api/books?per_page=5')
+    assert queries.count == 0
@@ -0,0 +1,39 @@
+"""Submitting a review and moderating it into the book's rating"""
+from conftest import auth
+from server.config import db
+from server.models import Book, Order, Review
+from test_checkout import checkout, fill_cart
+
+
+def submit(client, headers, book_id, rating=4):
+    return client.post(f'/api/books/{book_id}/reviews',
+                       json={'rating': rating, 'content': 'Well paced and worth it'}, headers=headers)
+
+
+def test_submitted_review_counts_once_approved(client, customer, admin, make_books):
+    book_id, = make_books(1)
+
+    response = submit(client, auth(customer), book_id)
+    assert response.status_code == 201, response.get_json()
+    review = db.session.get(Review, response.get_json()['review_id'])
+    assert (review.status, review.is_verified_purchase) == ('pending', False)
+    assert db.session.get(Book, book_id).rating_count == 0
+
+    response = client.put(f'/api/admin/reviews/{review.id}', json={'status': 'approved'}, headers=auth(admin))
+    assert response.status_code == 200, response.get_json()
+    db.session.expire_all()
+    book = db.session.get(Book, book_id)
+    assert (book.rating_count, book.average_rating) == (1, 4.0)
+
+
+def test_review_of_a_delivered_book_is_a_verified_purchase(client, customer, make_books):
+    book_id, = make_books(1)
+    headers = auth(customer)
+    fill_cart(client, headers, [book_id])
+    order_id = checkout(client, headers).get_json()['order']['id']
+    db.session.get(Order, order_id).status = 'delivered'
+    db.session.commit()
+
+    response = submit(client, headers, book_id)
+    assert response.status_code == 201, response.get_json()
+    assert db.session.get(Review, response.get_json()['review_id']).is_verified_purchase
@@ -0,0 +1,79 @@
+"""Sales rollups kept up to date by orders match a rebuild from the orders table"""
+from datetime import datetime, timedelta
+from conftest import auth
+from test_checkout import checkout, fill_cart
+from server.config import db
+from server.models import SalesRollup
+from server.sales import INTERVALS, totals, chart, rebuild_sales_rollups
+import server.controllers.orders
+
+START = datetime(2024, 1, 30, 22)
+# Hours after START at which orders are placed: across hours, days, a week and a month
+PLACED = [0, 0, 1, 3, 26, 26, 50, 200, 400]
+STATUSES = [None, ['pending'], ['processing'], ['shipped', 'delivered'], ['cancelled']]
+
+
+def snapshot():
+    end = START + timedelta(days=30)
+    rows = sorted(
+        (row.granularity, row.bucket, row.status, row.order_count, row.revenue)
+        for row in SalesRollup.query if row.order_count
+    )
+    return {
+        'rows': rows,
+        'totals': [totals(START, end, statuses) for statuses in STATUSES]
+        + [totals(START + timedelta(days=2), statuses=statuses) for statuses in STATUSES],
+        'charts': [chart(START, end, interval, statuses) for interval in INTERVALS for statuses in STATUSES],
+    }
+
+
+def test_rollups_match_a_rebuild_after_orders_move(client, admin, customer, make_books, monkeypatch):
+    book_ids = make_books(3, stock_quantity=100)
+    headers = auth(customer)
+
+    class Clock(datetime):
+        now = START
+
+        @classmethod
+        def utcnow(cls):
+            return cls.now
+
+    monkeypatch.setattr(server.controllers.orders, 'datetime', Clock)
+    order_ids = []
+    for n, hours in enumerate(PLACED):
+        Clock.now = START + timedelta(hours=hours, minutes=n)
+        fill_cart(client, headers, book_ids[:n % 3 + 1], quantity=n % 2 + 1)
+        response = checkout(client, headers)
+        assert response.status_code == 201, response.get_json()
+        order_ids.append(response.get_json()['order']['id'])
+
+    for order_id, status in zip(order_ids, ['processing', 'shipped', 'delivered', 'cancelled', 'processing']):
+        response = client.put(f'/api/admin/orders/{order_id}/status', json={'status': status}, headers=auth(admin))
+        assert response.status_code == 200, response.get_json()
+    # Moved twice, and back again
+    for order_id, status in ((order_ids[0], 'delivered'), (order_ids[1], 'processing')):
+        assert client.put(f'/api/admin/orders/{order_id}/status', json={'status': status},
+                          headers=auth(admin)).status_code == 200
+    for order_id in (order_ids[4], order_ids[6]):
+        response = client.put(f'/api/orders/{order_id}', json={'action': 'cancel'}, headers=headers)
+        assert response.status_code == 200, response.get_json()
+
+    kept = snapshot()
+    assert kept['totals'][0][0] == len(PLACED)
+    assert kept['totals'][-1][0] == 2  # Cancelled after the first two days
+    hourly = kept['charts'][0]
+    assert (len(hourly), sum(point['orders'] for point in hourly)) == (30 * 24, len(PLACED))
+
+    rebuild_sales_rollups()
+    db.session.commit()
+    assert snapshot() == kept
+
+
+def test_hourly_dashboard_charts_are_capped(client, admin):
+    url = '/api/admin/dashboard/stats?interval=hour&start_date=2024-01-01&end_date='
+
+    assert client.get(url + '2024-02-01', headers=auth(admin)).status_code == 200
+    response = client.get(url + '2024-02-02', headers=auth(admin))
+    assert response.status_code == 400
+    assert 'at most 31 days' in response.get_json()['error']
+    assert client.get(url.replace('hour', 'day') + '2024-12-31', headers=auth(admin)).status_code == 200
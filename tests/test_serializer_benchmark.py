@@ -0,0 +1,41 @@
+"""Serializer micro-benchmark: one /api/books page of listing rows.
+
+Fetches and serializes ROWS rows as Book instances (full ORM load) and as
+column tuples (the listing view's columns only), best of ROUNDS, and reports
+the cost per row of each (run with -s to see them). Both must produce the
+same payload.
+"""
+import time
+from server.config import db
+from server.models import Book
+from server.serializers import BOOK_VIEWS
+
+BOOKS = 2000
+ROWS = 500
+ROUNDS = 5
+
+
+def best_per_row(fetch_and_serialize):
+    best = None
+    for _ in range(ROUNDS):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        payload = fetch_and_serialize()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / ROWS * 1e6, payload
+
+
+def test_listing_rows_against_orm_instances(make_books, record_property):
+    make_books(BOOKS)
+    view = BOOK_VIEWS['list']
+    page = Book.query.filter(Book.status == 'published').order_by(Book.created_at.desc(), Book.id.desc()).limit(ROWS)
+
+    orm_us, orm_payload = best_per_row(lambda: [view.serialize(book) for book in page.all()])
+    rows_us, rows_payload = best_per_row(lambda: view.serialize_many(view.query(page).all()))
+    record_property('orm_us_per_row', round(orm_us, 1))
+    record_property('rows_us_per_row', round(rows_us, 1))
+    print(f'\nORM instances: {orm_us:.1f} us/row, column tuples: {rows_us:.1f} us/row')
+
+    assert len(rows_payload) == ROWS
+    assert rows_payload == orm_payload
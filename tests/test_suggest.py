@@ -0,0 +1,65 @@
+"""Search-as-you-type prefix index"""
+from server.config import db
+from server.models import Book
+from server.suggest import suggest_index
+
+
+def ids(suggestions):
+    return [suggestion['id'] for suggestion in suggestions]
+
+
+def test_prefixes_match_word_starts_authors_and_isbns(make_books):
+    first, second, draft = make_books(3)
+    book = db.session.get(Book, first)
+    book.title, book.author = 'The Harry Potter Stories', 'Jane Rowling'
+    db.session.get(Book, second).title = 'Potted Plants'
+    db.session.get(Book, draft).title = 'Potter, Unpublished'
+    db.session.get(Book, draft).status = 'draft'
+    db.session.commit()
+
+    matches = suggest_index.suggest('pot')
+    assert sorted(ids(matches)) == [first, second]
+    assert {match['match'] for match in matches} == {'title'}
+    assert ids(suggest_index.suggest('Harry P')) == [first]
+    assert [(s['id'], s['match']) for s in suggest_index.suggest('rowl')] == [(first, 'author')]
+    assert ids(suggest_index.suggest(book.isbn_13[:7] + '-' + book.isbn_13[7:])) == [first]
+    assert ids(suggest_index.suggest('potter', limit=1)) == [first]
+    assert suggest_index.suggest('zzz') == [] and suggest_index.suggest('  ') == []
+
+
+def test_refresh_book_reindexes_one_book(make_books):
+    book_id, = make_books(1)
+    assert ids(suggest_index.suggest('book')) == [book_id]
+
+    book = db.session.get(Book, book_id)
+    book.title = 'Renamed Title'
+    db.session.commit()
+    suggest_index.refresh_book(book)
+    assert suggest_index.suggest('book') == []
+    assert ids(suggest_index.suggest('renam')) == [book_id]
+
+    book.status = 'draft'
+    db.session.commit()
+    suggest_index.refresh_book(book)
+    assert suggest_index.suggest('renam') == []
+
+
+def test_index_reloads_after_its_ttl(app, make_books, monkeypatch):
+    monkeypatch.setitem(app.config, 'SUGGEST_INDEX_TTL', 60)
+    make_books(1)
+    assert len(suggest_index.suggest('book')) == 1
+
+    # Written by another worker: not seen until the index is reloaded
+    make_books(1)
+    assert len(suggest_index.suggest('book')) == 1
+    monkeypatch.setitem(app.config, 'SUGGEST_INDEX_TTL', 0)
+    assert len(suggest_index.suggest('book')) == 2
+
+
+def test_suggest_endpoint_caps_the_limit(client, make_books):
+    make_books(60)
+
+    response = client.get('/api/books/suggest?q=book&limit=100')
+
+    assert response.status_code == 200
+    assert len(response.get_json()['suggestions']) == 50
@@ -0,0 +1,39 @@
+"""Search-as-you-type micro-benchmark: /api/books/suggest against /api/books/search.
+
+Times the same prefix queries through both endpoints over a seeded catalog
+and reports requests per second for each (run with -s to see them). The
+suggest endpoint must answer from its in-memory index without a query.
+"""
+import time
+from sqlalchemy import event
+from server.config import db
+
+BOOKS = 500
+REQUESTS = 200
+PREFIXES = ['bo', 'boo', 'book', 'au', 'auth', 'author']
+
+
+def test_suggest_against_full_text_search(client, make_books, record_property):
+    make_books(BOOKS)
+    client.get('/api/books/suggest?q=book')  # Builds the index
+
+    results = {}
+    for endpoint in ('search', 'suggest'):
+        queries = []
+        count = lambda *args: queries.append(1)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        started = time.perf_counter()
+        for n in range(REQUESTS):
+            response = client.get(f'/api/books/{endpoint}?q={PREFIXES[n % len(PREFIXES)]}&limit=10')
+            assert response.status_code == 200
+        elapsed = time.perf_counter() - started
+        event.remove(db.engine, 'before_cursor_execute', count)
+        results[endpoint] = (REQUESTS / elapsed, len(queries) / REQUESTS)
+        record_property(f'{endpoint}_requests_per_second', round(REQUESTS / elapsed))
+
+    print(''.join(
+        f'\n{endpoint}: {rate:.0f} req/s, {queries:.1f} queries/request'
+        for endpoint, (rate, queries) in results.items()
+    ))
+    assert results['suggest'][1] == 0
+    assert len(client.get('/api/books/suggest?q=author 3').get_json()['suggestions']) == 10
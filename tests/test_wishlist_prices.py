@@ -0,0 +1,70 @@
+"""Wishlist price tracking: the set-based refresh and its recurring job"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from server.config import db
+from server.jobs import Worker, schedule_recurring
+from server.models import Book, Job, Wishlist, WishlistItem
+
+# (new list price, new sale price, added_price, current_price, lowest_price, price_drop_alert)
+CASES = [
+    (20, 15, 20, 20, 20, False),      # Dropped more than 10%
+    (12, None, 10, 10, 9, False),     # Rose above the lowest seen
+    (19, None, 20, 20, 20, False),    # Dropped less than 10%
+    (10, None, None, None, None, False),  # No snapshot yet
+    (20, None, 20, 15, 15, True),     # Back up after an alert
+    (14, None, 16, 14, 14, True),     # Unchanged
+]
+
+
+def tracked(item):
+    return item.current_price, item.lowest_price, item.price_drop_alert
+
+
+def make_items(customer, make_books):
+    wishlist = Wishlist(user_id=customer.id)
+    db.session.add(wishlist)
+    book_ids = make_books(len(CASES))
+    for book_id, (list_price, sale_price, added, current, lowest, alert) in zip(book_ids, CASES):
+        book = db.session.get(Book, book_id)
+        book.list_price, book.sale_price = list_price, sale_price
+        db.session.add(WishlistItem(
+            wishlist=wishlist, book_id=book_id, added_price=added, current_price=current,
+            lowest_price=lowest, price_drop_alert=alert
+        ))
+    db.session.commit()
+    return WishlistItem.query.order_by(WishlistItem.id).all()
+
+
+def test_refresh_matches_update_price_info(customer, make_books):
+    items = make_items(customer, make_books)
+    for item in items:
+        item.update_price_info()
+    db.session.flush()
+    db.session.expire_all()
+    expected = {item.id: tracked(item) for item in WishlistItem.query}
+    db.session.rollback()
+
+    assert WishlistItem.refresh_price_info() == len(CASES) - 1  # All but the unchanged one
+    db.session.commit()
+
+    refreshed = WishlistItem.query.order_by(WishlistItem.id).all()
+    assert {item.id: tracked(item) for item in refreshed} == expected
+    # Items without a snapshot take the current price as their added price
+    assert [item.added_price for item in refreshed] == [
+        Decimal(added if added is not None else list_price) for list_price, _, added, *_ in CASES
+    ]
+
+
+def test_prices_are_refreshed_by_a_recurring_job(app, customer, make_books):
+    make_items(customer, make_books)
+
+    schedule_recurring()
+    Job.query.filter_by(kind='wishlist.refresh_prices').update({'run_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+    assert Worker(app).run_once('test-worker') == 1
+    db.session.expire_all()
+    first = WishlistItem.query.order_by(WishlistItem.id).first()
+    assert tracked(first) == (Decimal('15.00'), Decimal('15.00'), True)
+    statuses = sorted(job.status for job in Job.query.filter_by(kind='wishlist.refresh_prices'))
+    assert statuses == ['done', 'queued']